@@ -0,0 +1,75 @@
+"""
+Stress benchmark for concurrent trade recording.
+
+Feed threads each own a disjoint set of symbols and record trades into them while a publisher thread keeps
+recomputing the all-share index. The benchmark reports the aggregate ingest rate for each thread count.
+
+Run with: python -m benchmarks.concurrency [--trades N] [--symbols N] [--threads 1,2,4,8]
+"""
+import argparse
+import threading
+import time
+
+from jpmorgan.gbce import GBCE
+from jpmorgan.stock import Stock
+
+
+def run(threads: int, trades_per_thread: int, symbols: int) -> float:
+    """
+    Records trades from several feed threads while a publisher reads the index.
+
+    Parameters:
+        threads (int): The number of feed threads.
+        trades_per_thread (int): The number of trades each feed thread records.
+        symbols (int): The number of listed symbols, shared out between the feed threads.
+
+    Returns:
+        float: The aggregate number of trades recorded per second.
+    """
+    gbce = GBCE()
+    stocks = [Stock(symbol=f"S{i:04d}", type="Common", last_dividend=1, fixed_dividend=0, par_value=100) for i in range(symbols)]
+    for stock in stocks:
+        gbce.add_stock(stock)
+
+    start_barrier = threading.Barrier(threads + 1)
+    done = threading.Event()
+
+    def feed(shard: int):
+        owned = stocks[shard::threads]
+        start_barrier.wait()
+        for i in range(trades_per_thread):
+            owned[i % len(owned)].record_trade(10, "buy", 100.0 + i % 13)
+
+    def publish():
+        while not done.is_set():
+            gbce.calculate_all_share_index()
+
+    feeders = [threading.Thread(target=feed, args=(shard,)) for shard in range(threads)]
+    publisher = threading.Thread(target=publish)
+    for thread in feeders:
+        thread.start()
+    publisher.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in feeders:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    publisher.join()
+    return threads * trades_per_thread / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=100_000, help="trades recorded by each feed thread")
+    parser.add_argument("--symbols", type=int, default=64, help="number of listed symbols")
+    parser.add_argument("--threads", default="1,2,4,8", help="comma separated feed thread counts")
+    args = parser.parse_args()
+
+    for threads in (int(count) for count in args.threads.split(",")):
+        rate = run(threads, args.trades, max(args.symbols, threads))
+        print(f"{threads:>3} feed threads: {rate:>12,.0f} trades/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of the write-ahead journal overhead.
+
+Records the same trades with and without a journal, one at a time through Stock.record_trade and in
+batches through GBCE.record_trades, and reports the ingest rate of each. The journaled runs include the
+final sync, so every trade is on disk when the clock stops.
+
+Run with: python -m benchmarks.journal [--trades N] [--symbols N] [--batch N] [--directory PATH]
+"""
+import argparse
+import tempfile
+import time
+from typing import Optional
+
+from jpmorgan.gbce import GBCE
+from jpmorgan.journal import Journal
+from jpmorgan.stock import Stock
+
+
+def _exchange(symbols: int, journal: Optional[Journal]) -> GBCE:
+    gbce = GBCE(journal=journal)
+    for i in range(symbols):
+        gbce.add_stock(Stock(symbol=f"S{i:04d}", type="Common", last_dividend=1, fixed_dividend=0, par_value=100))
+    return gbce
+
+
+def run_single(trades: int, symbols: int, journal: Optional[Journal]) -> float:
+    """
+    Records trades one at a time.
+
+    Parameters:
+        trades (int): The number of trades to record.
+        symbols (int): The number of listed symbols the trades are spread over.
+        journal (Optional[Journal]): The journal to write to, or None for the in-memory path.
+
+    Returns:
+        float: The number of trades recorded per second.
+    """
+    stocks = _exchange(symbols, journal).stocks
+    started = time.perf_counter()
+    for i in range(trades):
+        stocks[i % symbols].record_trade(10, "buy", 100.0 + i % 13)
+    if journal is not None:
+        journal.sync()
+    return trades / (time.perf_counter() - started)
+
+
+def run_batched(trades: int, symbols: int, batch: int, journal: Optional[Journal]) -> float:
+    """
+    Records trades in batches routed by the exchange.
+
+    Parameters:
+        trades (int): The number of trades to record.
+        symbols (int): The number of listed symbols the trades are spread over.
+        batch (int): The number of trades per batch.
+        journal (Optional[Journal]): The journal to write to, or None for the in-memory path.
+
+    Returns:
+        float: The number of trades recorded per second.
+    """
+    gbce = _exchange(symbols, journal)
+    names = [stock.symbol for stock in gbce.stocks]
+    batches = [
+        [(start + i, names[(start + i) % symbols], 10, "buy", 100.0 + i % 13) for i in range(batch)]
+        for start in range(0, trades, batch)
+    ]
+    started = time.perf_counter()
+    for rows in batches:
+        gbce.record_trades(rows)
+    if journal is not None:
+        journal.sync()
+    return len(batches) * batch / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=500_000, help="trades recorded by each run")
+    parser.add_argument("--symbols", type=int, default=64, help="number of listed symbols")
+    parser.add_argument("--batch", type=int, default=4096, help="trades per batch in the batched runs")
+    parser.add_argument("--directory", help="directory for the journal, by default a temporary one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for name, run in (
+            ("record_trade", lambda journal: run_single(args.trades, args.symbols, journal)),
+            ("record_trades", lambda journal: run_batched(args.trades, args.symbols, args.batch, journal)),
+        ):
+            memory = run(None)
+            with Journal(tempfile.mkdtemp(dir=directory)) as journal:
+                journaled = run(journal)
+            print(
+                f"{name:>14}: {memory:>12,.0f} trades/s in memory, {journaled:>12,.0f} trades/s journaled "
+                f"({1 - journaled / memory:.0%} overhead)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Throughput benchmark for the multi-process sharded exchange.
+
+Replays the same synthetic batches into ShardedGBCE with an increasing number of workers, asking for the
+all-share index after every batch, and reports the aggregate ingest rate. With --partitioned the batches are
+split by shard up front and sent as columns through record_partitioned, which takes the coordinator's
+per-trade work out of the measurement.
+
+Run with: python -m benchmarks.sharding [--trades N] [--symbols N] [--batch N] [--workers 1,2,4,8] [--partitioned]
+"""
+import argparse
+import random
+import time
+from array import array
+
+from jpmorgan.sharding import ShardedGBCE, TradeColumns, shard_of
+from jpmorgan.stock import Stock
+
+
+def partition(rows: list, workers: int) -> list:
+    """
+    Splits rows by shard into column batches for ShardedGBCE.record_partitioned.
+
+    Parameters:
+        rows (list): (timestamp, symbol, quantity, indicator, price) rows with None timestamps.
+        workers (int): The number of shards.
+
+    Returns:
+        list: A TradeColumns batch per shard.
+    """
+    shards = [[] for _ in range(workers)]
+    for row in rows:
+        shards[shard_of(row[1], workers)].append(row)
+    return [
+        TradeColumns(
+            [row[1] for row in shard],
+            array("q", [row[2] for row in shard]),
+            [row[3] for row in shard],
+            array("d", [row[4] for row in shard]),
+        )
+        for shard in shards
+    ]
+
+
+def run(workers: int, trades: int, symbols: int, batch: int, partitioned: bool = False) -> float:
+    """
+    Records trades into a sharded exchange in batches.
+
+    Parameters:
+        workers (int): The number of worker processes.
+        trades (int): The total number of trades to record.
+        symbols (int): The number of listed symbols.
+        batch (int): The number of trades per batch.
+        partitioned (bool): Whether to record batches split by shard beforehand.
+
+    Returns:
+        float: The number of trades recorded per second.
+    """
+    generator = random.Random(1)
+    names = [f"S{i:04d}" for i in range(symbols)]
+    batches = [
+        [(None, generator.choice(names), generator.randint(1, 500), "buy", 100.0 + generator.random()) for _ in range(batch)]
+        for _ in range(trades // batch)
+    ]
+    if partitioned:
+        batches = [partition(rows, workers) for rows in batches]
+    record = "record_partitioned" if partitioned else "record_trades"
+    with ShardedGBCE(workers) as gbce:
+        for name in names:
+            gbce.add_stock(Stock(symbol=name, type="Common", last_dividend=1, fixed_dividend=0, par_value=100))
+        started = time.perf_counter()
+        for rows in batches:
+            getattr(gbce, record)(rows)
+            gbce.calculate_all_share_index()
+        return len(batches) * batch / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=50_000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--partitioned", action="store_true", help="record batches already split by shard")
+    args = parser.parse_args()
+
+    for workers in (int(count) for count in args.workers.split(",")):
+        rate = run(workers, args.trades, args.symbols, args.batch, args.partitioned)
+        print(f"{workers:>3} workers: {rate:>12,.0f} trades/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Benchmark suite for the trade, volume-weighted price and index hot paths.
+
+Every benchmark runs on synthetic trades from a seeded generator and a manual clock, so runs are
+reproducible. Latencies are measured per call and reported as p50 and p99 in nanoseconds, throughputs in
+operations per second and memory in bytes per trade:
+
+    record_trade                      Stock.record_trade, one trade at a time
+    record_trades                     GBCE.record_trades, in batches routed across many symbols
+    vwsp[history=N]                   Stock.calculate_volume_weighted_stock_price after a trade, N trades recorded
+    index[constituents=N]             GBCE.calculate_all_share_index after a trade, N constituents
+    reactive_index[constituents=N]    the same on a reactive exchange, which only visits the stock that traded
+    memory                            bytes allocated per recorded trade
+    mixed                             a feed writing to many symbols while every tenth operation reads the index
+
+Each benchmark is repeated and the best value of every metric is kept, which filters out most of the
+noise of other processes. Results can be written as JSON and compared against a stored baseline. A
+benchmark whose p50 latency, bytes per trade or throughput is worse than the baseline by more than the
+tolerance is reported as a regression and the suite exits with status 1. p99 latencies are reported but
+not compared, as they are too noisy on shared machines. Baselines are only meaningful on the machine they
+were recorded on.
+
+Run with: python -m benchmarks.suite [--quick] [--only NAME] [--repeat N] [--output PATH]
+          [--baseline PATH] [--tolerance FRACTION] [--save-baseline PATH]
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from jpmorgan.clock import ManualClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.stock import Stock
+
+Result = Dict[str, float]
+
+# Whether a higher value of a metric is better.
+HIGHER_IS_BETTER = {"p50_ns": False, "p99_ns": False, "bytes_per_trade": False, "ops_per_s": True}
+# The metrics compared against the baseline.
+COMPARED_METRICS = ("p50_ns", "bytes_per_trade", "ops_per_s")
+
+START = datetime.datetime(2024, 7, 9, 8, 0)
+TRADE_SPACING_NS = 1_000_000
+
+
+def generate_trades(count: int, symbols: List[str], seed: int = 0, start_ns: int = 0) -> Iterator[Tuple]:
+    """
+    Generates a reproducible tape of trades with a random walk price per symbol.
+
+    Parameters:
+        count (int): The number of trades.
+        symbols (List[str]): The symbols to trade, picked at random.
+        seed (int): The seed of the random generator.
+        start_ns (int): The timestamp of the first trade; trades are TRADE_SPACING_NS apart.
+
+    Returns:
+        Iterator[Tuple]: (timestamp_ns, symbol, quantity, indicator, price) rows in time order.
+    """
+    generator = random.Random(seed)
+    prices = {symbol: 100.0 for symbol in symbols}
+    for i in range(count):
+        symbol = generator.choice(symbols)
+        price = max(1.0, prices[symbol] * (1 + generator.gauss(0, 0.001)))
+        prices[symbol] = price
+        yield (
+            start_ns + i * TRADE_SPACING_NS,
+            symbol,
+            generator.randint(1, 1000),
+            "buy" if generator.random() < 0.5 else "sell",
+            round(price, 2),
+        )
+
+
+def _symbols(count: int) -> List[str]:
+    return [f"S{i:04d}" for i in range(count)]
+
+
+def _exchange(symbols: List[str], clock: ManualClock, reactive: bool = False) -> GBCE:
+    gbce = GBCE(clock, reactive=reactive)
+    for symbol in symbols:
+        gbce.add_stock(Stock(symbol=symbol, type="Common", last_dividend=1, fixed_dividend=0, par_value=100))
+    return gbce
+
+
+def _percentile(sorted_samples: List[int], fraction: float) -> float:
+    return float(sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))])
+
+
+def _latencies(samples: List[int]) -> Result:
+    samples = sorted(samples)
+    return {
+        "p50_ns": _percentile(samples, 0.50),
+        "p99_ns": _percentile(samples, 0.99),
+        "ops_per_s": len(samples) * 1e9 / sum(samples),
+    }
+
+
+def bench_record_trade(trades: int) -> Result:
+    """
+    Measures Stock.record_trade on a single stock whose 5 minute window is full.
+    """
+    clock = ManualClock(START)
+    stock = _exchange(["POP"], clock).get("POP")
+    samples = []
+    now = time.perf_counter_ns
+    for timestamp_ns, _, quantity, indicator, price in generate_trades(trades, ["POP"], start_ns=clock.now_ns()):
+        clock.set(timestamp_ns)
+        started = now()
+        stock.record_trade(quantity, indicator, price)
+        samples.append(now() - started)
+    return _latencies(samples)
+
+
+def bench_record_trades(trades: int, symbols: int = 64, batch: int = 4096) -> Result:
+    """
+    Measures GBCE.record_trades with batches spread over many symbols. Latencies are per batch.
+    """
+    clock = ManualClock(START)
+    names = _symbols(symbols)
+    gbce = _exchange(names, clock)
+    tape = list(generate_trades(trades, names, start_ns=clock.now_ns()))
+    samples = []
+    now = time.perf_counter_ns
+    for offset in range(0, len(tape), batch):
+        rows = tape[offset:offset + batch]
+        clock.set(rows[-1][0])
+        started = now()
+        gbce.record_trades(rows)
+        samples.append(now() - started)
+    result = _latencies(samples)
+    result["ops_per_s"] = len(tape) * 1e9 / sum(samples)
+    return result
+
+
+def bench_vwsp(history: int, reads: int) -> Result:
+    """
+    Measures the volume-weighted price of a stock with a long history, reading it after every new trade so
+    the cached price is never reused.
+    """
+    clock = ManualClock(START)
+    stock = _exchange(["POP"], clock).get("POP")
+    tape = list(generate_trades(history + reads, ["POP"], start_ns=clock.now_ns()))
+    stock.record_trades([(timestamp_ns, quantity, indicator, price) for timestamp_ns, _, quantity, indicator, price in tape[:history]])
+    samples = []
+    now = time.perf_counter_ns
+    for timestamp_ns, _, quantity, indicator, price in tape[history:]:
+        clock.set(timestamp_ns)
+        stock.record_trade(quantity, indicator, price)
+        started = now()
+        stock.calculate_volume_weighted_stock_price()
+        samples.append(now() - started)
+    return _latencies(samples)
+
+
+def bench_index(constituents: int, reads: int, reactive: bool = False) -> Result:
+    """
+    Measures the all-share index, reading it after every new trade in one of the constituents.
+    """
+    clock = ManualClock(START)
+    names = _symbols(constituents)
+    gbce = _exchange(names, clock, reactive)
+    tape = list(generate_trades(constituents * 10 + reads, names, start_ns=clock.now_ns()))
+    gbce.record_trades(tape[:constituents * 10])
+    gbce.calculate_all_share_index()
+    samples = []
+    now = time.perf_counter_ns
+    for timestamp_ns, symbol, quantity, indicator, price in tape[constituents * 10:]:
+        clock.set(timestamp_ns)
+        gbce.get(symbol).record_trade(quantity, indicator, price)
+        started = now()
+        gbce.calculate_all_share_index()
+        samples.append(now() - started)
+    return _latencies(samples)
+
+
+def bench_memory(trades: int) -> Result:
+    """
+    Measures the memory allocated per recorded trade, including the window and rollup state.
+    """
+    clock = ManualClock(START)
+    tape = [
+        (timestamp_ns, quantity, indicator, price)
+        for timestamp_ns, _, quantity, indicator, price in generate_trades(trades, ["POP"], start_ns=clock.now_ns())
+    ]
+    tracemalloc.start()
+    try:
+        stock = _exchange(["POP"], clock).get("POP")
+        baseline, _ = tracemalloc.get_traced_memory()
+        for offset in range(0, len(tape), 4096):
+            stock.record_trades(tape[offset:offset + 4096])
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"bytes_per_trade": (allocated - baseline) / trades}
+
+
+def bench_mixed(operations: int, symbols: int = 256) -> Result:
+    """
+    Measures a mixed workload: nine trades for every read of the index.
+    """
+    clock = ManualClock(START)
+    names = _symbols(symbols)
+    gbce = _exchange(names, clock)
+    tape = list(generate_trades(operations, names, start_ns=clock.now_ns()))
+    samples = []
+    now = time.perf_counter_ns
+    for i, (timestamp_ns, symbol, quantity, indicator, price) in enumerate(tape):
+        clock.set(timestamp_ns)
+        started = now()
+        if i % 10 == 9:
+            gbce.calculate_all_share_index()
+        else:
+            gbce.get(symbol).record_trade(quantity, indicator, price)
+        samples.append(now() - started)
+    return _latencies(samples)
+
+
+def benchmarks(quick: bool) -> Dict[str, Callable[[], Result]]:
+    """
+    Returns the benchmarks of the suite.
+
+    Parameters:
+        quick (bool): Whether to use small sizes, for smoke runs rather than measurements.
+
+    Returns:
+        Dict[str, Callable[[], Result]]: The benchmarks by name.
+    """
+    scale = 10 if quick else 1
+    suite = {
+        "record_trade": lambda: bench_record_trade(50_000 // scale),
+        "record_trades": lambda: bench_record_trades(200_000 // scale),
+    }
+    for history in (1_000, 10_000, 100_000):
+        suite[f"vwsp[history={history}]"] = lambda history=history: bench_vwsp(history // scale, 5_000 // scale)
+    for constituents in (10, 100, 1_000):
+        suite[f"index[constituents={constituents}]"] = (
+            lambda constituents=constituents: bench_index(constituents, 5_000 // scale)
+        )
+        suite[f"reactive_index[constituents={constituents}]"] = (
+            lambda constituents=constituents: bench_index(constituents, 5_000 // scale, reactive=True)
+        )
+    suite["memory"] = lambda: bench_memory(100_000 // scale)
+    suite["mixed"] = lambda: bench_mixed(100_000 // scale)
+    return suite
+
+
+def best(runs: List[Result]) -> Result:
+    """
+    Combines repeated runs of a benchmark, keeping the best value of every metric.
+
+    Parameters:
+        runs (List[Result]): The metrics of each run.
+
+    Returns:
+        Result: The best metrics.
+    """
+    combined = {}
+    for metric in runs[0]:
+        values = [result[metric] for result in runs]
+        combined[metric] = max(values) if HIGHER_IS_BETTER.get(metric, False) else min(values)
+    return combined
+
+
+def run(quick: bool = False, only: Optional[str] = None, repeat: int = 3) -> Iterator[Tuple[str, Result]]:
+    """
+    Runs the suite.
+
+    Parameters:
+        quick (bool): Whether to use small sizes.
+        only (Optional[str]): Runs only the benchmarks whose name starts with this prefix.
+        repeat (int): The number of times each benchmark is run.
+
+    Returns:
+        Iterator[Tuple[str, Result]]: The name and best metrics of every benchmark, as they complete.
+    """
+    for name, benchmark in benchmarks(quick).items():
+        if only is None or name.startswith(only):
+            yield name, best([benchmark() for _ in range(repeat)])
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Result], tolerance: float) -> List[str]:
+    """
+    Compares results against a baseline.
+
+    Parameters:
+        results (Dict[str, Result]): The metrics of the current run.
+        baseline (Dict[str, Result]): The metrics of the baseline run. Benchmarks missing from either are skipped.
+        tolerance (float): The fraction by which a metric may be worse than its baseline.
+
+    Returns:
+        List[str]: A description of every regression.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric in COMPARED_METRICS:
+            higher_is_better = HIGHER_IS_BETTER[metric]
+            expected = baseline.get(name, {}).get(metric)
+            value = metrics.get(metric)
+            if expected is None or value is None or expected <= 0:
+                continue
+            change = value / expected - 1
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{name} {metric}: {value:,.1f} against a baseline of {expected:,.1f} ({change:+.0%})")
+    return regressions
+
+
+def _document(results: Dict[str, Result], quick: bool) -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def _format(name: str, metrics: Result) -> str:
+    columns = []
+    if "p50_ns" in metrics:
+        columns.append(f"p50 {metrics['p50_ns'] / 1000:>9,.2f} us")
+        columns.append(f"p99 {metrics['p99_ns'] / 1000:>9,.2f} us")
+    if "ops_per_s" in metrics:
+        columns.append(f"{metrics['ops_per_s']:>12,.0f} ops/s")
+    if "bytes_per_trade" in metrics:
+        columns.append(f"{metrics['bytes_per_trade']:>6,.1f} bytes/trade")
+    return f"{name:<35}" + "  ".join(columns)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="use small sizes for a smoke run")
+    parser.add_argument("--only", help="run only the benchmarks whose name starts with this prefix")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each benchmark, of which the best is kept")
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--baseline", help="compare the results against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed regression, as a fraction")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline to this path")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, metrics in run(args.quick, args.only, args.repeat):
+        results[name] = metrics
+        print(_format(name, metrics), flush=True)
+
+    document = _document(results, args.quick)
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            with open(path, "w") as output:
+                json.dump(document, output, indent=2, sort_keys=True)
+                output.write("\n")
+
+    if args.baseline is not None:
+        with open(args.baseline) as stored:
+            baseline = json.load(stored)
+        if baseline.get("quick") != args.quick:
+            print("the baseline was recorded with different sizes; not comparing", file=sys.stderr)
+            return 2
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
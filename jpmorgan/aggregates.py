@@ -0,0 +1,342 @@
+import datetime
+from array import array
+from bisect import bisect_left
+from operator import mul
+from typing import Iterable, List, NamedTuple, Tuple
+
+from jpmorgan.trade_store import TradeStore
+
+
+def _to_ns(delta: datetime.timedelta) -> int:
+    return delta // datetime.timedelta(microseconds=1) * 1000
+
+
+class WindowSummary(NamedTuple):
+    """
+    The aggregated trading of a stock over a time window.
+
+    Attributes:
+        volume_weighted_price (float): The volume-weighted price, or 0 if nothing traded in the window.
+        quantity (int): The number of shares traded.
+        count (int): The number of trades.
+        high (float): The highest traded price, or 0 if nothing traded in the window.
+        low (float): The lowest traded price, or 0 if nothing traded in the window.
+    """
+    volume_weighted_price: float
+    quantity: int
+    count: int
+    high: float
+    low: float
+
+
+class _Accumulator:
+    __slots__ = ("price_quantity", "quantity", "count", "high", "low")
+
+    def __init__(self):
+        self.price_quantity = 0.0
+        self.quantity = 0
+        self.count = 0
+        self.high = 0.0
+        self.low = 0.0
+
+    def add(self, price_quantity: float, quantity: int, count: int, high: float, low: float):
+        if self.count == 0:
+            self.high = high
+            self.low = low
+        else:
+            if high > self.high:
+                self.high = high
+            if low < self.low:
+                self.low = low
+        self.price_quantity += price_quantity
+        self.quantity += quantity
+        self.count += count
+
+    def summary(self) -> WindowSummary:
+        if self.quantity == 0:
+            return WindowSummary(0, 0, 0, 0.0, 0.0)
+        return WindowSummary(self.price_quantity / self.quantity, self.quantity, self.count, self.high, self.low)
+
+    def combined(self, other: "_Accumulator") -> "_Accumulator":
+        result = _Accumulator()
+        if self.count:
+            result.add(self.price_quantity, self.quantity, self.count, self.high, self.low)
+        if other.count:
+            result.add(other.price_quantity, other.quantity, other.count, other.high, other.low)
+        return result
+
+
+class BucketAggregates:
+    """
+    Per-bucket rollups of a TradeStore, so that trading over any window can be summarized without a rescan.
+
+    Every bucket covers resolution of time and holds the sum of price * quantity, the quantity, the number of
+    trades and the high and low price of the trades in it. Buckets are only kept for seconds that traded and
+    are dropped once they are older than the retention period. A window summary adds up the buckets that
+    lie entirely inside the window and reads the few raw trades of the bucket the window starts in from the
+    store, so the result is exact while the cost is proportional to the number of buckets in the window.
+
+    Attributes:
+        store (TradeStore): The trades being aggregated.
+        resolution (datetime.timedelta): The length of a bucket.
+        retention (datetime.timedelta): How long buckets are kept; also the longest window that can be queried.
+    """
+    def __init__(
+        self,
+        store: TradeStore,
+        resolution: datetime.timedelta = datetime.timedelta(seconds=1),
+        retention: datetime.timedelta = datetime.timedelta(hours=1),
+    ):
+        """
+        Initializes the buckets from the trades already in the store.
+
+        Parameters:
+            store (TradeStore): The trades to aggregate.
+            resolution (datetime.timedelta): The length of a bucket.
+            retention (datetime.timedelta): How long buckets are kept.
+        """
+        if resolution <= datetime.timedelta(0):
+            raise ValueError("resolution must be positive")
+        self.store = store
+        self.resolution = resolution
+        self.retention = retention
+        self._resolution_ns = _to_ns(resolution)
+        self._retention_ns = _to_ns(retention)
+        self.starts = array("q")
+        self.price_quantities = array("d")
+        self.quantities = array("q")
+        self.counts = array("q")
+        self.highs = array("d")
+        self.lows = array("d")
+        self._head = 0
+        self.add_range(0)
+
+    @classmethod
+    def from_columns(
+        cls,
+        store: TradeStore,
+        resolution: datetime.timedelta,
+        retention: datetime.timedelta,
+        columns: Tuple[array, array, array, array, array, array],
+    ) -> "BucketAggregates":
+        """
+        Creates aggregates from buckets saved by columns, without rescanning the store.
+
+        Parameters:
+            store (TradeStore): The trades the buckets were built from.
+            resolution (datetime.timedelta): The length of a bucket.
+            retention (datetime.timedelta): How long buckets are kept.
+            columns (Tuple[array, ...]): The bucket starts, sums of price * quantity, quantities, trade counts,
+                highs and lows, as returned by columns.
+
+        Returns:
+            BucketAggregates: The aggregates, which take ownership of the columns.
+        """
+        aggregates = cls(TradeStore(), resolution, retention)
+        aggregates.store = store
+        (
+            aggregates.starts,
+            aggregates.price_quantities,
+            aggregates.quantities,
+            aggregates.counts,
+            aggregates.highs,
+            aggregates.lows,
+        ) = columns
+        return aggregates
+
+    def __len__(self) -> int:
+        return len(self.starts) - self._head
+
+    def columns(self) -> Tuple[array, array, array, array, array, array]:
+        """
+        Copies the live buckets out as columns that from_columns can restore.
+
+        Returns:
+            Tuple[array, ...]: The bucket starts, sums of price * quantity, quantities, trade counts, highs and lows.
+        """
+        head = self._head
+        return (
+            self.starts[head:],
+            self.price_quantities[head:],
+            self.quantities[head:],
+            self.counts[head:],
+            self.highs[head:],
+            self.lows[head:],
+        )
+
+    def add(self, position: int):
+        """
+        Adds the trade stored at the given position to its bucket.
+
+        Parameters:
+            position (int): The position returned by TradeStore.append.
+
+        Returns:
+            None
+        """
+        store = self.store
+        timestamp = store.timestamps[position]
+        quantity = store.quantities[position]
+        price = store.prices[position]
+        start = timestamp - timestamp % self._resolution_ns
+        starts = self.starts
+
+        if len(starts) > self._head and starts[-1] == start:
+            index = len(starts) - 1
+        elif len(starts) == self._head or start > starts[-1]:
+            self._append_bucket(start, price)
+            self._evict_before(start - self._retention_ns)
+            index = len(starts) - 1
+        else:
+            index = bisect_left(starts, start, self._head)
+            if index == self._head and start < starts[index] and start < starts[-1] - self._retention_ns:
+                # The trade belongs to a bucket that has already been retired.
+                return
+            if starts[index] != start:
+                self._insert_bucket(index, start, price)
+
+        self.price_quantities[index] += price * quantity
+        self.quantities[index] += quantity
+        self.counts[index] += 1
+        if price > self.highs[index]:
+            self.highs[index] = price
+        if price < self.lows[index]:
+            self.lows[index] = price
+
+    def add_range(self, position: int):
+        """
+        Adds every trade from the given position to the end of the store to its bucket.
+
+        Parameters:
+            position (int): The position returned by TradeStore.extend.
+
+        Returns:
+            None
+        """
+        # The trades from position on are in time order, as TradeStore.extend only accepts batches that are,
+        # so they are aggregated a bucket at a time: the end of each bucket's slice is found by bisection and
+        # the slice is summed in one step. Only the first bucket may already exist and go through add.
+        store = self.store
+        timestamps = store.timestamps
+        end = len(timestamps)
+        resolution_ns = self._resolution_ns
+        starts = self.starts
+        while position < end:
+            timestamp = timestamps[position]
+            start = timestamp - timestamp % resolution_ns
+            stop = bisect_left(timestamps, start + resolution_ns, position, end)
+            if len(starts) > self._head and start <= starts[-1]:
+                for existing in range(position, stop):
+                    self.add(existing)
+            else:
+                quantities = store.quantities[position:stop]
+                prices = store.prices[position:stop]
+                starts.append(start)
+                self.price_quantities.append(sum(map(mul, prices, quantities)))
+                self.quantities.append(sum(quantities))
+                self.counts.append(stop - position)
+                self.highs.append(max(prices))
+                self.lows.append(min(prices))
+                self._evict_before(start - self._retention_ns)
+            position = stop
+
+    def expire(self, now_ns: int):
+        """
+        Drops the buckets that ended before the retention period relative to the given time.
+
+        Parameters:
+            now_ns (int): The current time in nanoseconds since the epoch.
+
+        Returns:
+            None
+        """
+        self._evict_before(now_ns - self._retention_ns - self._resolution_ns + 1)
+
+    def summarize(self, window: datetime.timedelta, now_ns: int) -> WindowSummary:
+        """
+        Summarizes the trades made at or after now - window.
+
+        Parameters:
+            window (datetime.timedelta): The length of the window.
+            now_ns (int): The time the window ends at, in nanoseconds since the epoch.
+
+        Returns:
+            WindowSummary: The aggregated trading over the window.
+        """
+        return self.summarize_many([window], now_ns)[0]
+
+    def summarize_many(self, windows: Iterable[datetime.timedelta], now_ns: int) -> List[WindowSummary]:
+        """
+        Summarizes several windows ending at the same time in a single pass over the buckets.
+
+        Parameters:
+            windows (Iterable[datetime.timedelta]): The lengths of the windows.
+            now_ns (int): The time the windows end at, in nanoseconds since the epoch.
+
+        Returns:
+            List[WindowSummary]: The summaries, in the order the windows were given.
+        """
+        windows = list(windows)
+        for window in windows:
+            if window > self.retention:
+                raise ValueError(f"window {window} is longer than the bucket retention {self.retention}")
+
+        resolution = self._resolution_ns
+        starts = self.starts
+        buckets = _Accumulator()
+        index = len(starts)
+        summaries: List[WindowSummary] = [None] * len(windows)
+
+        # Walk the buckets from the newest backwards, extending the running totals window by window.
+        for order in sorted(range(len(windows)), key=lambda order: windows[order]):
+            cutoff = now_ns - _to_ns(windows[order])
+            first_full_bucket = -(-cutoff // resolution) * resolution
+            while index > self._head and starts[index - 1] >= first_full_bucket:
+                index -= 1
+                buckets.add(
+                    self.price_quantities[index],
+                    self.quantities[index],
+                    self.counts[index],
+                    self.highs[index],
+                    self.lows[index],
+                )
+            summaries[order] = buckets.combined(self._partial(cutoff, first_full_bucket)).summary()
+        return summaries
+
+    def _partial(self, cutoff: int, end: int) -> _Accumulator:
+        store = self.store
+        timestamps = store.timestamps
+        partial = _Accumulator()
+        for position in range(bisect_left(timestamps, cutoff), bisect_left(timestamps, end)):
+            price = store.prices[position]
+            quantity = store.quantities[position]
+            partial.add(price * quantity, quantity, 1, price, price)
+        return partial
+
+    def _append_bucket(self, start: int, price: float):
+        self.starts.append(start)
+        self.price_quantities.append(0.0)
+        self.quantities.append(0)
+        self.counts.append(0)
+        self.highs.append(price)
+        self.lows.append(price)
+
+    def _insert_bucket(self, index: int, start: int, price: float):
+        self.starts.insert(index, start)
+        self.price_quantities.insert(index, 0.0)
+        self.quantities.insert(index, 0)
+        self.counts.insert(index, 0)
+        self.highs.insert(index, price)
+        self.lows.insert(index, price)
+
+    def _evict_before(self, start: int):
+        starts = self.starts
+        head = self._head
+        if head == len(starts) or starts[head] >= start:
+            return
+        self._head = bisect_left(starts, start, head)
+        if self._head > len(starts) // 2:
+            # Compact once the retired buckets outnumber the live ones, keeping eviction amortized O(1).
+            for column in (starts, self.price_quantities, self.quantities, self.counts, self.highs, self.lows):
+                del column[:self._head]
+            self._head = 0
@@ -0,0 +1,152 @@
+import datetime
+import threading
+from time import localtime, time_ns
+from typing import Union
+
+from jpmorgan.trade import from_epoch_ns, to_epoch_ns
+
+
+class Clock:
+    """
+    The source of "now" for recording trades and sliding the volume-weighted price window.
+
+    Clocks report time as integer nanoseconds since the epoch, matching the timestamps kept in TradeStore.
+
+    Methods:
+        now_ns() -> int: Returns the current time in nanoseconds since the epoch.
+        now() -> datetime.datetime: Returns the current time as a naive datetime.
+        observe(timestamp_ns: int): Tells the clock that an event, such as a trade, happened at the given time.
+    """
+    def now_ns(self) -> int:
+        """
+        Returns the current time.
+
+        Returns:
+            int: The current time in nanoseconds since the epoch.
+        """
+        raise NotImplementedError
+
+    def now(self) -> datetime.datetime:
+        """
+        Returns the current time.
+
+        Returns:
+            datetime.datetime: The current time as a naive datetime.
+        """
+        return from_epoch_ns(self.now_ns())
+
+    def observe(self, timestamp_ns: int):
+        """
+        Tells the clock that an event, such as a trade, happened at the given time. Only event-time clocks use it.
+
+        Parameters:
+            timestamp_ns (int): The event time in nanoseconds since the epoch.
+
+        Returns:
+            None
+        """
+
+
+class WallClock(Clock):
+    """
+    A clock that follows the local wall clock, like datetime.datetime.now().
+
+    The time is read with time.time_ns(), truncated to microseconds like datetime.now(), and shifted by the
+    local UTC offset so that it compares with naive local datetimes converted by to_epoch_ns. No datetime is
+    built per call: the offset is cached and looked up again every OFFSET_REFRESH_NS, which bounds how late a
+    daylight saving change is picked up.
+    """
+    OFFSET_REFRESH_NS = 60 * 10**9
+
+    def __init__(self):
+        """
+        Initializes the clock. The local UTC offset is looked up on the first call.
+        """
+        # The offset and the time to look it up again, as one tuple so that threads never see half an update.
+        self._offset = (0, 0)
+
+    def now_ns(self) -> int:
+        now_ns = time_ns()
+        offset_ns, refresh_ns = self._offset
+        if now_ns >= refresh_ns:
+            offset_ns = localtime(now_ns // 10**9).tm_gmtoff * 10**9
+            self._offset = (offset_ns, now_ns + self.OFFSET_REFRESH_NS)
+        return now_ns - now_ns % 1000 + offset_ns
+
+
+class ManualClock(Clock):
+    """
+    A clock that only moves when it is told to, for simulations and tests.
+
+    Attributes:
+        time_ns (int): The current time in nanoseconds since the epoch.
+    """
+    def __init__(self, start: Union[datetime.datetime, int] = 0):
+        """
+        Initializes the clock at the given time.
+
+        Parameters:
+            start (Union[datetime.datetime, int]): The initial time, as a datetime or nanoseconds since the epoch.
+        """
+        self.time_ns = to_epoch_ns(start) if isinstance(start, datetime.datetime) else start
+
+    def now_ns(self) -> int:
+        return self.time_ns
+
+    def set(self, time: Union[datetime.datetime, int]):
+        """
+        Moves the clock to the given time.
+
+        Parameters:
+            time (Union[datetime.datetime, int]): The new time, as a datetime or nanoseconds since the epoch.
+
+        Returns:
+            None
+        """
+        self.time_ns = to_epoch_ns(time) if isinstance(time, datetime.datetime) else time
+
+    def advance(self, delta: Union[datetime.timedelta, int]):
+        """
+        Moves the clock forward.
+
+        Parameters:
+            delta (Union[datetime.timedelta, int]): The amount to move by, as a timedelta or nanoseconds.
+
+        Returns:
+            None
+        """
+        if isinstance(delta, datetime.timedelta):
+            delta = delta // datetime.timedelta(microseconds=1) * 1000
+        self.time_ns += delta
+
+
+class EventTimeClock(Clock):
+    """
+    A clock driven by the trades themselves: now is the latest trade timestamp recorded so far.
+
+    Replaying a tape against an event-time clock gives the same results however fast the tape is replayed.
+
+    Attributes:
+        time_ns (int): The latest trade timestamp observed, in nanoseconds since the epoch.
+    """
+    def __init__(self, start: int = 0):
+        """
+        Initializes the clock.
+
+        Parameters:
+            start (int): The time to report before any trade has been observed, in nanoseconds since the epoch.
+        """
+        self.time_ns = start
+        self._lock = threading.Lock()
+
+    def now_ns(self) -> int:
+        return self.time_ns
+
+    def observe(self, timestamp_ns: int):
+        if timestamp_ns > self.time_ns:
+            with self._lock:
+                if timestamp_ns > self.time_ns:
+                    self.time_ns = timestamp_ns
+
+
+WALL_CLOCK = WallClock()
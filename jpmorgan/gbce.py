@@ -1,6 +1,36 @@
-from functools import lru_cache
-from typing import List
-from jpmorgan.stock import Stock
+import datetime
+import logging
+import math
+import threading
+from array import array
+from collections import deque
+from heapq import heappop, heappush
+from operator import truediv
+from time import perf_counter_ns
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from jpmorgan.clock import WALL_CLOCK, Clock
+from jpmorgan.journal import Journal
+from jpmorgan.metrics import METRICS
+from jpmorgan.stock import OrderFlow, Stock
+from jpmorgan.trade import RejectedTrade
+
+logger = logging.getLogger(__name__)
+
+ChangeCallback = Callable[[Optional[str], float], None]
+# A callback due, with the symbol (None for the index) and the value it is called with.
+Move = Tuple[ChangeCallback, Optional[str], float]
+
+
+class _Subscription:
+    """
+    A change callback together with its threshold and the value it was last called with.
+    """
+    __slots__ = ("callback", "threshold", "value")
+
+    def __init__(self, callback: ChangeCallback, threshold: float, value: float):
+        self.callback = callback
+        self.threshold = threshold
+        self.value = value
 
 
 class GBCE:
@@ -14,20 +44,116 @@ class GBCE:
 
     Attributes:
         stocks (List[Stock]): A list of Stock objects representing the constituent companies of the index.
+        clock (Optional[Clock]): The clock shared with every stock added to the index, if any.
+        journal (Optional[Journal]): The write-ahead journal shared with every stock added to the index, if any.
+        reactive (bool): Whether constituents notify the exchange of their changes instead of being polled.
+
+    Constituents are indexed by symbol, so looking a stock up, routing a trade to it, removing it and
+    checking membership all cost O(1). Every symbol is also given a stable integer ordinal the first time
+    it is listed, which batch and columnar callers can use instead of the symbol string.
+
+    Registry changes and the cached index state are guarded by a lock of the exchange, while trades are
+    written under each stock's own lock, so computing the index never blocks the feed handlers.
+
+    The volume-weighted price of every constituent is cached together with the stock's version, so the
+    all-share index only recomputes the prices of stocks that traded or whose 5 minute window moved on.
+    The index itself is kept as a running sum of log-prices and a count of stocks with a positive price,
+    which cannot overflow and is updated in O(1) whenever a single constituent's price changes. The sum is
+    recomputed exactly every RESYNC_INTERVAL updates so that floating point drift cannot build up.
+
+    By default, computing the index checks the version of every constituent, which costs O(constituents)
+    even when a single stock traded. In reactive mode, stocks queue themselves on the exchange when they
+    trade, and the exchange keeps a heap of the times at which their 5 minute windows next move on, so
+    computing the index only visits the stocks that changed since it was last computed. Expiry times are
+    checked against the exchange's clock, or the wall clock if it has none, so the constituents of a
+    reactive exchange should share its clock.
+
+    Callbacks can subscribe to the index or to a constituent's volume-weighted price; they are called when
+    the value moved by more than their threshold since they were last called. Values are only recomputed
+    when they are read, so callbacks fire when the index is computed, either by a reader or by the refresh
+    timer, on the thread that computed it.
 
     Methods:
         add_stock(stock: Stock): Adds a new Stock object to the list of constituent companies.
+        remove_stock(symbol: str) -> Stock: Removes a constituent company from the index.
+        get(symbol: str) -> Optional[Stock]: Returns the constituent with the given symbol, if any.
+        ordinal(symbol: str) -> int: Returns the stable integer ordinal of a symbol.
+        stock_at(ordinal: int) -> Optional[Stock]: Returns the constituent with the given ordinal, if any.
+        record_trades(trades: Iterable[Tuple]) -> List[RejectedTrade]: Routes a batch of trades for many symbols.
+        calculate_dividend_yields(prices: Sequence[float], symbols: Optional[Sequence[str]]) -> array:
+            Calculates the dividend yields of many constituents in one pass.
+        calculate_pe_ratios(prices: Sequence[float], symbols: Optional[Sequence[str]]) -> array:
+            Calculates the P/E ratios of many constituents in one pass.
+        calculate_order_flows() -> Dict[str, OrderFlow]: Splits the trading of every constituent by side.
+        calculate_log_price_sum() -> Tuple[float, int]: Returns the running log-price sum and its stock count.
         calculate_all_share_index() -> float: Calculates the all-share index of the entire index.
+        subscribe(threshold: float, callback: ChangeCallback, symbol: Optional[str]): Calls back when a value moves.
+        unsubscribe(callback: ChangeCallback): Stops calling a callback back.
+        start_refresh_timer(interval: datetime.timedelta): Computes the index periodically in the background.
+        stop_refresh_timer(): Stops the refresh timer.
     """
 
-    def __init__(self):
+    RESYNC_INTERVAL = 10_000
+
+    def __init__(self, clock: Optional[Clock] = None, journal: Optional[Journal] = None, reactive: bool = False):
         """
         Initializes a new instance of the GBCE class.
 
+        Args:
+            clock (Optional[Clock]): A clock to share with every stock added to the index, so that recording
+                trades and sliding the 5 minute windows follow one timeline. By default stocks keep their own.
+            journal (Optional[Journal]): A write-ahead journal to share with every stock added to the index, so
+                that every trade recorded through the exchange survives a crash. Replay it with
+                jpmorgan.journal.replay_journal before opening it again.
+            reactive (bool): Whether constituents notify the exchange of their changes, so that computing the
+                index only visits the stocks that traded or whose window moved on. Stocks must not be listed
+                on two reactive exchanges at once.
+
         Attributes:
             stocks (List[Stock]): A list of Stock objects representing the constituent companies of the index.
+            clock (Optional[Clock]): The clock shared with every stock added to the index, if any.
+            journal (Optional[Journal]): The write-ahead journal shared with every stock added to the index, if any.
+            reactive (bool): Whether constituents notify the exchange of their changes instead of being polled.
+        """
+        self.clock = clock
+        self.journal = journal
+        self.reactive = reactive
+        self._lock = threading.RLock()
+        self._stocks: Dict[str, Stock] = {}
+        self._ordinals: Dict[str, int] = {}
+        self._stocks_by_ordinal: List[Optional[Stock]] = []
+        # Dividend bases by ordinal (NaN for unlisted ordinals), and the divisors of the P/E ratios, which are
+        # the same but infinite for a zero dividend so that its ratio comes out as 0. Stocks whose dividend
+        # inputs changed queue themselves in _stale_dividends and are refreshed before the next calculation.
+        self._dividends = array("d")
+        self._pe_divisors = array("d")
+        self._stale_dividends = set()
+        self._price_cache: Dict[Stock, Tuple[int, float]] = {}
+        self._order_flow_cache: Dict[Stock, Tuple[int, OrderFlow]] = {}
+        self._log_price_sum = 0.0
+        self._valid_stock_count = 0
+        self._updates_since_resync = 0
+        # Stocks append themselves from their writers' threads without taking the exchange's lock, which a
+        # deque supports safely.
+        self._changed: Deque[Stock] = deque()
+        self._expiries: List[Tuple[int, int, Stock]] = []
+        self._expiry_of: Dict[Stock, int] = {}
+        self._subscriptions: Dict[Optional[str], List[_Subscription]] = {}
+        self._timer: Optional[threading.Thread] = None
+        self._timer_stop = threading.Event()
+
+    @property
+    def stocks(self) -> List[Stock]:
+        """
+        A list of the constituent companies of the index, in the order they were added.
         """
-        self.stocks: List[Stock] = []
+        return list(self._stocks.values())
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._stocks
+
+    def __len__(self) -> int:
+        return len(self._stocks)
 
     def add_stock(self, stock: Stock):
         """
@@ -38,32 +164,480 @@ class GBCE:
 
         Returns:
             None
+
+        Raises:
+            ValueError: If a stock with the same symbol is already listed.
+        """
+        symbol = stock.symbol
+        with self._lock:
+            if symbol in self._stocks:
+                raise ValueError(f"stock {symbol!r} is already listed")
+            if self.clock is not None:
+                stock.clock = self.clock
+            if self.journal is not None:
+                stock.journal = self.journal
+            if self.reactive:
+                stock.listener = self._changed.append
+                self._changed.append(stock)
+            stock.dividend_listener = self._stale_dividends.add
+            self._stocks[symbol] = stock
+            ordinal = self._ordinals.get(symbol)
+            if ordinal is None:
+                ordinal = self._ordinals[symbol] = len(self._stocks_by_ordinal)
+                self._stocks_by_ordinal.append(stock)
+                self._dividends.append(math.nan)
+                self._pe_divisors.append(math.nan)
+            else:
+                self._stocks_by_ordinal[ordinal] = stock
+            self._stale_dividends.add(stock)
+
+    def remove_stock(self, symbol: str) -> Stock:
+        """
+        Removes a constituent company from the index. The symbol keeps its ordinal if it is listed again.
+
+        Args:
+            symbol (str): The symbol of the stock to remove.
+
+        Returns:
+            Stock: The removed stock.
+
+        Raises:
+            KeyError: If no stock with the symbol is listed.
+        """
+        with self._lock:
+            stock = self._stocks.pop(symbol)
+            ordinal = self._ordinals[symbol]
+            self._stocks_by_ordinal[ordinal] = None
+            stock.dividend_listener = None
+            self._stale_dividends.discard(stock)
+            self._dividends[ordinal] = math.nan
+            self._pe_divisors[ordinal] = math.nan
+            if self.reactive:
+                stock.listener = None
+                self._expiry_of.pop(stock, None)
+            self._order_flow_cache.pop(stock, None)
+            cached = self._price_cache.pop(stock, None)
+            if cached is not None:
+                self._replace_log_price(cached[1], 0)
+            return stock
+
+    def get(self, symbol: str) -> Optional[Stock]:
+        """
+        Returns the constituent with the given symbol.
+
+        Args:
+            symbol (str): The symbol of the stock.
+
+        Returns:
+            Optional[Stock]: The stock, or None if no stock with the symbol is listed.
+        """
+        return self._stocks.get(symbol)
+
+    def ordinal(self, symbol: str) -> int:
+        """
+        Returns the stable integer ordinal of a symbol that has been listed.
+
+        Args:
+            symbol (str): The symbol of the stock.
+
+        Returns:
+            int: The ordinal assigned to the symbol when it was first listed.
+
+        Raises:
+            KeyError: If the symbol has never been listed.
+        """
+        return self._ordinals[symbol]
+
+    def stock_at(self, ordinal: int) -> Optional[Stock]:
+        """
+        Returns the constituent with the given ordinal.
+
+        Args:
+            ordinal (int): The ordinal of the stock.
+
+        Returns:
+            Optional[Stock]: The stock, or None if the symbol with that ordinal is not currently listed.
+
+        Raises:
+            IndexError: If no symbol was ever given the ordinal.
+        """
+        return self._stocks_by_ordinal[ordinal]
+
+    def record_trades(
+        self, trades: Iterable[Tuple[Optional[Union[datetime.datetime, int]], str, int, str, float]]
+    ) -> List[RejectedTrade]:
+        """
+        Routes a batch of trades for many symbols to the constituent stocks, recording each stock's share at once.
+
+        Args:
+            trades (Iterable[Tuple]): (timestamp, symbol, quantity, indicator, price) rows, with timestamps as
+                accepted by Stock.record_trades.
+
+        Returns:
+            List[RejectedTrade]: The position in the batch and the reason of every rejected trade, in batch order.
+        """
+        stocks = self._stocks
+        batches: Dict[str, Tuple[List[int], List[tuple]]] = {}
+        rejected: List[RejectedTrade] = []
+
+        for row, (timestamp, symbol, quantity, indicator, price) in enumerate(trades):
+            if symbol not in stocks:
+                rejected.append(RejectedTrade(row, f"unknown symbol {symbol!r}"))
+                continue
+            batch = batches.get(symbol)
+            if batch is None:
+                batch = batches[symbol] = ([], [])
+            batch[0].append(row)
+            batch[1].append((timestamp, quantity, indicator, price))
+
+        for symbol, (rows, batch) in batches.items():
+            for rejection in stocks[symbol].record_trades(batch):
+                rejected.append(RejectedTrade(rows[rejection.row], rejection.reason))
+
+        rejected.sort()
+        return rejected
+
+    def calculate_dividend_yields(self, prices: Sequence[float], symbols: Optional[Sequence[str]] = None) -> array:
+        """
+        Calculates the dividend yields of many constituents in one pass.
+
+        Prices are matched to stocks by position: prices[i] is the price of symbols[i] if symbols are given,
+        and of the stock with ordinal i otherwise. The dividend bases are kept in an array by ordinal that is
+        updated whenever a stock is listed or removed or its dividend inputs change, so no per-stock attribute
+        is read. A dividend of zero gives a yield of 0; a price that is not positive, or an ordinal whose
+        symbol is not listed, gives NaN.
+
+        Args:
+            prices (Sequence[float]): The market prices, for example an array('d') or a NumPy array.
+            symbols (Optional[Sequence[str]]): The symbols the prices belong to.
+
+        Returns:
+            array: The dividend yields as an array('d'), which NumPy can wrap without copying.
+
+        Raises:
+            KeyError: If a symbol is not listed.
+            ValueError: If prices and the symbols or ordinals differ in length.
         """
-        self.stocks.append(stock)
+        dividends = self._dividend_table(self._dividends, prices, symbols)
+        if min(prices, default=1.0) > 0:
+            return array("d", list(map(truediv, dividends, prices)))
+        nan = math.nan
+        return array("d", [
+            dividend / price if price > 0 else nan for dividend, price in zip(dividends, prices)
+        ])
+
+    def calculate_pe_ratios(self, prices: Sequence[float], symbols: Optional[Sequence[str]] = None) -> array:
+        """
+        Calculates the price-to-earnings ratios of many constituents in one pass.
+
+        Prices are matched to stocks as in calculate_dividend_yields. A dividend of zero gives a ratio of 0, as
+        Stock.calculate_pe_ratio does; a price that is not positive, or an unlisted ordinal, gives NaN.
+
+        Args:
+            prices (Sequence[float]): The market prices, for example an array('d') or a NumPy array.
+            symbols (Optional[Sequence[str]]): The symbols the prices belong to.
+
+        Returns:
+            array: The P/E ratios as an array('d'), which NumPy can wrap without copying.
+
+        Raises:
+            KeyError: If a symbol is not listed.
+            ValueError: If prices and the symbols or ordinals differ in length.
+        """
+        divisors = self._dividend_table(self._pe_divisors, prices, symbols)
+        if min(prices, default=1.0) > 0:
+            return array("d", list(map(truediv, prices, divisors)))
+        nan = math.nan
+        return array("d", [
+            price / divisor if price > 0 else nan for divisor, price in zip(divisors, prices)
+        ])
+
+    def _dividend_table(self, table: array, prices: Sequence[float], symbols: Optional[Sequence[str]]) -> array:
+        with self._lock:
+            stale = self._stale_dividends
+            while stale:
+                stock = stale.pop()
+                if self._stocks.get(stock.symbol) is stock:
+                    ordinal = self._ordinals[stock.symbol]
+                    dividend = stock.dividend
+                    self._dividends[ordinal] = dividend
+                    self._pe_divisors[ordinal] = dividend if dividend != 0 else math.inf
+            if symbols is None:
+                # A copy, so that the result does not change under a concurrent listing.
+                values = table[:]
+            else:
+                stocks = self._stocks
+                ordinals = self._ordinals
+                values = array("d")
+                for symbol in symbols:
+                    if symbol not in stocks:
+                        raise KeyError(symbol)
+                    values.append(table[ordinals[symbol]])
+        if len(values) != len(prices):
+            raise ValueError(f"expected {len(values)} prices, got {len(prices)}")
+        return values
+
+    def calculate_volume_weighted_stock_price(self, stock: Stock) -> float:
+        """
+        Returns the volume-weighted stock price of a constituent, recomputing it only if the stock changed.
+
+        The price of a stock that is not a constituent, for example one removed by another thread, is computed
+        directly and neither cached nor counted in the index.
+
+        Args:
+            stock (Stock): A constituent of the index.
+
+        Returns:
+            float: The volume-weighted stock price of the stock over the last 5 minutes.
+        """
+        # Read the version before the price: if a trade lands in between, the cached price is newer than its
+        # version and the next call recomputes it, whereas the other order could cache a stale price for good.
+        version = stock.version
+        with self._lock:
+            if self._stocks.get(stock.symbol) is not stock:
+                return stock.calculate_volume_weighted_stock_price()
+            cached = self._price_cache.get(stock)
+            if cached is not None and cached[0] == version:
+                if METRICS.enabled:
+                    METRICS.increment("gbce_price_cache_hits_total", 1, stock.symbol)
+                return cached[1]
+            if METRICS.enabled:
+                METRICS.increment("gbce_price_cache_misses_total", 1, stock.symbol)
+            price = stock.calculate_volume_weighted_stock_price()
+            self._price_cache[stock] = (version, price)
+            self._replace_log_price(cached[1] if cached is not None else 0, price)
+            return price
+
+    def calculate_order_flows(self) -> Dict[str, OrderFlow]:
+        """
+        Splits the trading of every constituent over the last 5 minutes by side, in one pass.
+
+        Like the volume-weighted prices, the order flow of every constituent is cached together with the
+        stock's version, so only stocks that traded or whose 5 minute window moved on are recomputed.
+
+        Returns:
+            Dict[str, OrderFlow]: The order flow of every constituent, by symbol, in the order they were added.
+        """
+        with self._lock:
+            cache = self._order_flow_cache
+            flows = {}
+            for symbol, stock in self._stocks.items():
+                # Version first, as in calculate_volume_weighted_stock_price.
+                version = stock.version
+                cached = cache.get(stock)
+                if cached is None or cached[0] != version:
+                    cached = cache[stock] = (version, stock.calculate_order_flow())
+                flows[symbol] = cached[1]
+            return flows
+
+    def calculate_log_price_sum(self) -> Tuple[float, int]:
+        """
+        Brings the running log-price sum up to date and returns it with the number of stocks it covers.
+
+        Partial sums of several exchanges add up, which is how a sharded exchange assembles its index.
+
+        Returns:
+            Tuple[float, int]: The sum of the log volume-weighted prices of the constituents with a positive
+            price, and the number of such constituents.
+        """
+        with self._lock:
+            moves = self._update_prices()
+            log_price_sum = self._log_price_sum, self._valid_stock_count
+        self._notify(moves)
+        return log_price_sum
 
-    @lru_cache(None)
     def calculate_all_share_index(self) -> float:
         """
         Calculates the all-share index of the entire index.
 
+        The index is the geometric mean of the volume-weighted prices of the constituents that have a
+        positive price, evaluated as the exponential of the mean log-price.
+
         Returns:
             float: The all-share index of the entire index.
         """
-        n = len(self.stocks)
-        if n == 0:
+        started = perf_counter_ns() if METRICS.enabled else 0
+        with self._lock:
+            moves = self._update_prices()
+            index = self._index()
+            self._find_moves(None, index, moves)
+        self._notify(moves)
+        if started:
+            METRICS.observe("gbce_index_seconds", perf_counter_ns() - started)
+        return index
+
+    def _index(self) -> float:
+        if self._valid_stock_count == 0:
             return 0.0
+        return math.exp(self._log_price_sum / self._valid_stock_count)
 
-        product_of_prices = 1.0
-        valid_stock_count = 0
+    def _update_prices(self) -> List[Move]:
+        moves = []
+        subscriptions = self._subscriptions
+        if not self.reactive:
+            for stock in self._stocks.values():
+                price = self.calculate_volume_weighted_stock_price(stock)
+                if subscriptions and stock.symbol in subscriptions:
+                    self._find_moves(stock.symbol, price, moves)
+        else:
+            changed = self._changed
+            now_ns = (self.clock if self.clock is not None else WALL_CLOCK).now_ns()
+            expiries = self._expiries
+            while expiries and expiries[0][0] <= now_ns:
+                expiry_ns, _, stock = heappop(expiries)
+                if self._expiry_of.get(stock) == expiry_ns:
+                    del self._expiry_of[stock]
+                    changed.append(stock)
 
-        for stock in self.stocks:
-            price = stock.calculate_volume_weighted_stock_price()
-            if price > 0:
-                product_of_prices *= price
-                valid_stock_count += 1
+            # Only visit the stocks queued so far: ones that trade again meanwhile are picked up next time.
+            for _ in range(len(changed)):
+                stock = changed.popleft()
+                symbol = stock.symbol
+                if self._stocks.get(symbol) is not stock:
+                    continue
+                stock.mark_clean()
+                price = self.calculate_volume_weighted_stock_price(stock)
+                expiry_ns = stock.next_expiry_ns
+                if expiry_ns is None:
+                    self._expiry_of.pop(stock, None)
+                elif self._expiry_of.get(stock) != expiry_ns:
+                    self._expiry_of[stock] = expiry_ns
+                    heappush(expiries, (expiry_ns, self._ordinals[symbol], stock))
+                if subscriptions and symbol in subscriptions:
+                    self._find_moves(symbol, price, moves)
 
-        if valid_stock_count == 0:
-            return 0.0
+        if self._updates_since_resync >= self.RESYNC_INTERVAL:
+            self._resync()
+        return moves
+
+    def _find_moves(self, symbol: Optional[str], value: float, moves: List[Move]):
+        for subscription in self._subscriptions.get(symbol, ()):
+            last = subscription.value
+            if last == 0:
+                moved = value != 0
+            else:
+                moved = abs(value - last) > subscription.threshold * abs(last)
+            if moved:
+                subscription.value = value
+                moves.append((subscription.callback, symbol, value))
+
+    @staticmethod
+    def _notify(moves: List[Move]):
+        # Callbacks run after the exchange's lock is released, so they may read from the exchange. A failing
+        # callback is logged rather than raised, so that it neither fails the caller's calculation nor keeps
+        # the other callbacks, or the refresh timer, from running.
+        for callback, symbol, value in moves:
+            try:
+                callback(symbol, value)
+            except Exception:
+                logger.exception("change callback %r failed for %s", callback, symbol or "the index")
+
+    def subscribe(self, threshold: float, callback: ChangeCallback, symbol: Optional[str] = None):
+        """
+        Subscribes a callback to the all-share index or to the volume-weighted price of a constituent.
+
+        The callback is called whenever the value moved by more than the threshold, relative to the value it
+        was last called with (or, the first time, to the last value the exchange computed). Slow drifts
+        therefore add up until they cross the threshold. A move away from or back to 0 always counts.
+        Exceptions raised by the callback are logged and otherwise ignored.
+
+        Args:
+            threshold (float): The relative move that triggers the callback, for example 0.001 for 0.1%. With 0,
+                every change triggers it.
+            callback (ChangeCallback): Called with the symbol (None for the index) and the new value.
+            symbol (Optional[str]): The symbol to watch. By default, the index is watched.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the threshold is negative.
+        """
+        if threshold < 0:
+            raise ValueError("threshold must not be negative")
+        with self._lock:
+            if symbol is None:
+                value = self._index()
+            else:
+                stock = self._stocks.get(symbol)
+                cached = self._price_cache.get(stock) if stock is not None else None
+                value = cached[1] if cached is not None else 0.0
+            subscriptions = self._subscriptions.get(symbol, [])
+            self._subscriptions[symbol] = subscriptions + [_Subscription(callback, threshold, value)]
+
+    def unsubscribe(self, callback: ChangeCallback):
+        """
+        Unsubscribes a callback from every value it was subscribed to.
+
+        Args:
+            callback (ChangeCallback): The callback passed to subscribe.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for symbol, subscriptions in list(self._subscriptions.items()):
+                kept = [subscription for subscription in subscriptions if subscription.callback is not callback]
+                if kept:
+                    self._subscriptions[symbol] = kept
+                else:
+                    del self._subscriptions[symbol]
+
+    def start_refresh_timer(self, interval: datetime.timedelta):
+        """
+        Starts computing the index every interval on a background thread, so that subscribers are called back
+        even when nobody reads the index.
+
+        Args:
+            interval (datetime.timedelta): The time between two refreshes.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the interval is not positive or the timer is already running.
+        """
+        if interval <= datetime.timedelta(0):
+            raise ValueError("interval must be positive")
+        with self._lock:
+            if self._timer is not None:
+                raise ValueError("the refresh timer is already running")
+            self._timer_stop.clear()
+            self._timer = threading.Thread(
+                target=self._refresh_periodically, args=(interval.total_seconds(),), name="gbce-refresh", daemon=True
+            )
+            self._timer.start()
+
+    def stop_refresh_timer(self):
+        """
+        Stops the refresh timer, if it is running, and waits for its thread to finish.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            self._timer_stop.set()
+            timer.join()
+
+    def _refresh_periodically(self, interval: float):
+        while not self._timer_stop.wait(interval):
+            self.calculate_all_share_index()
 
-        return product_of_prices ** (1 / valid_stock_count)
+    def _replace_log_price(self, old_price: float, new_price: float):
+        if old_price == new_price:
+            return
+        if old_price > 0:
+            self._log_price_sum -= math.log(old_price)
+            self._valid_stock_count -= 1
+        if new_price > 0:
+            self._log_price_sum += math.log(new_price)
+            self._valid_stock_count += 1
+        self._updates_since_resync += 1
 
+    def _resync(self):
+        prices = [price for _, price in self._price_cache.values() if price > 0]
+        self._log_price_sum = math.fsum(math.log(price) for price in prices)
+        self._valid_stock_count = len(prices)
+        self._updates_since_resync = 0
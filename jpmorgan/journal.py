@@ -0,0 +1,393 @@
+import datetime
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from jpmorgan.gbce import GBCE
+
+# payload length, CRC-32 of the payload
+RECORD_HEADER = struct.Struct("<II")
+# symbol length, trade count; followed by the symbol and the timestamp, quantity, price and side columns
+RECORD_PREFIX = struct.Struct("<HI")
+# the columns of a single trade record
+SINGLE_TRADE = struct.Struct("<qqdb")
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".wal"
+
+JournalRecord = Tuple[str, array, array, array, array]
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder == "little" or column.itemsize == 1:
+        return column.tobytes()
+    swapped = column[:]
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def segment_numbers(directory: str) -> List[int]:
+    """
+    Lists the journal segments in a directory.
+
+    Parameters:
+        directory (str): The journal directory.
+
+    Returns:
+        List[int]: The segment numbers, in ascending order.
+    """
+    numbers = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            number = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+            if number.isdigit():
+                numbers.append(int(number))
+    return sorted(numbers)
+
+
+def segment_path(directory: str, number: int) -> str:
+    """
+    Returns the path of a journal segment.
+
+    Parameters:
+        directory (str): The journal directory.
+        number (int): The segment number.
+
+    Returns:
+        str: The segment file path.
+    """
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{number:012d}{SEGMENT_SUFFIX}")
+
+
+class Journal:
+    """
+    An append-only, write-ahead journal of recorded trades.
+
+    Stocks with a journal append every trade to it before applying the trade in memory. Records are binary
+    and length-prefixed: a payload length and CRC-32, then the symbol and the trades as columns, so a batch
+    of trades for one symbol is a single record. Records are collected in memory and written out once
+    sync_bytes are pending; a background thread fsyncs the journal every sync_interval, outside the append
+    lock, so recording trades never waits for the disk. A trade is durable once the next sync has finished,
+    which sync() waits for explicitly.
+
+    The journal is split into numbered segment files that are rotated once they reach segment_bytes. A new
+    journal always starts a new segment, so a segment torn by a crash is never appended to.
+
+    Attributes:
+        directory (str): The directory the segments are written to.
+        sync_bytes (int): The number of buffered bytes that triggers a write to the segment file.
+        sync_interval (datetime.timedelta): The longest time between two fsyncs while there is data to sync.
+        segment_bytes (int): The size a segment grows to before the journal rotates to a new one.
+    """
+    SYNC_BYTES = 1 << 20
+    SYNC_INTERVAL = datetime.timedelta(milliseconds=50)
+    SEGMENT_BYTES = 64 << 20
+
+    def __init__(
+        self,
+        directory: str,
+        sync_bytes: Optional[int] = None,
+        sync_interval: Optional[datetime.timedelta] = None,
+        segment_bytes: Optional[int] = None,
+    ):
+        """
+        Opens a journal, starting a new segment after the ones already in the directory.
+
+        Parameters:
+            directory (str): The directory the segments are written to. It is created if it does not exist.
+            sync_bytes (Optional[int]): The number of buffered bytes that triggers a write. Defaults to SYNC_BYTES.
+            sync_interval (Optional[datetime.timedelta]): The longest time between two fsyncs. Defaults to
+                SYNC_INTERVAL.
+            segment_bytes (Optional[int]): The size at which segments are rotated. Defaults to SEGMENT_BYTES.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sync_bytes = sync_bytes if sync_bytes is not None else self.SYNC_BYTES
+        self.sync_interval = sync_interval if sync_interval is not None else self.SYNC_INTERVAL
+        self.segment_bytes = segment_bytes if segment_bytes is not None else self.SEGMENT_BYTES
+        if self.sync_interval <= datetime.timedelta(0):
+            raise ValueError("sync_interval must be positive")
+
+        # Appends take _lock; syncs and rotations take _sync_lock first, so fsync never blocks an append.
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._buffer = bytearray()
+        self._symbols: Dict[str, bytes] = {}
+        numbers = segment_numbers(directory)
+        self._segment = numbers[-1] + 1 if numbers else 0
+        self._file = open(segment_path(directory, self._segment), "ab")
+        self._written = 0
+        self._dirty = False
+        self._closed = False
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="journal-sync", daemon=True)
+        self._flusher.start()
+
+    @property
+    def segment(self) -> int:
+        """
+        The number of the segment currently appended to.
+        """
+        return self._segment
+
+    def _encoded(self, symbol: str) -> bytes:
+        encoded = self._symbols.get(symbol)
+        if encoded is None:
+            encoded = self._symbols[symbol] = symbol.encode("utf-8")
+        return encoded
+
+    def append(self, symbol: str, timestamp_ns: int, quantity: int, side: int, price: float):
+        """
+        Appends a single trade.
+
+        Parameters:
+            symbol (str): The stock's symbol.
+            timestamp_ns (int): The time of the trade in nanoseconds since the epoch.
+            quantity (int): The number of shares traded.
+            side (int): The side code of the trade.
+            price (float): The price at which the trade was executed.
+
+        Returns:
+            None
+        """
+        encoded = self._encoded(symbol)
+        payload = b"".join((
+            RECORD_PREFIX.pack(len(encoded), 1), encoded, SINGLE_TRADE.pack(timestamp_ns, quantity, price, side)
+        ))
+        self._append(payload)
+
+    def append_columns(self, symbol: str, timestamps: array, quantities: array, sides: array, prices: array):
+        """
+        Appends a batch of trades for one symbol as a single record.
+
+        Parameters:
+            symbol (str): The stock's symbol.
+            timestamps (array): The times of the trades in nanoseconds since the epoch.
+            quantities (array): The numbers of shares traded.
+            sides (array): The side codes of the trades.
+            prices (array): The prices at which the trades were executed.
+
+        Returns:
+            None
+        """
+        encoded = self._encoded(symbol)
+        payload = b"".join((
+            RECORD_PREFIX.pack(len(encoded), len(timestamps)),
+            encoded,
+            _little_endian(timestamps),
+            _little_endian(quantities),
+            _little_endian(prices),
+            sides.tobytes(),
+        ))
+        self._append(payload)
+
+    def _append(self, payload: bytes):
+        with self._lock:
+            if self._closed:
+                raise ValueError("the journal is closed")
+            buffer = self._buffer
+            buffer += RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+            buffer += payload
+            self._dirty = True
+            if len(buffer) >= self.sync_bytes:
+                self._write_buffer()
+                self._wake.set()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._written += len(self._buffer)
+            self._buffer = bytearray()
+
+    def sync(self):
+        """
+        Writes out and fsyncs every trade appended so far, rotating the segment if it is full.
+
+        Returns:
+            None
+        """
+        with self._sync_lock:
+            retired = None
+            with self._lock:
+                if self._file.closed or not self._dirty:
+                    return
+                self._dirty = False
+                self._write_buffer()
+                if self._written >= self.segment_bytes:
+                    retired = self._file
+                    self._open_segment(self._segment + 1)
+                else:
+                    self._file.flush()
+                file = self._file
+            if retired is not None:
+                retired.flush()
+                os.fsync(retired.fileno())
+                retired.close()
+            os.fsync(file.fileno())
+
+    def rotate(self) -> int:
+        """
+        Syncs the journal and starts a new segment, for example before older segments are removed.
+
+        Returns:
+            int: The number of the new segment.
+        """
+        with self._sync_lock:
+            with self._lock:
+                self._write_buffer()
+                retired = self._file
+                self._open_segment(self._segment + 1)
+                segment = self._segment
+            retired.flush()
+            os.fsync(retired.fileno())
+            retired.close()
+        return segment
+
+    def _open_segment(self, number: int):
+        self._segment = number
+        self._file = open(segment_path(self.directory, number), "ab")
+        self._written = 0
+
+    def remove_segments_before(self, number: int) -> int:
+        """
+        Deletes the segments older than the given one.
+
+        Parameters:
+            number (int): The number of the oldest segment to keep.
+
+        Returns:
+            int: The number of segments deleted.
+        """
+        removed = 0
+        for old in segment_numbers(self.directory):
+            if old >= number or old == self._segment:
+                break
+            os.remove(segment_path(self.directory, old))
+            removed += 1
+        return removed
+
+    def _flush_periodically(self):
+        interval = self.sync_interval.total_seconds()
+        while not self._closed:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.sync()
+
+    def close(self):
+        """
+        Syncs the journal and closes it. Appending to a closed journal raises ValueError.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        self.sync()
+        with self._sync_lock, self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _read_columns(data: bytes, offset: int, count: int) -> Tuple[array, array, array, array]:
+    columns = []
+    for typecode in "qqdb":
+        column = array(typecode)
+        end = offset + count * column.itemsize
+        column.frombytes(data[offset:end])
+        if sys.byteorder != "little" and column.itemsize > 1:
+            column.byteswap()
+        columns.append(column)
+        offset = end
+    timestamps, quantities, prices, sides = columns
+    return timestamps, quantities, sides, prices
+
+
+def read_segment(path: str) -> Iterator[JournalRecord]:
+    """
+    Reads the records of a journal segment.
+
+    A record cut short by the end of the file, or a damaged last record, is what a crash during a write
+    leaves behind; it was never synced and is skipped. A damaged record followed by more data is corruption.
+
+    Parameters:
+        path (str): The segment file path.
+
+    Returns:
+        Iterator[JournalRecord]: (symbol, timestamps, quantities, sides, prices) records, in journal order.
+
+    Raises:
+        ValueError: If a record other than the last one is damaged.
+    """
+    with open(path, "rb") as segment:
+        data = segment.read()
+    offset = 0
+    size = len(data)
+    while offset + RECORD_HEADER.size <= size:
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + length
+        if end > size:
+            return
+        payload = data[start:end]
+        if zlib.crc32(payload) != crc:
+            if end == size:
+                return
+            raise ValueError(f"{path} is corrupt at offset {offset}")
+        symbol_length, count = RECORD_PREFIX.unpack_from(payload)
+        symbol = payload[RECORD_PREFIX.size:RECORD_PREFIX.size + symbol_length].decode("utf-8")
+        yield (symbol, *_read_columns(payload, RECORD_PREFIX.size + symbol_length, count))
+        offset = end
+
+
+def read_journal(directory: str) -> Iterator[JournalRecord]:
+    """
+    Reads every record of a journal, oldest segment first.
+
+    Parameters:
+        directory (str): The journal directory.
+
+    Returns:
+        Iterator[JournalRecord]: (symbol, timestamps, quantities, sides, prices) records, in journal order.
+    """
+    for number in segment_numbers(directory):
+        yield from read_segment(segment_path(directory, number))
+
+
+def replay_journal(directory: str, gbce: "GBCE") -> int:
+    """
+    Replays a journal into an exchange on startup, before a new Journal is opened in the same directory.
+
+    The trades are stored without being validated or journaled again. Trades for symbols the exchange does
+    not list are skipped, so the constituents have to be added first.
+
+    Parameters:
+        directory (str): The journal directory. A missing directory holds no trades.
+        gbce (GBCE): The exchange to replay into.
+
+    Returns:
+        int: The number of trades replayed.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    replayed = 0
+    for symbol, timestamps, quantities, sides, prices in read_journal(directory):
+        stock = gbce.get(symbol)
+        if stock is None or not timestamps:
+            continue
+        stock.replay_trades(timestamps, quantities, sides, prices)
+        replayed += len(timestamps)
+    return replayed
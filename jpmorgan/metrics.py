@@ -0,0 +1,317 @@
+import datetime
+import logging
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in nanoseconds: 1 microsecond to about 8.6 seconds in
+# powers of two. Slower calls fall into an unbounded last bucket.
+LATENCY_BOUNDS_NS = tuple(1000 << shift for shift in range(24))
+
+SlowCallHook = Callable[[str, Optional[str], int], None]
+MetricKey = Tuple[str, Optional[str]]
+
+
+class Histogram:
+    """
+    A latency histogram with fixed power-of-two buckets.
+
+    Attributes:
+        counts (List[int]): The number of observations in each bucket of LATENCY_BOUNDS_NS, plus an overflow bucket.
+        count (int): The number of observations.
+        total_ns (int): The sum of the observations, in nanoseconds.
+    """
+    __slots__ = ("counts", "count", "total_ns")
+
+    def __init__(self):
+        """
+        Initializes an empty histogram.
+        """
+        self.counts = [0] * (len(LATENCY_BOUNDS_NS) + 1)
+        self.count = 0
+        self.total_ns = 0
+
+    def observe(self, elapsed_ns: int):
+        """
+        Adds an observation.
+
+        Parameters:
+            elapsed_ns (int): The observed latency in nanoseconds.
+
+        Returns:
+            None
+        """
+        self.counts[bisect_left(LATENCY_BOUNDS_NS, elapsed_ns)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in.
+
+        Parameters:
+            fraction (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimated latency in nanoseconds, infinity if it is in the overflow bucket, or 0 if the
+            histogram is empty.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BOUNDS_NS, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return float("inf")
+
+
+class Metrics:
+    """
+    A registry of counters, gauges and latency histograms for the trade, price and index hot paths.
+
+    Metrics are keyed by name and an optional symbol, so every per-stock metric also has a per-symbol
+    breakdown. The instrumented code checks enabled once per call and does nothing else while it is False,
+    so a disabled registry costs one branch. Hooks can be attached to be called with the name, symbol and
+    latency of every timed call slower than a threshold, for example to capture a profile of outliers.
+
+    The module-level METRICS registry is the one Stock and GBCE report to. It is disabled by default.
+
+    Metric names:
+        gbce_record_trade_seconds (histogram): Stock.record_trade latency, per symbol.
+        gbce_record_trades_seconds (histogram): Stock.record_trades latency for a whole batch, per symbol.
+        gbce_trades_recorded_total (counter): Trades recorded, per symbol.
+        gbce_trades_expired_total (counter): Trades that left the 5 minute window, per symbol.
+        gbce_trades_retired_total (counter): Trades evicted from memory by a retention policy, per symbol.
+        gbce_window_trades (gauge): Trades inside the 5 minute window, per symbol.
+        gbce_vwsp_seconds (histogram): Stock.calculate_volume_weighted_stock_price latency, per symbol.
+        gbce_price_cache_hits_total (counter): Prices GBCE served from its cache, per symbol.
+        gbce_price_cache_misses_total (counter): Prices GBCE had to recompute, per symbol.
+        gbce_index_seconds (histogram): GBCE.calculate_all_share_index latency.
+
+    Attributes:
+        enabled (bool): Whether the instrumented code reports to the registry.
+    """
+    def __init__(self, enabled: bool = False):
+        """
+        Initializes an empty registry.
+
+        Parameters:
+            enabled (bool): Whether the registry starts enabled.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, int] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, Histogram] = {}
+        self._hooks: List[Tuple[Optional[str], int, SlowCallHook]] = []
+
+    def enable(self):
+        """
+        Starts collecting metrics.
+
+        Returns:
+            None
+        """
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stops collecting metrics. The values collected so far are kept.
+
+        Returns:
+            None
+        """
+        self.enabled = False
+
+    def reset(self):
+        """
+        Clears every metric. Slow call hooks are kept.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def increment(self, name: str, amount: int = 1, symbol: Optional[str] = None):
+        """
+        Adds to a counter.
+
+        Parameters:
+            name (str): The name of the counter.
+            amount (int): The amount to add.
+            symbol (Optional[str]): The symbol the count belongs to, if any.
+
+        Returns:
+            None
+        """
+        key = (name, symbol)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, symbol: Optional[str] = None):
+        """
+        Sets a gauge.
+
+        Parameters:
+            name (str): The name of the gauge.
+            value (float): The current value.
+            symbol (Optional[str]): The symbol the value belongs to, if any.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._gauges[(name, symbol)] = value
+
+    def observe(self, name: str, elapsed_ns: int, symbol: Optional[str] = None):
+        """
+        Records the latency of a call and runs the hooks it is slow enough for.
+
+        Parameters:
+            name (str): The name of the histogram.
+            elapsed_ns (int): The latency in nanoseconds.
+            symbol (Optional[str]): The symbol the call was for, if any.
+
+        Returns:
+            None
+        """
+        key = (name, symbol)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(elapsed_ns)
+        for hook_name, threshold_ns, hook in self._hooks:
+            if elapsed_ns >= threshold_ns and (hook_name is None or hook_name == name):
+                try:
+                    hook(name, symbol, elapsed_ns)
+                except Exception:
+                    logger.exception("slow call hook %r failed for %s", hook, name)
+
+    def add_slow_call_hook(
+        self,
+        threshold: Union[datetime.timedelta, int],
+        hook: SlowCallHook,
+        name: Optional[str] = None,
+    ):
+        """
+        Attaches a hook that is called for every timed call at least as slow as the threshold.
+
+        The hook runs on the thread that made the call, after the call has finished. Exceptions raised by the
+        hook are logged and otherwise ignored.
+
+        Parameters:
+            threshold (Union[datetime.timedelta, int]): The latency, as a timedelta or nanoseconds.
+            hook (SlowCallHook): Called with the histogram name, the symbol (or None) and the latency in nanoseconds.
+            name (Optional[str]): Only calls timed by this histogram trigger the hook. By default, all do.
+
+        Returns:
+            None
+        """
+        if isinstance(threshold, datetime.timedelta):
+            threshold = threshold // datetime.timedelta(microseconds=1) * 1000
+        with self._lock:
+            self._hooks = self._hooks + [(name, threshold, hook)]
+
+    def remove_slow_call_hook(self, hook: SlowCallHook):
+        """
+        Detaches a hook.
+
+        Parameters:
+            hook (SlowCallHook): The hook passed to add_slow_call_hook.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._hooks = [entry for entry in self._hooks if entry[2] is not hook]
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of every metric.
+
+        Returns:
+            dict: {"counters": ..., "gauges": ..., "histograms": ...}, each mapping a metric name to a dict
+            keyed by symbol (None for metrics without one). Histograms are given as a dict with the count,
+            sum_ns, p50_ns, p99_ns and the per-bucket counts.
+        """
+        with self._lock:
+            snapshot = {"counters": {}, "gauges": {}, "histograms": {}}
+            for (name, symbol), value in self._counters.items():
+                snapshot["counters"].setdefault(name, {})[symbol] = value
+            for (name, symbol), value in self._gauges.items():
+                snapshot["gauges"].setdefault(name, {})[symbol] = value
+            for (name, symbol), histogram in self._histograms.items():
+                snapshot["histograms"].setdefault(name, {})[symbol] = {
+                    "count": histogram.count,
+                    "sum_ns": histogram.total_ns,
+                    "p50_ns": histogram.quantile(0.5),
+                    "p99_ns": histogram.quantile(0.99),
+                    "buckets": list(histogram.counts),
+                }
+            return snapshot
+
+    def prometheus(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format. Latencies are exported in seconds.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items(), key=_sort_key)
+            gauges = sorted(self._gauges.items(), key=_sort_key)
+            histograms = sorted(
+                ((key, list(histogram.counts), histogram.count, histogram.total_ns)
+                 for key, histogram in self._histograms.items()),
+                key=_sort_key,
+            )
+
+        lines = []
+        declared = set()
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for (name, symbol), value in metrics:
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(symbol)} {value}")
+        for (name, symbol), counts, count, total_ns in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BOUNDS_NS, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels(symbol, le=repr(bound / 1e9))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(symbol, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_labels(symbol)} {total_ns / 1e9!r}")
+            lines.append(f"{name}_count{_labels(symbol)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _sort_key(item) -> Tuple[str, str]:
+    name, symbol = item[0]
+    return name, symbol or ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(symbol: Optional[str], le: Optional[str] = None) -> str:
+    labels = []
+    if symbol is not None:
+        labels.append(f'symbol="{_escape(symbol)}"')
+    if le is not None:
+        labels.append(f'le="{le}"')
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+METRICS = Metrics()
@@ -0,0 +1,234 @@
+import csv
+import datetime
+import mmap
+import struct
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+from jpmorgan.gbce import GBCE
+from jpmorgan.trade import SIDE_CODES, SIDE_INDICATORS, to_epoch_ns
+
+TapeRow = Tuple[int, str, int, str, float]
+
+CSV_FIELDS = ("timestamp", "symbol", "quantity", "indicator", "price")
+
+# timestamp (epoch ns), symbol (ASCII, NUL padded), quantity, price, side code
+BINARY_RECORD = struct.Struct("<q8sqdb")
+
+
+class MalformedRow(NamedTuple):
+    """
+    A line of a CSV tape that could not be read as a trade, in place of the trade it should have been.
+
+    Attributes:
+        line (int): The line number in the file.
+        reason (str): A message describing why the line is malformed.
+    """
+    line: int
+    reason: str
+
+
+class Snapshot(NamedTuple):
+    """
+    The state of the exchange at a point of a replay.
+
+    Attributes:
+        timestamp_ns (int): The event time of the snapshot in nanoseconds since the epoch.
+        all_share_index (float): The all-share index at that time.
+        prices (Dict[str, float]): The volume-weighted stock price of every constituent at that time.
+        trades (int): The number of trades replayed so far.
+        rejected (int): The number of trades rejected so far, including malformed rows.
+    """
+    timestamp_ns: int
+    all_share_index: float
+    prices: Dict[str, float]
+    trades: int
+    rejected: int
+
+
+def _parse_timestamp(value: str) -> Union[int, str]:
+    # Unparseable timestamps are passed through too: Stock.record_trades rejects timestamps that are not integers.
+    if value.isdigit():
+        return int(value)
+    try:
+        return to_epoch_ns(datetime.datetime.fromisoformat(value))
+    except ValueError:
+        return value
+
+
+def _parse_number(value: str, kind: type):
+    # Unparseable fields are passed through so that batch validation reports them as rejected rows.
+    try:
+        return kind(value)
+    except ValueError:
+        return value
+
+
+def read_csv(path: str, chunk_size: int = 65536) -> Iterator[List[Union[TapeRow, MalformedRow]]]:
+    """
+    Streams a CSV trade tape in chunks without loading the whole file.
+
+    The file must have a timestamp,symbol,quantity,indicator,price header. Timestamps may be integer
+    nanoseconds since the epoch or ISO 8601 datetimes. Malformed rows do not stop the tape: unparseable
+    fields are passed through as text, so that GBCE.record_trades rejects them with the reason, and a row
+    with missing or extra fields is replaced by a MalformedRow saying so. Blank lines are skipped.
+
+    Parameters:
+        path (str): The path of the CSV file.
+        chunk_size (int): The maximum number of trades per chunk.
+
+    Returns:
+        Iterator[List[Union[TapeRow, MalformedRow]]]: Chunks of (timestamp_ns, symbol, quantity, indicator,
+        price) rows and malformed rows.
+    """
+    with open(path, newline="") as tape:
+        reader = csv.reader(tape)
+        header = next(reader, None)
+        if header is None:
+            return
+        if tuple(field.strip() for field in header) != CSV_FIELDS:
+            raise ValueError(f"expected a {','.join(CSV_FIELDS)} header, got {','.join(header)}")
+        chunk: List[Union[TapeRow, MalformedRow]] = []
+        for fields in reader:
+            if not fields:
+                continue
+            if len(fields) == len(CSV_FIELDS):
+                timestamp, symbol, quantity, indicator, price = fields
+                chunk.append((
+                    _parse_timestamp(timestamp),
+                    symbol,
+                    _parse_number(quantity, int),
+                    indicator,
+                    _parse_number(price, float),
+                ))
+            else:
+                chunk.append(MalformedRow(reader.line_num, f"expected {len(CSV_FIELDS)} fields, got {len(fields)}"))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def write_binary(path: str, rows: Iterable[Tuple[int, str, int, str, float]]):
+    """
+    Writes trades to a fixed-width binary tape readable by read_binary.
+
+    Parameters:
+        path (str): The path of the file to write.
+        rows (Iterable[Tuple]): (timestamp_ns, symbol, quantity, indicator, price) rows. Symbols are encoded
+            as ASCII and must be at most 8 characters long.
+
+    Returns:
+        None
+    """
+    with open(path, "wb") as tape:
+        for timestamp_ns, symbol, quantity, indicator, price in rows:
+            encoded = symbol.encode("ascii")
+            if len(encoded) > 8:
+                raise ValueError(f"symbol {symbol!r} is longer than 8 characters")
+            tape.write(BINARY_RECORD.pack(timestamp_ns, encoded, quantity, price, SIDE_CODES[indicator]))
+
+
+def read_binary(path: str, chunk_size: int = 65536) -> Iterator[List[TapeRow]]:
+    """
+    Streams a fixed-width binary trade tape in chunks through a memory map.
+
+    Parameters:
+        path (str): The path of the binary tape.
+        chunk_size (int): The maximum number of trades per chunk.
+
+    Returns:
+        Iterator[List[TapeRow]]: Chunks of (timestamp_ns, symbol, quantity, indicator, price) rows.
+    """
+    with open(path, "rb") as tape:
+        tape.seek(0, 2)
+        size = tape.tell()
+        if size == 0:
+            return
+        if size % BINARY_RECORD.size:
+            raise ValueError(f"{path} is not a whole number of {BINARY_RECORD.size} byte records")
+        with mmap.mmap(tape.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            chunk_bytes = chunk_size * BINARY_RECORD.size
+            symbols: Dict[bytes, str] = {}
+            for offset in range(0, size, chunk_bytes):
+                chunk: List[TapeRow] = []
+                for timestamp_ns, symbol, quantity, price, side in BINARY_RECORD.iter_unpack(
+                    mapped[offset:offset + chunk_bytes]
+                ):
+                    name = symbols.get(symbol)
+                    if name is None:
+                        name = symbols[symbol] = symbol.rstrip(b"\0").decode("ascii")
+                    chunk.append((timestamp_ns, name, quantity, SIDE_INDICATORS.get(side, side), price))
+                yield chunk
+
+
+def _record(gbce: GBCE, rows: List[Union[TapeRow, MalformedRow]], malformed: bool) -> int:
+    # Returns the number of rejected rows. Malformed rows are only looked for in chunks known to have some.
+    if not malformed:
+        return len(gbce.record_trades(rows))
+    trades = [row for row in rows if type(row) is not MalformedRow]
+    return len(rows) - len(trades) + len(gbce.record_trades(trades))
+
+
+def _snapshot(gbce: GBCE, timestamp_ns: int, trades: int, rejected: int) -> Snapshot:
+    gbce.clock.observe(timestamp_ns)
+    prices = {stock.symbol: gbce.calculate_volume_weighted_stock_price(stock) for stock in gbce.stocks}
+    return Snapshot(timestamp_ns, gbce.calculate_all_share_index(), prices, trades, rejected)
+
+
+def replay(
+    gbce: GBCE, chunks: Iterable[List[Union[TapeRow, MalformedRow]]], interval: Union[datetime.timedelta, int]
+) -> Iterator[Snapshot]:
+    """
+    Replays a trade tape into an exchange, yielding a snapshot every interval of event time.
+
+    The exchange should be created with an EventTimeClock so that the 5 minute windows follow the tape
+    rather than the wall clock; snapshots then depend only on the tape, however fast it is replayed. The
+    tape must be in time order. A final snapshot is taken at the time of the last trade.
+
+    Parameters:
+        gbce (GBCE): The exchange to replay into. Trades for symbols it does not list are rejected.
+        chunks (Iterable[List[Union[TapeRow, MalformedRow]]]): The tape, as produced by read_csv or
+            read_binary. Malformed rows are counted as rejected without reaching the exchange.
+        interval (Union[datetime.timedelta, int]): The event time between snapshots, as a timedelta or nanoseconds.
+
+    Returns:
+        Iterator[Snapshot]: The snapshots, in time order.
+    """
+    if gbce.clock is None:
+        raise ValueError("replay needs a GBCE created with a clock, usually an EventTimeClock")
+    if isinstance(interval, datetime.timedelta):
+        interval = interval // datetime.timedelta(microseconds=1) * 1000
+    if interval <= 0:
+        raise ValueError("interval must be positive")
+
+    next_snapshot = None
+    last_timestamp = None
+    trades = 0
+    rejected = 0
+
+    for chunk in chunks:
+        start = 0
+        malformed = False
+        for position, row in enumerate(chunk):
+            if type(row) is MalformedRow:
+                malformed = True
+                continue
+            timestamp_ns = row[0]
+            if not isinstance(timestamp_ns, int):
+                # A malformed timestamp, which record_trades rejects; it does not move event time.
+                continue
+            if next_snapshot is None:
+                next_snapshot = timestamp_ns + interval
+            while timestamp_ns >= next_snapshot:
+                rejected += _record(gbce, chunk[start:position], malformed)
+                trades += position - start
+                start = position
+                yield _snapshot(gbce, next_snapshot, trades, rejected)
+                next_snapshot += interval
+            last_timestamp = timestamp_ns
+        rejected += _record(gbce, chunk[start:], malformed)
+        trades += len(chunk) - start
+
+    if last_timestamp is not None:
+        yield _snapshot(gbce, last_timestamp, trades, rejected)
@@ -0,0 +1,200 @@
+import datetime
+import os
+from bisect import bisect_left
+import struct
+from typing import Iterator, Optional, Tuple
+
+from jpmorgan.trade_store import TradeStore
+
+# timestamp (epoch ns), quantity, price, side code
+SEGMENT_RECORD = struct.Struct("<qqdb")
+
+
+class HistorySummary:
+    """
+    Aggregates of the trades that were evicted from a stock's in-memory history.
+
+    Attributes:
+        count (int): The number of evicted trades.
+        quantity (int): The number of shares they traded.
+        price_quantity (float): The sum of their price * quantity.
+        high (float): Their highest price, or 0 if nothing was evicted.
+        low (float): Their lowest price, or 0 if nothing was evicted.
+        first_timestamp_ns (int): The timestamp of the oldest evicted trade, or 0 if nothing was evicted.
+        last_timestamp_ns (int): The timestamp of the newest evicted trade, or 0 if nothing was evicted.
+    """
+    __slots__ = ("count", "quantity", "price_quantity", "high", "low", "first_timestamp_ns", "last_timestamp_ns")
+
+    def __init__(self):
+        """
+        Initializes an empty summary.
+        """
+        self.count = 0
+        self.quantity = 0
+        self.price_quantity = 0.0
+        self.high = 0.0
+        self.low = 0.0
+        self.first_timestamp_ns = 0
+        self.last_timestamp_ns = 0
+
+    def add(self, store: TradeStore, count: int):
+        """
+        Folds the oldest trades of a store into the summary.
+
+        Parameters:
+            store (TradeStore): The store the trades are about to be evicted from.
+            count (int): The number of trades, counted from the oldest, to fold in.
+
+        Returns:
+            None
+        """
+        if count <= 0:
+            return
+        quantities = store.quantities[:count]
+        prices = store.prices[:count]
+        if self.count == 0:
+            self.first_timestamp_ns = store.timestamps[0]
+            self.high = max(prices)
+            self.low = min(prices)
+        else:
+            self.high = max(self.high, max(prices))
+            self.low = min(self.low, min(prices))
+        self.last_timestamp_ns = store.timestamps[count - 1]
+        self.count += count
+        self.quantity += sum(quantities)
+        self.price_quantity += sum(price * quantity for price, quantity in zip(prices, quantities))
+
+    def copy(self) -> "HistorySummary":
+        """
+        Returns an independent copy of the summary.
+
+        Returns:
+            HistorySummary: The copy.
+        """
+        summary = HistorySummary()
+        for name in self.__slots__:
+            setattr(summary, name, getattr(self, name))
+        return summary
+
+    def volume_weighted_price(self) -> float:
+        """
+        Calculates the volume-weighted price of all evicted trades.
+
+        Returns:
+            float: The volume-weighted price, or 0 if nothing was evicted.
+        """
+        if self.quantity == 0:
+            return 0
+        return self.price_quantity / self.quantity
+
+
+class RetentionPolicy:
+    """
+    Bounds how much trading history a stock keeps in memory.
+
+    Trades older than max_age, or beyond the newest max_count, are evicted from the stock's TradeStore and
+    folded into its HistorySummary; with a spill directory they are also appended to an on-disk segment file
+    per symbol that read_segment can query later. Trades still inside the 5 minute volume-weighted price
+    window are never evicted. Eviction happens in batches of at least an eighth of the stored trades, so the
+    cost of shifting the columns stays amortized O(1) per trade while memory stays bounded.
+
+    Attributes:
+        max_age (Optional[datetime.timedelta]): The age after which trades are evicted.
+        max_count (Optional[int]): The number of trades kept in memory.
+        spill_directory (Optional[str]): The directory evicted trades are appended to, if any.
+    """
+    def __init__(
+        self,
+        max_age: Optional[datetime.timedelta] = None,
+        max_count: Optional[int] = None,
+        spill_directory: Optional[str] = None,
+    ):
+        """
+        Initializes a retention policy. At least one of max_age and max_count must be given.
+
+        Parameters:
+            max_age (Optional[datetime.timedelta]): The age after which trades are evicted.
+            max_count (Optional[int]): The number of trades kept in memory.
+            spill_directory (Optional[str]): The directory evicted trades are appended to, if any.
+        """
+        if max_age is None and max_count is None:
+            raise ValueError("a retention policy needs a max_age or a max_count")
+        if max_count is not None and max_count < 0:
+            raise ValueError("max_count must not be negative")
+        self.max_age = max_age
+        self.max_count = max_count
+        self.spill_directory = spill_directory
+        self._max_age_ns = None if max_age is None else max_age // datetime.timedelta(microseconds=1) * 1000
+
+    def evictable(self, store: TradeStore, now_ns: int) -> int:
+        """
+        Counts the oldest trades of a store that the policy allows to evict.
+
+        Parameters:
+            store (TradeStore): The store to check.
+            now_ns (int): The current time in nanoseconds since the epoch.
+
+        Returns:
+            int: The number of trades, counted from the oldest, that are due for eviction.
+        """
+        count = 0
+        if self.max_count is not None:
+            count = max(count, len(store) - self.max_count)
+        if self._max_age_ns is not None:
+            count = max(count, bisect_left(store.timestamps, now_ns - self._max_age_ns))
+        return count
+
+    def segment_path(self, symbol: str) -> str:
+        """
+        Returns the path of the segment file the evicted trades of a symbol are spilled to.
+
+        Parameters:
+            symbol (str): The stock's symbol.
+
+        Returns:
+            str: The segment file path.
+        """
+        return os.path.join(self.spill_directory, f"{symbol}.seg")
+
+
+def append_segment(path: str, store: TradeStore, count: int):
+    """
+    Appends the oldest trades of a store to a segment file.
+
+    Parameters:
+        path (str): The segment file path. It is created if it does not exist.
+        store (TradeStore): The store the trades are about to be evicted from.
+        count (int): The number of trades, counted from the oldest, to append.
+
+    Returns:
+        None
+    """
+    pack = SEGMENT_RECORD.pack
+    records = b"".join(
+        pack(timestamp, quantity, price, side)
+        for timestamp, quantity, price, side in zip(
+            store.timestamps[:count], store.quantities[:count], store.prices[:count], store.sides[:count]
+        )
+    )
+    with open(path, "ab") as segment:
+        segment.write(records)
+
+
+def read_segment(path: str, chunk_size: int = 65536) -> Iterator[Tuple[int, int, int, float]]:
+    """
+    Reads back the trades spilled to a segment file, oldest first, a chunk at a time.
+
+    Parameters:
+        path (str): The segment file path.
+        chunk_size (int): The number of records read from disk at once.
+
+    Returns:
+        Iterator[Tuple[int, int, int, float]]: (timestamp_ns, quantity, side, price) tuples.
+    """
+    with open(path, "rb") as segment:
+        while True:
+            data = segment.read(chunk_size * SEGMENT_RECORD.size)
+            if not data:
+                return
+            for timestamp, quantity, price, side in SEGMENT_RECORD.iter_unpack(data):
+                yield timestamp, quantity, side, price
@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from jpmorgan.gbce import GBCE
+from jpmorgan.stock import Stock
+from jpmorgan.trade import INT64_MAX, invalid_timestamp_reason
+
+logger = logging.getLogger(__name__)
+
+
+class _Subscriber:
+    __slots__ = ("writer", "stale")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.stale = True
+
+
+class GBCEService:
+    """
+    Serves a GBCE over a line protocol, batching incoming trades and publishing prices to subscribers.
+
+    Trades from every connection are coalesced into micro-batches that are applied with GBCE.record_trades,
+    either once batch_size trades are pending or every batch_interval seconds. When max_pending trades are
+    waiting, connections stop reading from their sockets until the next batch is applied, so fast producers
+    are slowed down by TCP flow control instead of growing the queue. Every publish_interval seconds the
+    index and the per-symbol prices are computed on a worker thread, so the event loop is never blocked by
+    the calculation, and only the values that changed are pushed to subscribers. A subscriber whose socket
+    buffer is over subscriber_buffer_limit is skipped and sent the full state once it has caught up.
+
+    Clients send one command per line:
+
+        TRADE <symbol> <buy|sell> <quantity> <price> [<timestamp_ns>]
+            Records a trade. Nothing is sent back unless the trade is rejected, in which case the
+            client receives "REJECT <symbol> <reason>".
+        INDEX
+            Replies "INDEX <value>" with the current all-share index.
+        SUBSCRIBE
+            Turns the connection into a subscription. The subscriber first receives the full state, then
+            "INDEX <value>" and "VWSP <symbol> <price>" lines for the values that changed at each publish.
+
+    Malformed commands, including quantities and timestamps that do not fit in 64 bits, are answered with
+    "ERR <reason>". A batch that fails to apply is logged and dropped, and ingest carries on with the next one.
+
+    Attributes:
+        gbce (GBCE): The exchange the service runs.
+    """
+    def __init__(
+        self,
+        gbce: GBCE,
+        batch_size: int = 4096,
+        batch_interval: float = 0.005,
+        publish_interval: float = 0.25,
+        max_pending: int = 65536,
+        subscriber_buffer_limit: int = 1 << 20,
+    ):
+        """
+        Initializes a service for the given exchange. Call start_tcp or start_unix to start serving.
+
+        Parameters:
+            gbce (GBCE): The exchange to serve.
+            batch_size (int): The number of pending trades that triggers an immediate batch.
+            batch_interval (float): The longest time, in seconds, a trade waits before its batch is applied.
+            publish_interval (float): The time, in seconds, between publications to subscribers.
+            max_pending (int): The number of pending trades at which connections stop being read.
+            subscriber_buffer_limit (int): The number of unsent bytes at which a subscriber is skipped.
+        """
+        self.gbce = gbce
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.publish_interval = publish_interval
+        self.max_pending = max_pending
+        self.subscriber_buffer_limit = subscriber_buffer_limit
+        self._pending: List[tuple] = []
+        self._sources: List[asyncio.StreamWriter] = []
+        self._room: Optional[asyncio.Event] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._subscribers: Set[_Subscriber] = set()
+        self._index: Optional[float] = None
+        self._prices: Dict[str, float] = {}
+        self._servers: List[asyncio.AbstractServer] = []
+        self._tasks: List[asyncio.Task] = []
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """
+        Starts serving on a TCP socket.
+
+        Parameters:
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 for any free port.
+
+        Returns:
+            asyncio.AbstractServer: The listening server.
+        """
+        self._start()
+        server = await asyncio.start_server(self._serve, host, port)
+        self._servers.append(server)
+        return server
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        """
+        Starts serving on a Unix socket.
+
+        Parameters:
+            path (str): The path of the socket.
+
+        Returns:
+            asyncio.AbstractServer: The listening server.
+        """
+        self._start()
+        server = await asyncio.start_unix_server(self._serve, path)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        """
+        Stops serving, applies the trades still pending and disconnects every client.
+
+        Returns:
+            None
+        """
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.flush()
+        connections = list(self._connections.items())
+        for writer, _ in connections:
+            writer.close()
+        await asyncio.gather(*(task for _, task in connections), return_exceptions=True)
+        self._subscribers.clear()
+
+    def flush(self):
+        """
+        Applies the pending trades to the exchange and reports rejections to the connections they came from.
+
+        Returns:
+            None
+        """
+        if not self._pending:
+            return
+        rows, sources = self._pending, self._sources
+        self._pending, self._sources = [], []
+        try:
+            rejections = self.gbce.record_trades(rows)
+        finally:
+            self._room.set()
+        for rejection in rejections:
+            writer = sources[rejection.row]
+            if not writer.is_closing():
+                writer.write(f"REJECT {rows[rejection.row][1]} {rejection.reason}\n".encode())
+
+    def _start(self):
+        if self._tasks:
+            return
+        self._room = asyncio.Event()
+        self._room.set()
+        self._batch_ready = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._batch_loop()))
+        self._tasks.append(asyncio.create_task(self._publish_loop()))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                if not self._room.is_set():
+                    await self._room.wait()
+                if writer.transport.get_write_buffer_size() > self.subscriber_buffer_limit:
+                    await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    return
+                parts = line.split()
+                if not parts:
+                    continue
+                command = parts[0].upper()
+                if command == b"TRADE":
+                    self._enqueue(parts, writer)
+                elif command == b"INDEX":
+                    index = await asyncio.get_running_loop().run_in_executor(None, self.gbce.calculate_all_share_index)
+                    writer.write(f"INDEX {index!r}\n".encode())
+                elif command == b"SUBSCRIBE":
+                    await self._subscribe(reader, writer)
+                    return
+                else:
+                    writer.write(f"ERR unknown command {parts[0].decode(errors='replace')}\n".encode())
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[writer]
+            writer.close()
+
+    def _enqueue(self, parts: List[bytes], writer: asyncio.StreamWriter):
+        if len(parts) not in (5, 6):
+            writer.write(b"ERR usage: TRADE <symbol> <buy|sell> <quantity> <price> [<timestamp_ns>]\n")
+            return
+        try:
+            row = (
+                int(parts[5]) if len(parts) == 6 else None,
+                parts[1].decode(),
+                int(parts[3]),
+                parts[2].decode().lower(),
+                float(parts[4]),
+            )
+        except (ValueError, UnicodeDecodeError) as error:
+            writer.write(f"ERR {error}\n".encode())
+            return
+        reason = None if row[0] is None else invalid_timestamp_reason(row[0])
+        if reason is None and abs(row[2]) > INT64_MAX:
+            reason = "quantity must be at most 2**63 - 1"
+        if reason is not None:
+            writer.write(f"ERR {reason}\n".encode())
+            return
+        self._pending.append(row)
+        self._sources.append(writer)
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+        if len(self._pending) >= self.max_pending:
+            self._room.clear()
+
+    async def _subscribe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriber = _Subscriber(writer)
+        self._subscribers.add(subscriber)
+        self._send(subscriber, b"")
+        try:
+            # Subscribers do not send anything else; wait for them to hang up.
+            while await reader.read(1024):
+                pass
+        finally:
+            self._subscribers.discard(subscriber)
+
+    async def _batch_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("failed to apply a batch of trades")
+
+    async def _publish_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            index, prices = await loop.run_in_executor(None, self._calculate)
+            self._publish(index, prices)
+
+    def _calculate(self) -> Tuple[float, Dict[str, float]]:
+        gbce = self.gbce
+        prices = {stock.symbol: gbce.calculate_volume_weighted_stock_price(stock) for stock in gbce.stocks}
+        return gbce.calculate_all_share_index(), prices
+
+    def _publish(self, index: float, prices: Dict[str, float]):
+        lines = []
+        if index != self._index:
+            lines.append(f"INDEX {index!r}\n")
+        previous = self._prices
+        for symbol, price in prices.items():
+            if previous.get(symbol) != price:
+                lines.append(f"VWSP {symbol} {price!r}\n")
+        self._index = index
+        self._prices = prices
+        update = "".join(lines).encode()
+        for subscriber in list(self._subscribers):
+            # Stale subscribers are caught up on every tick, even when nothing changed.
+            if update or subscriber.stale:
+                self._send(subscriber, update)
+
+    def _send(self, subscriber: _Subscriber, update: bytes):
+        writer = subscriber.writer
+        if writer.is_closing():
+            self._subscribers.discard(subscriber)
+            return
+        if writer.transport.get_write_buffer_size() > self.subscriber_buffer_limit:
+            subscriber.stale = True
+            return
+        if subscriber.stale:
+            state = [] if self._index is None else [f"INDEX {self._index!r}\n"]
+            state.extend(f"VWSP {symbol} {price!r}\n" for symbol, price in self._prices.items())
+            writer.write("".join(state).encode())
+            subscriber.stale = False
+        elif update:
+            writer.write(update)
+
+
+async def serve(gbce: GBCE, host: str = "127.0.0.1", port: int = 8023, unix_path: Optional[str] = None, **options):
+    """
+    Runs the service until it is cancelled.
+
+    Parameters:
+        gbce (GBCE): The exchange to serve.
+        host (str): The TCP address to listen on.
+        port (int): The TCP port to listen on.
+        unix_path (Optional[str]): A Unix socket path to listen on instead of TCP.
+        **options: Keyword arguments for GBCEService.
+
+    Returns:
+        None
+    """
+    service = GBCEService(gbce, **options)
+    server = await (service.start_unix(unix_path) if unix_path else service.start_tcp(host, port))
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the GBCE service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8023)
+    parser.add_argument("--unix", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--publish-interval", type=float, default=0.25)
+    parser.add_argument("--symbols", default="TEA,POP,ALE,GIN,JOE", help="comma separated symbols to list")
+    args = parser.parse_args()
+
+    gbce = GBCE()
+    for symbol in args.symbols.split(","):
+        gbce.add_stock(Stock(symbol=symbol, type="Common", last_dividend=0, fixed_dividend=0, par_value=100))
+    try:
+        asyncio.run(serve(gbce, args.host, args.port, args.unix, publish_interval=args.publish_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
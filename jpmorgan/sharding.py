@@ -0,0 +1,331 @@
+import datetime
+import math
+import multiprocessing
+import zlib
+from itertools import repeat
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from jpmorgan.clock import EventTimeClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.stock import Stock
+from jpmorgan.trade import RejectedTrade, invalid_timestamp_reason, to_epoch_ns
+
+
+class TradeColumns(NamedTuple):
+    """
+    A batch of trades for one shard, one sequence per field. Numeric columns are best passed as arrays, which
+    are sent to the worker as a single buffer copy each.
+
+    Attributes:
+        symbols (Sequence[str]): The symbols of the trades.
+        quantities (Sequence[int]): The numbers of shares traded, for example an array('q').
+        indicators (Sequence[str]): The indicators of the trades, "buy" or "sell".
+        prices (Sequence[float]): The prices at which the trades were executed, for example an array('d').
+        timestamps (Optional[Sequence[int]]): The times of the trades in nanoseconds since the epoch, for
+            example an array('q'), or None to record every trade at the worker's clock time.
+    """
+    symbols: Sequence[str]
+    quantities: Sequence[int]
+    indicators: Sequence[str]
+    prices: Sequence[float]
+    timestamps: Optional[Sequence[int]] = None
+
+
+def shard_of(symbol: str, shards: int) -> int:
+    """
+    Returns the shard a symbol is assigned to. The assignment is stable across processes and runs.
+
+    Parameters:
+        symbol (str): The stock's symbol.
+        shards (int): The number of shards.
+
+    Returns:
+        int: The shard number, from 0 to shards - 1.
+    """
+    return zlib.crc32(symbol.encode()) % shards
+
+
+class _Failure(NamedTuple):
+    """
+    An exception raised by a worker while running a command, sent back to be raised in the coordinator.
+    """
+    error: Exception
+
+
+def _execute(gbce: GBCE, command: str, arguments: list):
+    if command == "add_stock":
+        gbce.add_stock(Stock(*arguments))
+        return None
+    if command == "record_trades":
+        return gbce.record_trades(arguments[0])
+    if command == "record_columns":
+        symbols, quantities, indicators, prices, timestamps = arguments[0]
+        timestamps = repeat(None) if timestamps is None else timestamps
+        return gbce.record_trades(zip(timestamps, symbols, quantities, indicators, prices))
+    if command == "log_price_sum":
+        if arguments[0] is not None:
+            gbce.clock.observe(arguments[0])
+        return gbce.calculate_log_price_sum()
+    if command == "vwsp":
+        stock = gbce.get(arguments[0])
+        return None if stock is None else gbce.calculate_volume_weighted_stock_price(stock)
+    raise ValueError(f"unknown command {command!r}")
+
+
+def _worker(connection, event_time: bool):
+    gbce = GBCE(clock=EventTimeClock() if event_time else None)
+    while True:
+        command, *arguments = connection.recv()
+        if command == "close":
+            connection.send(None)
+            connection.close()
+            return
+        # A failing command is reported back rather than ending the worker, which would lose the shard.
+        try:
+            result = _execute(gbce, command, arguments)
+        except Exception as error:
+            result = _Failure(error)
+        try:
+            connection.send(result)
+        except Exception as error:
+            connection.send(_Failure(RuntimeError(f"{type(error).__name__}: {error}")))
+
+
+def _receive_all(connections: list) -> list:
+    # Every reply is read before raising, so that no connection is left with an unread reply.
+    replies = [connection.recv() for connection in connections]
+    for reply in replies:
+        if isinstance(reply, _Failure):
+            raise reply.error
+    return replies
+
+
+class ShardedGBCE:
+    """
+    An exchange whose symbols are hash-partitioned across worker processes, so that it can use several cores.
+
+    Every worker runs its own GBCE that owns the stocks of its shard and computes their volume-weighted
+    prices. Batches of trades are split by shard and sent to all workers before any reply is awaited, so the
+    workers ingest in parallel. For the all-share index each worker only sends back its partial sum of
+    log-prices and its count of priced stocks, and the coordinator combines them into the geometric mean.
+
+    record_trades splits and pickles the rows one by one in the coordinator process, which caps its
+    throughput at roughly 1 to 1.5 million trades per second however many workers there are. Producers that
+    can split their trades by shard_of themselves should call record_partitioned with a column batch per
+    shard instead: the coordinator then does no per-trade work, and numeric columns passed as arrays are sent
+    as buffer copies, so ingest scales with the workers.
+
+    An exception raised by a worker while running a command is sent back and raised by the call that sent the
+    command; the worker keeps serving its shard.
+
+    Stocks are recreated in the workers from their static data; trades already recorded on a Stock passed to
+    add_stock are not transferred. With event_time the workers use EventTimeClocks, and the coordinator
+    forwards the latest trade timestamp it has routed when asking for the index so all shards agree on now.
+
+    Attributes:
+        workers (int): The number of worker processes.
+    """
+    def __init__(self, workers: int, event_time: bool = False, context: Optional[multiprocessing.context.BaseContext] = None):
+        """
+        Starts the worker processes.
+
+        Parameters:
+            workers (int): The number of worker processes.
+            event_time (bool): Whether the workers follow the trade timestamps instead of the wall clock.
+            context (Optional[BaseContext]): The multiprocessing context to start the workers with.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        context = context or multiprocessing.get_context()
+        self.workers = workers
+        self._event_time = event_time
+        self._latest_timestamp_ns: Optional[int] = None
+        self._connections = []
+        self._processes = []
+        self._symbols: Dict[str, int] = {}
+        for _ in range(workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=_worker, args=(child, event_time), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def __enter__(self) -> "ShardedGBCE":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._symbols
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def add_stock(self, stock: Stock):
+        """
+        Lists a stock on the worker that owns its symbol.
+
+        Args:
+            stock (Stock): The stock to list. Only its static data is sent to the worker.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If a stock with the same symbol is already listed.
+        """
+        symbol = stock.symbol
+        if symbol in self._symbols:
+            raise ValueError(f"stock {symbol!r} is already listed")
+        shard = shard_of(symbol, self.workers)
+        self._request(shard, ("add_stock", symbol, stock.type, stock.last_dividend, stock.fixed_dividend, stock.par_value))
+        self._symbols[symbol] = shard
+
+    def record_trades(self, trades: Iterable[Tuple]) -> List[RejectedTrade]:
+        """
+        Splits a batch of trades by shard and records them on all workers in parallel.
+
+        Args:
+            trades (Iterable[Tuple]): (timestamp, symbol, quantity, indicator, price) rows, as accepted by
+                GBCE.record_trades.
+
+        Returns:
+            List[RejectedTrade]: The position in the batch and the reason of every rejected trade, in batch order.
+        """
+        rows: List[List[int]] = [[] for _ in range(self.workers)]
+        batches: List[List[tuple]] = [[] for _ in range(self.workers)]
+        rejected: List[RejectedTrade] = []
+        symbols = self._symbols
+        latest = self._latest_timestamp_ns
+
+        for row, trade in enumerate(trades):
+            if len(trade) != 5:
+                rejected.append(RejectedTrade(row, f"expected 5 fields, got {len(trade)}"))
+                continue
+            shard = symbols.get(trade[1])
+            if shard is None:
+                rejected.append(RejectedTrade(row, f"unknown symbol {trade[1]!r}"))
+                continue
+            if self._event_time and trade[0] is not None:
+                timestamp = trade[0]
+                if isinstance(timestamp, datetime.datetime):
+                    timestamp = to_epoch_ns(timestamp)
+                elif not isinstance(timestamp, int):
+                    rejected.append(RejectedTrade(row, "timestamp must be a datetime object or epoch nanoseconds"))
+                    continue
+                reason = invalid_timestamp_reason(timestamp)
+                if reason is not None:
+                    rejected.append(RejectedTrade(row, reason))
+                    continue
+                if latest is None or timestamp > latest:
+                    latest = timestamp
+            rows[shard].append(row)
+            batches[shard].append(trade)
+        self._latest_timestamp_ns = latest
+
+        shards = [shard for shard in range(self.workers) if batches[shard]]
+        for shard in shards:
+            self._connections[shard].send(("record_trades", batches[shard]))
+        replies = _receive_all([self._connections[shard] for shard in shards])
+        for shard, rejections in zip(shards, replies):
+            for rejection in rejections:
+                rejected.append(RejectedTrade(rows[shard][rejection.row], rejection.reason))
+
+        rejected.sort()
+        return rejected
+
+    def record_partitioned(self, batches: Sequence[Optional[TradeColumns]]) -> List[List[RejectedTrade]]:
+        """
+        Records batches of trades that are already split by shard, on all workers in parallel.
+
+        Every trade in batches[shard] must be for a symbol that shard_of assigns to that shard; trades for a
+        symbol the shard does not own are rejected as unknown.
+
+        Args:
+            batches (Sequence[Optional[TradeColumns]]): A batch per shard, or None for a shard without trades.
+
+        Returns:
+            List[List[RejectedTrade]]: For every shard, the position in its batch and the reason of every
+            rejected trade.
+
+        Raises:
+            ValueError: If there is not exactly one batch per worker.
+        """
+        if len(batches) != self.workers:
+            raise ValueError(f"expected {self.workers} batches, got {len(batches)}")
+        shards = [shard for shard, batch in enumerate(batches) if batch is not None and len(batch.symbols)]
+        if self._event_time:
+            latest = self._latest_timestamp_ns
+            for shard in shards:
+                timestamps = batches[shard].timestamps
+                if timestamps is not None:
+                    timestamp = max(timestamps)
+                    if latest is None or timestamp > latest:
+                        latest = timestamp
+            self._latest_timestamp_ns = latest
+
+        for shard in shards:
+            self._connections[shard].send(("record_columns", tuple(batches[shard])))
+        rejected: List[List[RejectedTrade]] = [[] for _ in range(self.workers)]
+        for shard, rejections in zip(shards, _receive_all([self._connections[shard] for shard in shards])):
+            rejected[shard] = rejections
+        return rejected
+
+    def calculate_volume_weighted_stock_price(self, symbol: str) -> float:
+        """
+        Returns the volume-weighted stock price of a constituent from the worker that owns it.
+
+        Args:
+            symbol (str): The symbol of the stock.
+
+        Returns:
+            float: The volume-weighted stock price of the stock over the last 5 minutes.
+
+        Raises:
+            KeyError: If no stock with the symbol is listed.
+        """
+        return self._request(self._symbols[symbol], ("vwsp", symbol))
+
+    def calculate_all_share_index(self) -> float:
+        """
+        Calculates the all-share index from the partial log-price sums of all workers.
+
+        Returns:
+            float: The all-share index of the entire index.
+        """
+        for connection in self._connections:
+            connection.send(("log_price_sum", self._latest_timestamp_ns))
+        log_price_sum = 0.0
+        valid_stock_count = 0
+        for partial_sum, partial_count in _receive_all(self._connections):
+            log_price_sum += partial_sum
+            valid_stock_count += partial_count
+        if valid_stock_count == 0:
+            return 0.0
+        return math.exp(log_price_sum / valid_stock_count)
+
+    def close(self):
+        """
+        Stops the worker processes.
+
+        Returns:
+            None
+        """
+        for connection, process in zip(self._connections, self._processes):
+            if process.is_alive():
+                try:
+                    connection.send(("close",))
+                    connection.recv()
+                except (BrokenPipeError, EOFError):
+                    pass
+            connection.close()
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def _request(self, shard: int, message: tuple):
+        connection = self._connections[shard]
+        connection.send(message)
+        return _receive_all([connection])[0]
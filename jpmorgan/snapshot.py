@@ -0,0 +1,328 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from jpmorgan.clock import Clock
+from jpmorgan.gbce import GBCE
+from jpmorgan.retention import HistorySummary
+from jpmorgan.stock import Stock, StockState
+
+FORMAT_VERSION = 2
+
+STOCK_MAGIC = b"GBCESTCK"
+MANIFEST_MAGIC = b"GBCEMANI"
+MANIFEST_NAME = "MANIFEST"
+
+# magic, format version, CRC-32 of everything after the header, symbol length, type length
+STOCK_HEADER = struct.Struct("<8sIIII")
+# last dividend, fixed dividend, par value, version, trade count, window start, window quantity,
+# window price * quantity, window net quantity, window net price * quantity, evicted count, quantity,
+# price * quantity, high, low, first and last timestamp, bucket count
+STOCK_STATE = struct.Struct("<dddqqqqdqdqqdddqqq")
+# magic, format version, CRC-32 of everything after the header, clock time (epoch ns), symbol count
+MANIFEST_HEADER = struct.Struct("<8sIIqI")
+SYMBOL_LENGTH = struct.Struct("<H")
+
+# Typecodes of the trade columns and of the bucket columns, in file order. Side codes come last so that
+# every 8 byte column stays aligned.
+TRADE_TYPECODES = "qqd"
+BUCKET_TYPECODES = "qdqqdd"
+
+
+def _little_endian(column: array) -> array:
+    if sys.byteorder == "little" or column.itemsize == 1:
+        return column
+    swapped = column[:]
+    swapped.byteswap()
+    return swapped
+
+
+def _write_atomically(path: str, magic: bytes, header: struct.Struct, fields: Tuple, body: List):
+    crc = 0
+    for piece in body:
+        crc = zlib.crc32(piece, crc)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(header.pack(magic, FORMAT_VERSION, crc, *fields))
+        for piece in body:
+            file.write(piece)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def _check_header(path: str, magic: bytes, header: struct.Struct, view: memoryview) -> Tuple:
+    if len(view) < header.size:
+        raise ValueError(f"{path} is truncated")
+    found_magic, version, crc, *fields = header.unpack_from(view)
+    if found_magic != magic:
+        raise ValueError(f"{path} is not a GBCE snapshot file")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has snapshot format version {version}, expected {FORMAT_VERSION}")
+    if zlib.crc32(view[header.size:]) != crc:
+        raise ValueError(f"{path} is corrupt")
+    return tuple(fields)
+
+
+def write_stock(path: str, state: StockState):
+    """
+    Writes a stock's state to a snapshot file, replacing the file atomically.
+
+    The file holds the static data, the running sums of the 5 minute window, the retention history summary and
+    the raw trade and bucket columns, so that read_stock can restore the stock without recomputing anything.
+
+    Parameters:
+        path (str): The path of the file to write.
+        state (StockState): The state, as returned by Stock.export_state.
+
+    Returns:
+        None
+    """
+    symbol = state.symbol.encode("utf-8")
+    type = state.type.encode("utf-8")
+    history = state.history
+    fields = STOCK_STATE.pack(
+        state.last_dividend,
+        state.fixed_dividend,
+        state.par_value,
+        state.version,
+        len(state.timestamps),
+        state.window_start,
+        state.window_quantity,
+        state.window_price_quantity,
+        state.window_net_quantity,
+        state.window_net_price_quantity,
+        history.count,
+        history.quantity,
+        history.price_quantity,
+        history.high,
+        history.low,
+        history.first_timestamp_ns,
+        history.last_timestamp_ns,
+        len(state.buckets[0]),
+    )
+    names = symbol + type
+    body = [fields, names, bytes(-len(names) % 8)]
+    body.extend(_little_endian(column) for column in (state.timestamps, state.quantities, state.prices))
+    body.extend(_little_endian(column) for column in state.buckets)
+    body.append(state.sides)
+    _write_atomically(path, STOCK_MAGIC, STOCK_HEADER, (len(symbol), len(type)), body)
+
+
+def _read_columns(view: memoryview, offset: int, typecodes: str, count: int) -> Tuple[List[array], int]:
+    columns = []
+    for typecode in typecodes:
+        column = array(typecode)
+        end = offset + count * column.itemsize
+        column.frombytes(view[offset:end])
+        if sys.byteorder != "little" and column.itemsize > 1:
+            column.byteswap()
+        columns.append(column)
+        offset = end
+    return columns, offset
+
+
+def read_stock(path: str) -> StockState:
+    """
+    Reads a stock's state from a snapshot file through a memory map.
+
+    Every column is copied straight from the mapped file into its array, so no Trade object is created and
+    the cost is a memory copy per column.
+
+    Parameters:
+        path (str): The path of the file written by write_stock.
+
+    Returns:
+        StockState: The state, ready for Stock.from_state.
+
+    Raises:
+        ValueError: If the file is not a snapshot of a supported format version, or is corrupt.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            symbol_length, type_length = _check_header(path, STOCK_MAGIC, STOCK_HEADER, view)
+            offset = STOCK_HEADER.size
+            (
+                last_dividend, fixed_dividend, par_value, version, trade_count, window_start, window_quantity,
+                window_price_quantity, window_net_quantity, window_net_price_quantity, evicted, evicted_quantity, evicted_price_quantity, high, low,
+                first_timestamp_ns, last_timestamp_ns, bucket_count,
+            ) = STOCK_STATE.unpack_from(view, offset)
+            offset += STOCK_STATE.size
+            symbol = bytes(view[offset:offset + symbol_length]).decode("utf-8")
+            offset += symbol_length
+            type = bytes(view[offset:offset + type_length]).decode("utf-8")
+            offset += type_length
+            offset += -offset % 8
+            (timestamps, quantities, prices), offset = _read_columns(view, offset, TRADE_TYPECODES, trade_count)
+            buckets, offset = _read_columns(view, offset, BUCKET_TYPECODES, bucket_count)
+            (sides,), offset = _read_columns(view, offset, "b", trade_count)
+
+    history = HistorySummary()
+    history.count = evicted
+    history.quantity = evicted_quantity
+    history.price_quantity = evicted_price_quantity
+    history.high = high
+    history.low = low
+    history.first_timestamp_ns = first_timestamp_ns
+    history.last_timestamp_ns = last_timestamp_ns
+    return StockState(
+        symbol, type, last_dividend, fixed_dividend, par_value, version, timestamps, quantities, prices, sides,
+        window_start, window_quantity, window_price_quantity, window_net_quantity, window_net_price_quantity,
+        tuple(buckets), history,
+    )
+
+
+def write_manifest(path: str, now_ns: int, symbols: Iterable[str]):
+    """
+    Writes the list of stocks a snapshot consists of, replacing the file atomically.
+
+    Parameters:
+        path (str): The path of the file to write.
+        now_ns (int): The exchange's clock time, in nanoseconds since the epoch.
+        symbols (Iterable[str]): The symbols of the constituents, in the order they were listed.
+
+    Returns:
+        None
+    """
+    body = []
+    for symbol in symbols:
+        encoded = symbol.encode("utf-8")
+        body.append(SYMBOL_LENGTH.pack(len(encoded)))
+        body.append(encoded)
+    _write_atomically(path, MANIFEST_MAGIC, MANIFEST_HEADER, (now_ns, len(body) // 2), body)
+
+
+def read_manifest(path: str) -> Tuple[int, List[str]]:
+    """
+    Reads the list of stocks a snapshot consists of.
+
+    Parameters:
+        path (str): The path of the file written by write_manifest.
+
+    Returns:
+        Tuple[int, List[str]]: The exchange's clock time and the symbols of the constituents.
+
+    Raises:
+        ValueError: If the file is not a manifest of a supported format version, or is corrupt.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    with memoryview(data) as view:
+        now_ns, count = _check_header(path, MANIFEST_MAGIC, MANIFEST_HEADER, view)
+    offset = MANIFEST_HEADER.size
+    symbols = []
+    for _ in range(count):
+        (length,) = SYMBOL_LENGTH.unpack_from(data, offset)
+        offset += SYMBOL_LENGTH.size
+        symbols.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    return now_ns, symbols
+
+
+def stock_path(directory: str, symbol: str) -> str:
+    """
+    Returns the path of the snapshot file of a symbol.
+
+    Parameters:
+        directory (str): The snapshot directory.
+        symbol (str): The stock's symbol.
+
+    Returns:
+        str: The snapshot file path.
+    """
+    return os.path.join(directory, f"{symbol}.stock")
+
+
+class SnapshotWriter:
+    """
+    Writes incremental snapshots of an exchange to a directory, for fast warm restarts with restore.
+
+    A snapshot is a file per stock, named after its symbol, and a manifest listing the constituents. Each call
+    to write only rewrites the stocks whose version or static data changed since the previous call, so
+    snapshots can be taken often while the exchange is under load. A stock file only holds the trades that
+    are still inside the 5 minute window or the bucket retention period (see Stock.export_state), so its size
+    is bounded by the retention period however long the stock has been trading. A stock is locked only while
+    its columns are copied; encoding and writing happen outside every lock. Each stock file is consistent in itself, but
+    as stocks are copied one after the other, the snapshot is not a single cut across stocks. Every file is
+    replaced atomically and the manifest is written last, so a crash during a snapshot leaves a readable one.
+
+    Attributes:
+        directory (str): The directory the snapshot is written to.
+    """
+    def __init__(self, directory: str):
+        """
+        Initializes a writer. The directory is created if it does not exist.
+
+        Parameters:
+            directory (str): The directory the snapshot is written to.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._written: Dict[str, Tuple] = {}
+
+    def write(self, gbce: GBCE) -> int:
+        """
+        Brings the snapshot up to date with the exchange.
+
+        Parameters:
+            gbce (GBCE): The exchange to snapshot.
+
+        Returns:
+            int: The number of stock files that were rewritten.
+        """
+        stocks = gbce.stocks
+        written = 0
+        for stock in stocks:
+            symbol = stock.symbol
+            if self._written.get(symbol) == self._key(stock, stock.version):
+                continue
+            state = stock.export_state()
+            write_stock(stock_path(self.directory, symbol), state)
+            self._written[symbol] = self._key(stock, state.version)
+            written += 1
+
+        listed = {stock.symbol for stock in stocks}
+        now_ns = gbce.clock.now_ns() if gbce.clock is not None else 0
+        write_manifest(os.path.join(self.directory, MANIFEST_NAME), now_ns, [stock.symbol for stock in stocks])
+        for symbol in [symbol for symbol in self._written if symbol not in listed]:
+            del self._written[symbol]
+            os.remove(stock_path(self.directory, symbol))
+        return written
+
+    @staticmethod
+    def _key(stock: Stock, version: int) -> Tuple:
+        return stock, version, stock.type, stock.last_dividend, stock.fixed_dividend, stock.par_value
+
+
+def restore(directory: str, clock: Optional[Clock] = None) -> GBCE:
+    """
+    Recreates an exchange from a snapshot written by SnapshotWriter.
+
+    The stock files are memory-mapped and their columns copied straight into the restored stores, and the
+    window sums and rollups are taken from the snapshot, so the exchange serves accurate volume-weighted
+    prices and index values as soon as this returns. Retention policies are configuration rather than state
+    and are not snapshotted; they can be set on the restored stocks.
+
+    Parameters:
+        directory (str): The directory the snapshot was written to.
+        clock (Optional[Clock]): The clock of the restored exchange. An event-time clock is moved to the time
+            the snapshot was taken.
+
+    Returns:
+        GBCE: The restored exchange.
+
+    Raises:
+        FileNotFoundError: If the directory holds no snapshot.
+        ValueError: If a snapshot file is of an unsupported format version or corrupt.
+    """
+    now_ns, symbols = read_manifest(os.path.join(directory, MANIFEST_NAME))
+    gbce = GBCE(clock)
+    if clock is not None:
+        clock.observe(now_ns)
+    for symbol in symbols:
+        gbce.add_stock(Stock.from_state(read_stock(stock_path(directory, symbol)), clock))
+    return gbce
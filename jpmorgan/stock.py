@@ -1,6 +1,301 @@
 import datetime
-from typing import List
-from jpmorgan.trade import Trade
+import threading
+from bisect import bisect_left
+from operator import mul
+from time import perf_counter_ns
+from array import array
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+from jpmorgan.aggregates import BucketAggregates, WindowSummary
+from jpmorgan.clock import WALL_CLOCK, Clock
+from jpmorgan.journal import Journal
+from jpmorgan.metrics import METRICS
+from jpmorgan.retention import HistorySummary, RetentionPolicy, append_segment
+from jpmorgan.trade import SIDE_CODES, RejectedTrade, Trade, invalid_timestamp_reason, invalid_trade_reason, to_epoch_ns, validate_trade
+from jpmorgan.trade_store import TradeStore
+
+
+class OrderFlow(NamedTuple):
+    """
+    The trading of a stock over its 5 minute window, split by side.
+
+    Attributes:
+        volume_weighted_price (float): The volume-weighted price of all trades, or 0 if nothing traded.
+        buy_volume_weighted_price (float): The volume-weighted price of the buy trades, or 0 if there were none.
+        sell_volume_weighted_price (float): The volume-weighted price of the sell trades, or 0 if there were none.
+        buy_quantity (int): The quantity bought.
+        sell_quantity (int): The quantity sold.
+        net_quantity (int): The quantity bought minus the quantity sold.
+        imbalance (float): The net quantity as a fraction of the total quantity, from -1 (all sells) to 1
+            (all buys), or 0 if nothing traded.
+    """
+    volume_weighted_price: float
+    buy_volume_weighted_price: float
+    sell_volume_weighted_price: float
+    buy_quantity: int
+    sell_quantity: int
+    net_quantity: int
+    imbalance: float
+
+
+def _signed_price_quantities(prices: array, quantities: array, sides: array):
+    return map(mul, map(mul, prices, quantities), sides)
+
+
+class VolumeWeightedWindow:
+    """
+    A sliding window over a time-ordered TradeStore that keeps running sums of price * quantity and quantity.
+
+    The window covers the trades from position start to the end of the store. Trades enter the window as
+    they are appended to the store and are evicted from the front, a slice at a time, once they fall out
+    of the window, so adding a trade and reading the volume-weighted price both cost amortized O(1)
+    regardless of how long the trading history is.
+
+    The same sums are also kept signed by side (positive for buys, negative for sells), from which the
+    per-side figures of order_flow follow without tracking each side separately.
+
+    Attributes:
+        store (TradeStore): The trades the window slides over.
+        span (datetime.timedelta): The length of the window.
+        start (int): The position in the store of the oldest trade inside the window.
+        total_quantity (int): The sum of the quantities of the trades inside the window.
+        total_traded_price_quantity (float): The sum of price * quantity of the trades inside the window.
+        net_quantity (int): The sum of side * quantity of the trades inside the window.
+        net_traded_price_quantity (float): The sum of side * price * quantity of the trades inside the window.
+    """
+    def __init__(self, store: TradeStore, span: datetime.timedelta):
+        """
+        Initializes a window of the given span over every trade in the store.
+
+        Parameters:
+            store (TradeStore): The trades the window slides over.
+            span (datetime.timedelta): The length of the window.
+        """
+        self.store = store
+        self.span = span
+        self.span_ns = span // datetime.timedelta(microseconds=1) * 1000
+        self.start = 0
+        self.total_quantity = sum(store.quantities)
+        self.total_traded_price_quantity = sum(map(mul, store.prices, store.quantities))
+        self.net_quantity = sum(map(mul, store.quantities, store.sides))
+        self.net_traded_price_quantity = sum(_signed_price_quantities(store.prices, store.quantities, store.sides))
+
+    @classmethod
+    def restore(
+        cls,
+        store: TradeStore,
+        span: datetime.timedelta,
+        start: int,
+        total_quantity: int,
+        total_traded_price_quantity: float,
+        net_quantity: int,
+        net_traded_price_quantity: float,
+    ) -> "VolumeWeightedWindow":
+        """
+        Recreates a window from saved running sums, without summing the store again.
+
+        Parameters:
+            store (TradeStore): The trades the window slides over.
+            span (datetime.timedelta): The length of the window.
+            start (int): The position in the store of the oldest trade inside the window.
+            total_quantity (int): The sum of the quantities of the trades inside the window.
+            total_traded_price_quantity (float): The sum of price * quantity of the trades inside the window.
+            net_quantity (int): The sum of side * quantity of the trades inside the window.
+            net_traded_price_quantity (float): The sum of side * price * quantity of the trades inside the window.
+
+        Returns:
+            VolumeWeightedWindow: The window.
+        """
+        window = cls(TradeStore(), span)
+        window.store = store
+        window.start = start
+        window.total_quantity = total_quantity
+        window.total_traded_price_quantity = total_traded_price_quantity
+        window.net_quantity = net_quantity
+        window.net_traded_price_quantity = net_traded_price_quantity
+        return window
+
+    def __len__(self) -> int:
+        return len(self.store) - self.start
+
+    def add(self, position: int):
+        """
+        Accounts for a trade that was just stored at the given position.
+
+        Parameters:
+            position (int): The position returned by TradeStore.append.
+
+        Returns:
+            None
+        """
+        if position < self.start:
+            # A late trade older than an already evicted one is outside the window too.
+            self.start += 1
+            return
+        store = self.store
+        quantity = store.quantities[position]
+        price_quantity = store.prices[position] * quantity
+        self.total_quantity += quantity
+        self.total_traded_price_quantity += price_quantity
+        if store.sides[position] > 0:
+            self.net_quantity += quantity
+            self.net_traded_price_quantity += price_quantity
+        else:
+            self.net_quantity -= quantity
+            self.net_traded_price_quantity -= price_quantity
+
+    def add_range(self, position: int):
+        """
+        Accounts for a batch of trades that was just appended to the end of the store.
+
+        Parameters:
+            position (int): The position returned by TradeStore.extend.
+
+        Returns:
+            None
+        """
+        store = self.store
+        quantities = store.quantities[position:]
+        prices = store.prices[position:]
+        sides = store.sides[position:]
+        self.total_quantity += sum(quantities)
+        self.total_traded_price_quantity += sum(map(mul, prices, quantities))
+        self.net_quantity += sum(map(mul, quantities, sides))
+        self.net_traded_price_quantity += sum(_signed_price_quantities(prices, quantities, sides))
+
+    def discard(self, count: int):
+        """
+        Accounts for the oldest trades being removed from the store. They must already have left the window.
+
+        Parameters:
+            count (int): The number of trades removed, at most start.
+
+        Returns:
+            None
+        """
+        self.start -= count
+
+    def expire(self, now_ns: int) -> int:
+        """
+        Evicts the trades that are older than the window span relative to the given time.
+
+        Parameters:
+            now_ns (int): The time the window ends at, in nanoseconds since the epoch.
+
+        Returns:
+            int: The number of trades evicted.
+        """
+        cutoff = now_ns - self.span_ns
+        timestamps = self.store.timestamps
+        start = self.start
+        if start == len(timestamps) or timestamps[start] >= cutoff:
+            return 0
+        end = bisect_left(timestamps, cutoff, start)
+        if end == len(timestamps):
+            # Reset the running sums so floating point error cannot accumulate across empty windows.
+            self.total_quantity = 0
+            self.total_traded_price_quantity = 0
+            self.net_quantity = 0
+            self.net_traded_price_quantity = 0
+        else:
+            store = self.store
+            quantities = store.quantities[start:end]
+            prices = store.prices[start:end]
+            sides = store.sides[start:end]
+            self.total_quantity -= sum(quantities)
+            self.total_traded_price_quantity -= sum(map(mul, prices, quantities))
+            self.net_quantity -= sum(map(mul, quantities, sides))
+            self.net_traded_price_quantity -= sum(_signed_price_quantities(prices, quantities, sides))
+        self.start = end
+        return end - start
+
+    def next_expiry_ns(self) -> Optional[int]:
+        """
+        Returns the earliest time at which expire evicts a trade.
+
+        Returns:
+            Optional[int]: The time in nanoseconds since the epoch, or None if the window is empty.
+        """
+        if self.start == len(self.store.timestamps):
+            return None
+        return self.store.timestamps[self.start] + self.span_ns + 1
+
+    def volume_weighted_price(self) -> float:
+        """
+        Calculates the volume-weighted price of the trades currently inside the window.
+
+        Returns:
+            float: The volume-weighted price, or 0 if the window is empty.
+        """
+        if self.total_quantity == 0:
+            return 0
+        return self.total_traded_price_quantity / self.total_quantity
+
+    def order_flow(self) -> OrderFlow:
+        """
+        Splits the trading inside the window by side.
+
+        Returns:
+            OrderFlow: The combined and per-side volume-weighted prices, quantities and the order flow imbalance.
+        """
+        total_quantity = self.total_quantity
+        if total_quantity == 0:
+            return OrderFlow(0, 0, 0, 0, 0, 0, 0.0)
+        net_quantity = self.net_quantity
+        buy_quantity = (total_quantity + net_quantity) // 2
+        sell_quantity = total_quantity - buy_quantity
+        buy_price_quantity = (self.total_traded_price_quantity + self.net_traded_price_quantity) / 2
+        sell_price_quantity = (self.total_traded_price_quantity - self.net_traded_price_quantity) / 2
+        return OrderFlow(
+            self.total_traded_price_quantity / total_quantity,
+            buy_price_quantity / buy_quantity if buy_quantity else 0,
+            sell_price_quantity / sell_quantity if sell_quantity else 0,
+            buy_quantity,
+            sell_quantity,
+            net_quantity,
+            net_quantity / total_quantity,
+        )
+
+
+class StockState(NamedTuple):
+    """
+    A self-contained copy of a stock's state, taken by Stock.export_state and restored by Stock.from_state.
+
+    Attributes:
+        symbol (str): The stock's symbol.
+        type (str): The stock's type ('Common' or 'Preferred').
+        last_dividend (float): The last dividend paid by the stock.
+        fixed_dividend (float): The fixed dividend paid by the stock.
+        par_value (float): The par value of the stock.
+        version (int): The stock's version.
+        timestamps (array): The in-memory trade timestamps, in nanoseconds since the epoch.
+        quantities (array): The in-memory trade quantities.
+        prices (array): The in-memory trade prices.
+        sides (array): The in-memory trade side codes.
+        window_start (int): The position of the oldest trade inside the 5 minute window.
+        window_quantity (int): The quantity traded inside the window.
+        window_price_quantity (float): The sum of price * quantity inside the window.
+        window_net_quantity (int): The sum of side * quantity inside the window.
+        window_net_price_quantity (float): The sum of side * price * quantity inside the window.
+        buckets (Tuple[array, ...]): The per-second rollups, as returned by BucketAggregates.columns.
+        history (HistorySummary): Aggregates of the trades evicted by the retention policy.
+    """
+    symbol: str
+    type: str
+    last_dividend: float
+    fixed_dividend: float
+    par_value: float
+    version: int
+    timestamps: array
+    quantities: array
+    prices: array
+    sides: array
+    window_start: int
+    window_quantity: int
+    window_price_quantity: float
+    window_net_quantity: int
+    window_net_price_quantity: float
+    buckets: Tuple[array, array, array, array, array, array]
+    history: HistorySummary
 
 
 class Stock:
@@ -13,7 +308,18 @@ class Stock:
         last_dividend (float): A float representing the last dividend paid by the stock.
         fixed_dividend (float): A float representing the fixed dividend paid by the stock (only for 'Preferred' stocks).
         par_value (float): A float representing the par value of the stock.
-        trades (List[Trade]): A list of Trade objects representing the stock's trading history.
+        trades (TradeStore): A sequence of Trade objects representing the stock's trading history.
+        clock (Clock): The clock that timestamps trades and slides the 5 minute window.
+        buckets (BucketAggregates): Per-second rollups of the trading history for arbitrary window queries.
+        retention (Optional[RetentionPolicy]): The policy bounding the in-memory trading history, if any.
+        history (HistorySummary): Aggregates of the trades evicted by the retention policy.
+        journal (Optional[Journal]): The write-ahead journal trades are appended to before they are applied, if any.
+        dividend (float): The dividend the yield and P/E ratio are based on.
+        dividend_listener (Optional[Callable[[Stock], None]]): Called whenever the dividend is recomputed.
+        version (int): A counter that changes whenever the stock's volume-weighted price may have changed.
+        listener (Optional[Callable[[Stock], None]]): Called when the version changes while the stock is clean.
+        dirty (bool): Whether the version changed since mark_clean was last called.
+        next_expiry_ns (Optional[int]): When the oldest trade leaves the 5 minute window, if there is one.
 
     Methods:
         __init__(symbol: str, type: str, last_dividend: float, fixed_dividend: float, par_value: float)
@@ -28,10 +334,62 @@ class Stock:
         record_trade(quantity: int, indicator: str, price: float)
             Records a new trade for the stock with the given quantity, indicator, and price.
 
+        record_trades(trades: Iterable[Tuple[Optional[Union[datetime.datetime, int]], int, str, float]]) -> List[RejectedTrade]
+            Records a batch of trades, returning the ones that were rejected.
+
+        replay_trades(timestamps: array, quantities: array, sides: array, prices: array)
+            Stores trades replayed from a journal.
+
         calculate_volume_weighted_stock_price() -> float
             Calculates the volume-weighted average price of the stock over the last 5 minutes.
+
+        calculate_volume_weighted_stock_prices(windows: Iterable[datetime.timedelta]) -> Dict[datetime.timedelta, float]
+            Calculates the volume-weighted average price of the stock over several windows at once.
+
+        summarize_window(window: datetime.timedelta) -> WindowSummary
+            Summarizes the trading of the stock over a window.
+
+        calculate_order_flow() -> OrderFlow
+            Splits the trading of the stock over the last 5 minutes by side.
+
+        compact() -> int
+            Evicts the trades the retention policy no longer keeps in memory.
+
+        export_state() -> StockState
+            Copies the stock's state out, for example to snapshot it.
+
+        from_state(state: StockState) -> Stock
+            Recreates a stock from a copy of its state.
+
+        mark_clean()
+            Re-arms the listener after the stock's changes have been picked up.
+
+    Concurrency: writes to a stock are serialized by a per-stock lock, so feed handlers for different stocks
+    never contend. Every write publishes the stock's version and volume-weighted price as one immutable
+    tuple; version and calculate_volume_weighted_stock_price return that snapshot and never wait for a
+    writer, so readers see a consistent state that is at most one in-flight write behind.
+
+    Change notification: a stock is marked dirty whenever its version changes, that is when a trade is
+    recorded or trades leave the 5 minute window, and the listener, if any, is called on the first change
+    only. It is called under the stock's lock, so it must not block; GBCE uses it to queue the stock for a
+    lazy recompute and calls mark_clean before reading the new price.
     """
-    def __init__(self, symbol: str, type: str, last_dividend: float, fixed_dividend: float, par_value: float):
+    VWSP_WINDOW = datetime.timedelta(minutes=5)
+    BUCKET_RESOLUTION = datetime.timedelta(seconds=1)
+    BUCKET_RETENTION = datetime.timedelta(hours=1)
+
+    def __init__(
+        self,
+        symbol: str,
+        type: str,
+        last_dividend: float,
+        fixed_dividend: float,
+        par_value: float,
+        clock: Optional[Clock] = None,
+        bucket_retention: Optional[datetime.timedelta] = None,
+        retention: Optional[RetentionPolicy] = None,
+        journal: Optional[Journal] = None,
+    ):
         """
         Initializes a new Stock object with the given attributes.
 
@@ -41,6 +399,14 @@ class Stock:
             last_dividend (float): A float representing the last dividend paid by the stock.
             fixed_dividend (float): A float representing the fixed dividend paid by the stock (only for 'Preferred' stocks).
             par_value (float): A float representing the par value of the stock.
+            clock (Optional[Clock]): The clock that timestamps trades and slides the 5 minute window. Defaults to
+                the wall clock.
+            bucket_retention (Optional[datetime.timedelta]): How long the per-second rollups are kept, which is
+                also the longest window summarize_window accepts. Defaults to BUCKET_RETENTION.
+            retention (Optional[RetentionPolicy]): The policy bounding the in-memory trading history. By default
+                every trade is kept.
+            journal (Optional[Journal]): A write-ahead journal to append trades to. By default trades are only
+                kept in memory.
 
         Attributes:
             symbol (str): The stock's symbol.
@@ -48,14 +414,272 @@ class Stock:
             last_dividend (float): The last dividend paid by the stock.
             fixed_dividend (float): The fixed dividend paid by the stock (only for 'Preferred' stocks).
             par_value (float): The par value of the stock.
-            trades (List[Trade]): A list of Trade objects representing the stock's trading history.
+            trades (TradeStore): A sequence of Trade objects representing the stock's trading history.
+            clock (Clock): The clock that timestamps trades and slides the 5 minute window.
+            buckets (BucketAggregates): Per-second rollups of the trading history for arbitrary window queries.
+            retention (Optional[RetentionPolicy]): The policy bounding the in-memory trading history, if any.
+            history (HistorySummary): Aggregates of the trades evicted by the retention policy.
+            journal (Optional[Journal]): The write-ahead journal trades are appended to, if any.
+        """
+        self._symbol = symbol
+        self._type = type
+        self._last_dividend = last_dividend
+        self._fixed_dividend = fixed_dividend
+        self._par_value = par_value
+        self.dividend_listener: Optional[Callable[["Stock"], None]] = None
+        self._update_dividend()
+        self.clock = clock if clock is not None else WALL_CLOCK
+        self._bucket_retention = bucket_retention if bucket_retention is not None else self.BUCKET_RETENTION
+        self.retention = retention
+        self.journal = journal
+        self.listener: Optional[Callable[["Stock"], None]] = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._version = 0
+        self.trades = []
+
+    @classmethod
+    def from_state(
+        cls,
+        state: StockState,
+        clock: Optional[Clock] = None,
+        bucket_retention: Optional[datetime.timedelta] = None,
+        retention: Optional[RetentionPolicy] = None,
+    ) -> "Stock":
+        """
+        Recreates a stock from a copy of its state. The state's columns are taken over rather than copied, and
+        no running sum is recomputed, so the cost does not grow with the number of trades.
+
+        Parameters:
+            state (StockState): The state, as returned by export_state or read from a snapshot.
+            clock (Optional[Clock]): The clock of the new stock. Defaults to the wall clock.
+            bucket_retention (Optional[datetime.timedelta]): How long the per-second rollups are kept.
+            retention (Optional[RetentionPolicy]): The policy bounding the in-memory trading history, if any.
+
+        Returns:
+            Stock: The restored stock.
         """
-        self.symbol = symbol
-        self.type = type
-        self.last_dividend = last_dividend
-        self.fixed_dividend = fixed_dividend
-        self.par_value = par_value
-        self.trades: List[Trade] = []
+        stock = cls(
+            state.symbol, state.type, state.last_dividend, state.fixed_dividend, state.par_value,
+            clock, bucket_retention, retention,
+        )
+        store = TradeStore.from_columns(state.timestamps, state.quantities, state.sides, state.prices)
+        with stock._lock:
+            stock._trades = store
+            stock._window = VolumeWeightedWindow.restore(
+                store,
+                cls.VWSP_WINDOW,
+                state.window_start,
+                state.window_quantity,
+                state.window_price_quantity,
+                state.window_net_quantity,
+                state.window_net_price_quantity,
+            )
+            stock.buckets = BucketAggregates.from_columns(
+                store, cls.BUCKET_RESOLUTION, stock._bucket_retention, state.buckets
+            )
+            stock.history = state.history.copy()
+            stock._version = state.version
+            stock._publish()
+        return stock
+
+    def export_state(self) -> StockState:
+        """
+        Copies the stock's state out, for example to snapshot it.
+
+        Only the trades that are still needed are copied: those inside the 5 minute window and those within
+        the bucket retention period, which summarize_window can reach. Older trades are left out, as if a
+        retention policy had dropped them without a history, so the copy is bounded by the retention period
+        rather than by the length of the trading day. The stock is locked only while these columns are
+        copied, so trades for this stock wait briefly and trades for other stocks not at all.
+
+        Returns:
+            StockState: A copy of the stock's state that later writes do not affect.
+        """
+        with self._lock:
+            self._expire()
+            store = self._trades
+            window = self._window
+            retention_ns = self._bucket_retention // datetime.timedelta(microseconds=1) * 1000
+            first = min(window.start, bisect_left(store.timestamps, self.clock.now_ns() - retention_ns))
+            return StockState(
+                self._symbol,
+                self._type,
+                self._last_dividend,
+                self._fixed_dividend,
+                self._par_value,
+                self._version,
+                store.timestamps[first:],
+                store.quantities[first:],
+                store.prices[first:],
+                store.sides[first:],
+                window.start - first,
+                window.total_quantity,
+                window.total_traded_price_quantity,
+                window.net_quantity,
+                window.net_traded_price_quantity,
+                self.buckets.columns(),
+                self.history.copy(),
+            )
+
+    @property
+    def symbol(self) -> str:
+        """
+        The stock's symbol. It is read-only because exchanges index their constituents by it.
+        """
+        return self._symbol
+
+    @property
+    def type(self) -> str:
+        """
+        The stock's type ('Common' or 'Preferred').
+        """
+        return self._type
+
+    @type.setter
+    def type(self, type: str):
+        self._type = type
+        self._update_dividend()
+
+    @property
+    def last_dividend(self) -> float:
+        """
+        The last dividend paid by the stock.
+        """
+        return self._last_dividend
+
+    @last_dividend.setter
+    def last_dividend(self, last_dividend: float):
+        self._last_dividend = last_dividend
+        self._update_dividend()
+
+    @property
+    def fixed_dividend(self) -> float:
+        """
+        The fixed dividend paid by the stock (only for 'Preferred' stocks).
+        """
+        return self._fixed_dividend
+
+    @fixed_dividend.setter
+    def fixed_dividend(self, fixed_dividend: float):
+        self._fixed_dividend = fixed_dividend
+        self._update_dividend()
+
+    @property
+    def par_value(self) -> float:
+        """
+        The par value of the stock.
+        """
+        return self._par_value
+
+    @par_value.setter
+    def par_value(self, par_value: float):
+        self._par_value = par_value
+        self._update_dividend()
+
+    @property
+    def dividend(self) -> float:
+        """
+        The dividend the yield and P/E ratio are based on: the last dividend for 'Common' stocks and the fixed
+        dividend multiplied by the par value otherwise. It is recomputed whenever one of its inputs changes.
+        """
+        return self._dividend
+
+    def _update_dividend(self):
+        if self._type == 'Common':
+            self._dividend = self._last_dividend
+        else:
+            self._dividend = self._fixed_dividend * self._par_value
+        listener = self.dividend_listener
+        if listener is not None:
+            listener(self)
+
+    @property
+    def trades(self) -> TradeStore:
+        """
+        The stock's trading history as a compact, time-ordered TradeStore.
+
+        Reading a trade from the store creates a Trade object on demand. Assigning a list of trades
+        replaces the history and resets the volume-weighted price window.
+        """
+        return self._trades
+
+    @trades.setter
+    def trades(self, trades: Iterable[Trade]):
+        store = TradeStore(trades)
+        with self._lock:
+            self._trades = store
+            self._window = VolumeWeightedWindow(store, self.VWSP_WINDOW)
+            self.buckets = BucketAggregates(store, self.BUCKET_RESOLUTION, self._bucket_retention)
+            self.history = HistorySummary()
+            self._version += 1
+            self._publish()
+
+    @property
+    def version(self) -> int:
+        """
+        A counter that changes whenever the stock's volume-weighted price may have changed.
+
+        The counter is bumped when a trade is recorded and when trades age out of the 5 minute window, so
+        callers caching the volume-weighted price only need to recompute it when the version moves.
+        """
+        return self._read()[0]
+
+    @property
+    def dirty(self) -> bool:
+        """
+        Whether the stock's version changed since mark_clean was last called.
+        """
+        return self._dirty
+
+    def mark_clean(self):
+        """
+        Clears the dirty flag, so that the listener is called again on the next change.
+
+        Call it before reading the new price: a change that lands in between then marks the stock dirty again
+        rather than being missed.
+
+        Returns:
+            None
+        """
+        self._dirty = False
+
+    @property
+    def next_expiry_ns(self) -> Optional[int]:
+        """
+        The time, in nanoseconds since the epoch, at which the oldest trade inside the 5 minute window leaves
+        it and the version changes, or None if the window is empty.
+        """
+        with self._lock:
+            return self._window.next_expiry_ns()
+
+    def _publish(self):
+        # Readers pick up the version and price as one tuple, so they never see a half-applied write.
+        self._published = (self._version, self._window.volume_weighted_price())
+        listener = self.listener
+        if listener is not None and not self._dirty:
+            self._dirty = True
+            listener(self)
+
+    def _read(self) -> Tuple[int, float]:
+        # Readers never wait for a writer: if a write is in progress, the last published state is returned.
+        if self._lock.acquire(blocking=False):
+            try:
+                self._expire()
+            finally:
+                self._lock.release()
+        return self._published
+
+    def _expire(self):
+        now_ns = self.clock.now_ns()
+        self.buckets.expire(now_ns)
+        evicted = self._window.expire(now_ns)
+        if evicted:
+            self._version += 1
+            self._publish()
+            if METRICS.enabled:
+                METRICS.increment("gbce_trades_expired_total", evicted, self._symbol)
+                METRICS.set_gauge("gbce_window_trades", len(self._window), self._symbol)
 
     def calculate_dividend_yield(self, price: float) -> float:
         """
@@ -67,10 +691,7 @@ class Stock:
         Returns:
             float: The dividend yield of the stock. If the stock type is 'Common', the function returns the last dividend paid by the stock divided by the current market price. If the stock type is 'Preferred', the function returns the fixed dividend paid by the stock (multiplied by its par value) divided by the current market price.
         """
-        if self.type == 'Common':
-            return self.last_dividend / price
-        elif self.type == 'Preferred':
-            return (self.fixed_dividend * self.par_value) / price
+        return self._dividend / price
 
     def calculate_pe_ratio(self, price: float) -> float:
         """
@@ -82,12 +703,14 @@ class Stock:
         Returns:
             float: The price-to-earnings (P/E) ratio of the stock. If the dividend is zero, the function returns 0. In some cases, the function may also return infinity.
         """
-        dividend = self.last_dividend if self.type == 'Common' else (self.fixed_dividend * self.par_value)
+        dividend = self._dividend
         if dividend == 0:
             return 0 # may also return inf
         return price / dividend
 
-    def record_trade(self, quantity: int, indicator: str, price: float):
+    def record_trade(
+        self, quantity: int, indicator: str, price: float, timestamp: Optional[Union[datetime.datetime, int]] = None
+    ):
         """
         Records a new trade for the stock with the given quantity, indicator, and price.
 
@@ -95,13 +718,161 @@ class Stock:
             quantity (int): The number of shares traded.
             indicator (str): A string representing the type of trade (e.g., 'Buy', 'Sell').
             price (float): The price at which the trade was executed.
+            timestamp (Optional[Union[datetime.datetime, int]]): The event time of the trade, as a datetime or
+                nanoseconds since the epoch. Defaults to the stock's clock.
 
         Returns:
             None: This function does not return a value. It simply records the trade in the stock's trading history.
         """
-        timestamp = datetime.datetime.now()
-        trade = Trade(timestamp, quantity, indicator, price)
-        self.trades.append(trade)
+        started = perf_counter_ns() if METRICS.enabled else 0
+        validate_trade(quantity, indicator, price)
+        side = SIDE_CODES[indicator]
+        if timestamp is None:
+            timestamp_ns = self.clock.now_ns()
+        else:
+            if isinstance(timestamp, datetime.datetime):
+                timestamp_ns = to_epoch_ns(timestamp)
+            elif isinstance(timestamp, int):
+                timestamp_ns = timestamp
+            else:
+                raise TypeError("timestamp must be a datetime object or epoch nanoseconds")
+            reason = invalid_timestamp_reason(timestamp_ns)
+            if reason is not None:
+                raise ValueError(reason)
+            self.clock.observe(timestamp_ns)
+        with self._lock:
+            if self.journal is not None:
+                self.journal.append(self._symbol, timestamp_ns, quantity, side, price)
+            position = self._trades.append(timestamp_ns, quantity, side, price)
+            self._window.add(position)
+            self.buckets.add(position)
+            if self.retention is not None:
+                self._retain(False)
+            self._version += 1
+            self._publish()
+        if started:
+            self._report("gbce_record_trade_seconds", started, 1)
+
+    def record_trades(self, trades: Iterable[Tuple[Optional[Union[datetime.datetime, int]], int, str, float]]) -> List[RejectedTrade]:
+        """
+        Records a batch of trades, validating them together and storing the valid ones in one step.
+
+        Invalid trades do not stop the batch; they are skipped and reported back instead of raising.
+
+        Parameters:
+            trades (Iterable[Tuple]): (timestamp, quantity, indicator, price) rows. The timestamp may be a
+                datetime, integer nanoseconds since the epoch, or None for the stock's clock time.
+
+        Returns:
+            List[RejectedTrade]: The position in the batch and the reason of every rejected trade.
+        """
+        started = perf_counter_ns() if METRICS.enabled else 0
+        timestamps = array("q")
+        quantities = array("q")
+        sides = array("b")
+        prices = array("d")
+        rejected: List[RejectedTrade] = []
+        now_ns = None
+        side_codes = SIDE_CODES
+
+        for row, (timestamp, quantity, indicator, price) in enumerate(trades):
+            reason = invalid_trade_reason(quantity, indicator, price)
+            if reason is not None:
+                rejected.append(RejectedTrade(row, reason))
+                continue
+            if timestamp is None:
+                if now_ns is None:
+                    now_ns = self.clock.now_ns()
+                timestamp = now_ns
+            elif isinstance(timestamp, datetime.datetime):
+                timestamp = to_epoch_ns(timestamp)
+            elif not isinstance(timestamp, int):
+                rejected.append(RejectedTrade(row, "timestamp must be a datetime object or epoch nanoseconds"))
+                continue
+            reason = invalid_timestamp_reason(timestamp)
+            if reason is not None:
+                rejected.append(RejectedTrade(row, reason))
+                continue
+            timestamps.append(timestamp)
+            quantities.append(quantity)
+            sides.append(side_codes[indicator])
+            prices.append(price)
+
+        if timestamps:
+            self._store_trades(timestamps, quantities, sides, prices)
+            self.clock.observe(max(timestamps))
+        if started:
+            self._report("gbce_record_trades_seconds", started, len(timestamps))
+        return rejected
+
+    def _report(self, name: str, started: int, recorded: int):
+        symbol = self._symbol
+        METRICS.observe(name, perf_counter_ns() - started, symbol)
+        METRICS.increment("gbce_trades_recorded_total", recorded, symbol)
+        METRICS.set_gauge("gbce_window_trades", len(self._window), symbol)
+
+    def replay_trades(self, timestamps: array, quantities: array, sides: array, prices: array):
+        """
+        Stores trades replayed from a journal. They are trusted to be valid and are not journaled again.
+
+        Parameters:
+            timestamps (array): The times of the trades in nanoseconds since the epoch.
+            quantities (array): The numbers of shares traded.
+            sides (array): The side codes of the trades.
+            prices (array): The prices at which the trades were executed.
+
+        Returns:
+            None
+        """
+        self._store_trades(timestamps, quantities, sides, prices, journaled=False)
+        self.clock.observe(max(timestamps))
+
+    def _store_trades(self, timestamps: array, quantities: array, sides: array, prices: array, journaled: bool = True):
+        with self._lock:
+            if journaled and self.journal is not None:
+                self.journal.append_columns(self._symbol, timestamps, quantities, sides, prices)
+            store = self._trades
+            if store.can_extend(timestamps):
+                position = store.extend(timestamps, quantities, sides, prices)
+                self._window.add_range(position)
+                self.buckets.add_range(position)
+            else:
+                for trade in zip(timestamps, quantities, sides, prices):
+                    position = store.append(*trade)
+                    self._window.add(position)
+                    self.buckets.add(position)
+            self._version += 1
+            if self.retention is not None:
+                self._retain(False)
+            self._publish()
+
+    def compact(self) -> int:
+        """
+        Evicts the trades the retention policy no longer keeps in memory, without waiting for a full batch.
+
+        Returns:
+            int: The number of trades evicted.
+        """
+        if self.retention is None:
+            return 0
+        with self._lock:
+            return self._retain(True)
+
+    def _retain(self, force: bool) -> int:
+        # Only trades that have already left the 5 minute window can go.
+        self._expire()
+        store = self._trades
+        count = min(self.retention.evictable(store, self.clock.now_ns()), self._window.start)
+        if count <= 0 or (not force and count < max(1, len(store) // 8)):
+            return 0
+        if self.retention.spill_directory is not None:
+            append_segment(self.retention.segment_path(self.symbol), store, count)
+        self.history.add(store, count)
+        store.discard(count)
+        self._window.discard(count)
+        if METRICS.enabled:
+            METRICS.increment("gbce_trades_retired_total", count, self._symbol)
+        return count
 
     def calculate_volume_weighted_stock_price(self) -> float:
         """
@@ -113,16 +884,57 @@ class Stock:
         Returns:
             float: The volume-weighted average price of the stock over the last 5 minutes. If there are no trades within the last 5 minutes, the function returns 0.
         """
-        total_quantity = 0
-        total_traded_price_quantity = 0
-        five_minutes_ago = datetime.datetime.now() - datetime.timedelta(minutes=5)
+        if not METRICS.enabled:
+            return self._read()[1]
+        started = perf_counter_ns()
+        price = self._read()[1]
+        METRICS.observe("gbce_vwsp_seconds", perf_counter_ns() - started, self._symbol)
+        return price
 
-        for trade in self.trades:
-            if trade.timestamp >= five_minutes_ago:
-                total_quantity += trade.quantity
-                total_traded_price_quantity += trade.price * trade.quantity
+    def calculate_volume_weighted_stock_prices(
+        self, windows: Iterable[datetime.timedelta]
+    ) -> Dict[datetime.timedelta, float]:
+        """
+        Calculates the volume-weighted average price of the stock over several windows ending now.
 
-        if total_quantity == 0:
-            return 0
-        return total_traded_price_quantity / total_quantity
+        The windows are answered together from the per-second rollups in one pass, so the cost is
+        proportional to the number of traded seconds in the longest window rather than the number of trades.
+
+        Parameters:
+            windows (Iterable[datetime.timedelta]): The lengths of the windows, at most the bucket retention.
+
+        Returns:
+            Dict[datetime.timedelta, float]: The volume-weighted average price over each window, 0 if nothing traded.
+        """
+        windows = list(windows)
+        with self._lock:
+            summaries = self.buckets.summarize_many(windows, self.clock.now_ns())
+        return {window: summary.volume_weighted_price for window, summary in zip(windows, summaries)}
 
+    def summarize_window(self, window: datetime.timedelta) -> WindowSummary:
+        """
+        Summarizes the trading of the stock over a window ending now.
+
+        Parameters:
+            window (datetime.timedelta): The length of the window, at most the bucket retention.
+
+        Returns:
+            WindowSummary: The volume-weighted price, quantity, number of trades, high and low over the window.
+        """
+        with self._lock:
+            return self.buckets.summarize(window, self.clock.now_ns())
+
+    def calculate_order_flow(self) -> OrderFlow:
+        """
+        Splits the trading of the stock over the last 5 minutes by side.
+
+        The buy and sell figures come from running sums kept alongside the combined ones, so the cost does
+        not depend on the number of trades in the window.
+
+        Returns:
+            OrderFlow: The combined, buy and sell volume-weighted prices, the quantities bought and sold, the
+            net quantity and the order flow imbalance.
+        """
+        with self._lock:
+            self._expire()
+            return self._window.order_flow()
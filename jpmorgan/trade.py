@@ -1,6 +1,135 @@
 import datetime
+import sys
+from enum import IntEnum
+from typing import NamedTuple, Optional
+
+
+class Side(IntEnum):
+    """
+    The side of a trade. Members are small ints, so they are stored as one byte codes and compare as ints.
+    """
+    BUY = 1
+    SELL = -1
+
+
+BUY = Side.BUY
+SELL = Side.SELL
+SIDE_CODES = {"buy": BUY, "sell": SELL}
+SIDE_INDICATORS = {BUY: "buy", SELL: "sell"}
+
+_NAIVE_EPOCH = datetime.datetime(1970, 1, 1)
+_AWARE_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Quantities and timestamps are stored as signed 64 bit integers.
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+# Prices are stored as doubles. Infinities and NaN are refused, as they would poison running sums.
+_MAX_PRICE = sys.float_info.max
+
+
+def to_epoch_ns(timestamp: datetime.datetime) -> int:
+    """
+    Converts a datetime into integer nanoseconds since the epoch.
+
+    Naive datetimes are measured from a naive 1970-01-01, so they round-trip through from_epoch_ns unchanged.
+
+    :param timestamp: The datetime to convert.
+    :type timestamp: datetime.datetime
+    :return: The number of nanoseconds since the epoch.
+    :rtype: int
+    """
+    epoch = _NAIVE_EPOCH if timestamp.tzinfo is None else _AWARE_EPOCH
+    return (timestamp - epoch) // _ONE_MICROSECOND * 1000
+
+
+def from_epoch_ns(timestamp_ns: int) -> datetime.datetime:
+    """
+    Converts integer nanoseconds since the epoch back into a naive datetime.
+
+    :param timestamp_ns: The number of nanoseconds since the epoch.
+    :type timestamp_ns: int
+    :return: The corresponding naive datetime, truncated to microseconds.
+    :rtype: datetime.datetime
+    """
+    return _NAIVE_EPOCH + datetime.timedelta(microseconds=timestamp_ns // 1000)
+
+
+def invalid_trade_reason(quantity: int, indicator: str, price: float) -> Optional[str]:
+    """
+    Checks the quantity, indicator and price of a trade without raising.
+
+    :param quantity: The integer representing the quantity of the trade.
+    :type quantity: int
+    :param indicator: The string representing the indicator used for the trade.
+    :type indicator: str
+    :param price: The float representing the price of the trade.
+    :type price: float
+    :return: A message describing the first invalid field, or None if the trade is valid.
+    :rtype: Optional[str]
+    """
+    if not isinstance(quantity, int) or quantity <= 0:
+        return "quantity must be a positive integer"
+    if quantity > INT64_MAX:
+        return "quantity must be at most 2**63 - 1"
+    if indicator not in SIDE_CODES:
+        return "indicator must be 'buy' or 'sell'"
+    if not isinstance(price, (int, float)) or not 0 < price <= _MAX_PRICE:
+        return "price must be a positive finite number"
+    return None
+
+
+def invalid_timestamp_reason(timestamp_ns: int) -> Optional[str]:
+    """
+    Checks that a timestamp in nanoseconds since the epoch can be stored, without raising.
+
+    :param timestamp_ns: The number of nanoseconds since the epoch.
+    :type timestamp_ns: int
+    :return: A message if the timestamp is out of the signed 64 bit range, or None if it is valid.
+    :rtype: Optional[str]
+    """
+    if not INT64_MIN <= timestamp_ns <= INT64_MAX:
+        return "timestamp must be within 64 bit epoch nanoseconds (years 1677 to 2262)"
+    return None
+
+
+def validate_trade(quantity: int, indicator: str, price: float) -> None:
+    """
+    Checks the quantity, indicator and price of a trade, raising ValueError if any of them is invalid.
+
+    :param quantity: The integer representing the quantity of the trade.
+    :type quantity: int
+    :param indicator: The string representing the indicator used for the trade.
+    :type indicator: str
+    :param price: The float representing the price of the trade.
+    :type price: float
+    """
+    reason = invalid_trade_reason(quantity, indicator, price)
+    if reason is not None:
+        raise ValueError(reason)
+
+
+class RejectedTrade(NamedTuple):
+    """
+    A trade that a batch ingestion call refused to record.
+
+    :param row: The position of the trade in the batch that was passed in.
+    :param reason: A message describing why the trade was rejected.
+    """
+    row: int
+    reason: str
+
 
 class Trade:
+    """
+    A single trade, stored as epoch nanoseconds, a quantity, a side code and a price.
+
+    The string indicator is derived from the side code, and whichever of timestamp and timestamp_ns the
+    trade was not created with is computed on first access. Trades read back from a TradeStore are built
+    with Trade.trusted, which skips validation and only creates a datetime if the timestamp is asked for.
+    """
+    __slots__ = ("_timestamp_ns", "quantity", "side", "price", "_timestamp")
+
     def __init__(self, timestamp: datetime.datetime, quantity: int, indicator: str, price: float) -> None:
         """
         Initialize a Trade object with the given timestamp, quantity, indicator, and price.
@@ -16,13 +145,75 @@ class Trade:
         """
         if not isinstance(timestamp, datetime.datetime):
             raise TypeError("timestamp must be a datetime object")
-        if not isinstance(quantity, int) or quantity <= 0:
-            raise ValueError("quantity must be a positive integer")
-        if indicator not in ["buy", "sell"]:
-            raise ValueError("indicator must be 'buy' or 'sell'")
-        if not isinstance(price, (int, float)) or price <= 0:
-            raise ValueError("price must be a positive number")
-        self.timestamp = timestamp
+        validate_trade(quantity, indicator, price)
+        self._timestamp = timestamp
+        self._timestamp_ns = None
         self.quantity = quantity
-        self.indicator = indicator
-        self.price = price
\ No newline at end of file
+        self.side = SIDE_CODES[indicator]
+        self.price = price
+
+    @classmethod
+    def trusted(cls, timestamp_ns: int, quantity: int, side: int, price: float) -> "Trade":
+        """
+        Creates a trade from fields that are known to be valid, without checking them.
+
+        Meant for pre-validated batch feeds and for reading trades back from storage.
+
+        :param timestamp_ns: The time of the trade in nanoseconds since the epoch.
+        :type timestamp_ns: int
+        :param quantity: The positive quantity of the trade.
+        :type quantity: int
+        :param side: The side code of the trade, BUY or SELL.
+        :type side: int
+        :param price: The positive price of the trade.
+        :type price: float
+        :return: The trade.
+        :rtype: Trade
+        """
+        trade = cls.__new__(cls)
+        trade._timestamp_ns = timestamp_ns
+        trade.quantity = quantity
+        trade.side = side
+        trade.price = price
+        trade._timestamp = None
+        return trade
+
+    @property
+    def timestamp(self) -> datetime.datetime:
+        """
+        The time of the trade as a datetime. It is created on first access for trusted trades.
+        """
+        if self._timestamp is None:
+            self._timestamp = from_epoch_ns(self.timestamp_ns)
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, timestamp: datetime.datetime):
+        self._timestamp = timestamp
+        self._timestamp_ns = None
+
+    @property
+    def timestamp_ns(self) -> int:
+        """
+        The time of the trade in nanoseconds since the epoch. It is computed on first access for validated trades.
+        """
+        if self._timestamp_ns is None:
+            self._timestamp_ns = to_epoch_ns(self._timestamp)
+        return self._timestamp_ns
+
+    @property
+    def indicator(self) -> str:
+        """
+        The side of the trade as 'buy' or 'sell'.
+        """
+        return SIDE_INDICATORS[self.side]
+
+    @indicator.setter
+    def indicator(self, indicator: str):
+        self.side = SIDE_CODES[indicator]
+
+    def __repr__(self) -> str:
+        return (
+            f"Trade(timestamp_ns={self.timestamp_ns}, quantity={self.quantity}, "
+            f"indicator={self.indicator!r}, price={self.price})"
+        )
\ No newline at end of file
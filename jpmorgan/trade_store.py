@@ -0,0 +1,152 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from operator import attrgetter, le
+from typing import Iterable
+
+from jpmorgan.trade import Trade
+
+
+class TradeStore(Sequence):
+    """
+    A compact, time-ordered trade history stored as parallel typed arrays.
+
+    Each trade takes 25 bytes: an int64 epoch-nanosecond timestamp, an int64 quantity, a float64 price and a
+    one byte side code (see jpmorgan.trade.Side). Trade objects are only created when a trade is read
+    through the sequence interface, with Trade.trusted, so recording trades does not allocate a Python object
+    per trade and reading one back neither validates it nor creates a datetime unless one is asked for.
+
+    Attributes:
+        timestamps (array): The trade timestamps, in nanoseconds since the epoch, in ascending order.
+        quantities (array): The number of shares traded.
+        prices (array): The prices the trades were executed at.
+        sides (array): The side codes of the trades.
+    """
+    def __init__(self, trades: Iterable[Trade] = ()):
+        """
+        Initializes a store holding the given trades, sorted by timestamp.
+
+        Parameters:
+            trades (Iterable[Trade]): The trades to load into the store.
+        """
+        self.timestamps = array("q")
+        self.quantities = array("q")
+        self.prices = array("d")
+        self.sides = array("b")
+        for trade in sorted(trades, key=attrgetter("timestamp_ns")):
+            self.append(trade.timestamp_ns, trade.quantity, trade.side, trade.price)
+
+    @classmethod
+    def from_columns(cls, timestamps: array, quantities: array, sides: array, prices: array) -> "TradeStore":
+        """
+        Creates a store that takes ownership of existing columns without copying them.
+
+        Parameters:
+            timestamps (array): The times of the trades in nanoseconds since the epoch, in ascending order.
+            quantities (array): The numbers of shares traded.
+            sides (array): The side codes of the trades.
+            prices (array): The prices at which the trades were executed.
+
+        Returns:
+            TradeStore: The store holding the columns.
+        """
+        store = cls()
+        store.timestamps = timestamps
+        store.quantities = quantities
+        store.sides = sides
+        store.prices = prices
+        return store
+
+    def append(self, timestamp_ns: int, quantity: int, side: int, price: float) -> int:
+        """
+        Adds a trade to the store, keeping the store ordered by timestamp.
+
+        Parameters:
+            timestamp_ns (int): The time of the trade in nanoseconds since the epoch.
+            quantity (int): The number of shares traded.
+            side (int): The side code of the trade.
+            price (float): The price at which the trade was executed.
+
+        Returns:
+            int: The position the trade was stored at.
+        """
+        timestamps = self.timestamps
+        if not timestamps or timestamp_ns >= timestamps[-1]:
+            timestamps.append(timestamp_ns)
+            self.quantities.append(quantity)
+            self.prices.append(price)
+            self.sides.append(side)
+            return len(timestamps) - 1
+        # Out-of-order trades are rare, so paying for an insertion into the arrays is acceptable.
+        position = bisect_right(timestamps, timestamp_ns)
+        timestamps.insert(position, timestamp_ns)
+        self.quantities.insert(position, quantity)
+        self.prices.insert(position, price)
+        self.sides.insert(position, side)
+        return position
+
+    def can_extend(self, timestamps: array) -> bool:
+        """
+        Checks whether a batch of timestamps can be appended with extend without breaking the time order.
+
+        Parameters:
+            timestamps (array): The times of the trades in nanoseconds since the epoch.
+
+        Returns:
+            bool: True if the batch is in time order and does not start before the newest stored trade.
+        """
+        if not timestamps or not self.timestamps:
+            return all(map(le, timestamps, timestamps[1:]))
+        return timestamps[0] >= self.timestamps[-1] and all(map(le, timestamps, timestamps[1:]))
+
+    def extend(self, timestamps: array, quantities: array, sides: array, prices: array) -> int:
+        """
+        Appends a batch of trades given as columns in one step.
+
+        The batch must satisfy can_extend; out-of-order batches have to be added one trade at a time with append.
+
+        Parameters:
+            timestamps (array): The times of the trades in nanoseconds since the epoch.
+            quantities (array): The numbers of shares traded.
+            sides (array): The side codes of the trades.
+            prices (array): The prices at which the trades were executed.
+
+        Returns:
+            int: The position of the first appended trade.
+        """
+        position = len(self)
+        self.timestamps.extend(timestamps)
+        self.quantities.extend(quantities)
+        self.sides.extend(sides)
+        self.prices.extend(prices)
+        return position
+
+    def discard(self, count: int):
+        """
+        Removes the oldest trades from the store.
+
+        Parameters:
+            count (int): The number of trades to remove, counted from the oldest.
+
+        Returns:
+            None
+        """
+        for column in (self.timestamps, self.quantities, self.prices, self.sides):
+            del column[:count]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        return Trade.trusted(self.timestamps[index], self.quantities[index], self.sides[index], self.prices[index])
+
+    def nbytes(self) -> int:
+        """
+        Returns the number of bytes used by the trade columns.
+
+        Returns:
+            int: The combined size of the column buffers.
+        """
+        return sum(column.itemsize * len(column) for column in (self.timestamps, self.quantities, self.prices, self.sides))
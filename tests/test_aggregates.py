@@ -0,0 +1,106 @@
+import random
+from array import array
+import unittest
+from datetime import datetime, timedelta
+from jpmorgan.aggregates import BucketAggregates, WindowSummary
+from jpmorgan.clock import ManualClock
+from jpmorgan.stock import Stock
+from jpmorgan.trade import BUY, to_epoch_ns
+from jpmorgan.trade_store import TradeStore
+
+SECOND = 10**9
+
+class TestBucketAggregates(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a store with trades spread over twenty minutes."""
+        generator = random.Random(42)
+        self.now = to_epoch_ns(datetime(2024, 7, 9, 10, 0))
+        self.trades = sorted(
+            (self.now - generator.randrange(20 * 60 * SECOND), generator.randint(1, 500), round(generator.uniform(90, 110), 2))
+            for _ in range(2000)
+        )
+        self.store = TradeStore()
+        self.buckets = BucketAggregates(self.store)
+        for timestamp, quantity, price in self.trades:
+            self.buckets.add(self.store.append(timestamp, quantity, BUY, price))
+
+    def expected(self, window):
+        cutoff = self.now - window // timedelta(microseconds=1) * 1000
+        inside = [(quantity, price) for timestamp, quantity, price in self.trades if timestamp >= cutoff]
+        quantity = sum(quantity for quantity, _ in inside)
+        return WindowSummary(
+            sum(price * quantity for quantity, price in inside) / quantity,
+            quantity,
+            len(inside),
+            max(price for _, price in inside),
+            min(price for _, price in inside),
+        )
+
+    def test_summarize_matches_raw_trades(self):
+        """Test that bucket summaries match a scan of the raw trades."""
+        for window in (timedelta(seconds=90.5), timedelta(minutes=5), timedelta(minutes=15)):
+            summary = self.buckets.summarize(window, self.now)
+            expected = self.expected(window)
+            self.assertAlmostEqual(summary.volume_weighted_price, expected.volume_weighted_price)
+            self.assertEqual(summary[1:], expected[1:])
+
+    def test_summarize_many(self):
+        """Test that several windows answered in one pass match individual queries."""
+        windows = [timedelta(minutes=15), timedelta(minutes=1), timedelta(minutes=5)]
+        summaries = self.buckets.summarize_many(windows, self.now)
+        for window, summary in zip(windows, summaries):
+            self.assertEqual(summary, self.buckets.summarize(window, self.now))
+
+    def test_empty_window(self):
+        """Test that a window without trades summarizes to zeros."""
+        self.assertEqual(self.buckets.summarize(timedelta(minutes=5), self.now + 3600 * SECOND), WindowSummary(0, 0, 0, 0.0, 0.0))
+
+    def test_retention(self):
+        """Test that buckets older than the retention period are dropped and longer windows refused."""
+        buckets = BucketAggregates(self.store, retention=timedelta(minutes=10))
+        self.assertLessEqual(len(buckets), 10 * 60 + 1)
+        buckets.expire(self.now + 60 * 60 * SECOND)
+        self.assertEqual(len(buckets), 0)
+        with self.assertRaises(ValueError):
+            buckets.summarize(timedelta(minutes=15), self.now)
+
+    def test_add_range_matches_add(self):
+        """Test that batches aggregated a bucket at a time give the same buckets as trades added one by one."""
+        for retention in (timedelta(hours=1), timedelta(minutes=10)):
+            store = TradeStore()
+            buckets = BucketAggregates(store, retention=retention)
+            expected = BucketAggregates(TradeStore(), retention=retention)
+            for timestamp, quantity, price in self.trades:
+                expected.add(expected.store.append(timestamp, quantity, BUY, price))
+            # Batches of 7 trades often end part way through a bucket that the next batch adds to.
+            for start in range(0, len(self.trades), 7):
+                batch = self.trades[start:start + 7]
+                buckets.add_range(store.extend(
+                    array("q", [timestamp for timestamp, _, _ in batch]),
+                    array("q", [quantity for _, quantity, _ in batch]),
+                    array("b", [BUY] * len(batch)),
+                    array("d", [price for _, _, price in batch]),
+                ))
+            self.assertEqual(buckets.columns(), expected.columns())
+            self.assertEqual(BucketAggregates(store, retention=retention).columns(), expected.columns())
+
+    def test_stock_windows(self):
+        """Test querying a stock for several windows through its clock."""
+        clock = ManualClock(datetime(2024, 7, 9, 10, 0))
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=clock)
+        stock.record_trade(100, 'buy', 100)
+        clock.advance(timedelta(minutes=10))
+        stock.record_trade(100, 'sell', 200)
+        clock.advance(timedelta(seconds=30))
+
+        prices = stock.calculate_volume_weighted_stock_prices([timedelta(minutes=1), timedelta(minutes=15)])
+        self.assertEqual(prices, {timedelta(minutes=1): 200.0, timedelta(minutes=15): 150.0})
+        self.assertEqual(stock.summarize_window(timedelta(minutes=15)), WindowSummary(150.0, 200, 2, 200.0, 100.0))
+        self.assertEqual(
+            stock.calculate_volume_weighted_stock_prices([stock.VWSP_WINDOW])[stock.VWSP_WINDOW],
+            stock.calculate_volume_weighted_stock_price(),
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from benchmarks.suite import bench_index, compare, generate_trades
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_generator_is_reproducible(self):
+        """Test that the synthetic tape only depends on the seed."""
+        first = list(generate_trades(100, ["POP", "TEA"], seed=7))
+        self.assertEqual(first, list(generate_trades(100, ["POP", "TEA"], seed=7)))
+        self.assertNotEqual(first, list(generate_trades(100, ["POP", "TEA"], seed=8)))
+        self.assertEqual([row[0] for row in first], sorted(row[0] for row in first))
+
+    def test_compare_reports_regressions(self):
+        """Test that only metrics worse than the baseline by more than the tolerance are regressions."""
+        baseline = {
+            "vwsp": {"p50_ns": 1000.0, "p99_ns": 2000.0, "ops_per_s": 500_000.0},
+            "memory": {"bytes_per_trade": 25.0},
+        }
+        self.assertEqual(compare({
+            "vwsp": {"p50_ns": 1100.0, "p99_ns": 9000.0, "ops_per_s": 450_000.0},
+            "memory": {"bytes_per_trade": 20.0},
+            "new": {"p50_ns": 1.0},
+        }, baseline, 0.25), [])
+
+        regressions = compare({
+            "vwsp": {"p50_ns": 1500.0, "p99_ns": 2000.0, "ops_per_s": 300_000.0},
+            "memory": {"bytes_per_trade": 40.0},
+        }, baseline, 0.25)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(regressions[0].startswith("vwsp p50_ns"))
+
+    def test_benchmark_reports_percentiles(self):
+        """Test that a latency benchmark reports ordered percentiles and a throughput."""
+        result = bench_index(10, 50)
+        self.assertLessEqual(result["p50_ns"], result["p99_ns"])
+        self.assertGreater(result["ops_per_s"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from datetime import datetime, timedelta
+from jpmorgan.clock import EventTimeClock, ManualClock, WallClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.stock import Stock
+from jpmorgan.trade import to_epoch_ns
+
+class TestClock(unittest.TestCase):
+
+    def setUp(self):
+        """Set up the test data for the tests."""
+        self.start = datetime(2024, 7, 9, 9, 0)
+
+    def test_wall_clock(self):
+        """Test that the wall clock follows datetime.now()."""
+        before = datetime.now()
+        now = WallClock().now()
+        self.assertLessEqual(before, now)
+        self.assertLessEqual(now, datetime.now())
+
+        clock = WallClock()
+        before = to_epoch_ns(datetime.now())
+        now_ns = clock.now_ns()
+        self.assertEqual(now_ns % 1000, 0)
+        self.assertLessEqual(before, now_ns)
+        self.assertLessEqual(now_ns, to_epoch_ns(datetime.now()))
+        # The cached offset is used until it is due to be looked up again.
+        clock._offset = (3600 * 10**9, clock._offset[1])
+        self.assertGreater(clock.now_ns(), to_epoch_ns(datetime.now() + timedelta(minutes=59)))
+        clock._offset = (3600 * 10**9, 0)
+        self.assertLessEqual(clock.now_ns(), to_epoch_ns(datetime.now()))
+
+    def test_manual_clock(self):
+        """Test setting and advancing a manual clock."""
+        clock = ManualClock(self.start)
+        self.assertEqual(clock.now(), self.start)
+        clock.advance(timedelta(minutes=1))
+        self.assertEqual(clock.now(), self.start + timedelta(minutes=1))
+        clock.advance(1000)
+        self.assertEqual(clock.now_ns(), to_epoch_ns(self.start + timedelta(minutes=1, microseconds=1)))
+        clock.set(self.start)
+        self.assertEqual(clock.now(), self.start)
+
+    def test_event_time_clock(self):
+        """Test that an event-time clock only moves forward with observed trades."""
+        clock = EventTimeClock()
+        clock.observe(100)
+        clock.observe(50)
+        self.assertEqual(clock.now_ns(), 100)
+
+    def test_stock_window_follows_manual_clock(self):
+        """Test that trades age out of the window as a manual clock advances."""
+        clock = ManualClock(self.start)
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=clock)
+        stock.record_trade(100, 'buy', 110)
+        self.assertEqual(stock.trades[0].timestamp, self.start)
+
+        clock.advance(timedelta(minutes=3))
+        stock.record_trade(200, 'sell', 120)
+        self.assertAlmostEqual(stock.calculate_volume_weighted_stock_price(), (100*110 + 200*120) / (100 + 200))
+
+        version = stock.version
+        clock.advance(timedelta(minutes=3))
+        self.assertGreater(stock.version, version)
+        self.assertAlmostEqual(stock.calculate_volume_weighted_stock_price(), 120)
+
+        clock.advance(timedelta(minutes=5))
+        self.assertEqual(stock.calculate_volume_weighted_stock_price(), 0)
+
+    def test_event_time_replay(self):
+        """Test that replaying timestamped trades against an event-time clock is deterministic."""
+        gbce = GBCE(clock=EventTimeClock())
+        stock1 = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        stock2 = Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        gbce.add_stock(stock1)
+        gbce.add_stock(stock2)
+        self.assertIs(stock1.clock, gbce.clock)
+
+        stock1.record_trade(100, 'buy', 100, timestamp=self.start)
+        stock2.record_trade(100, 'buy', 400, timestamp=self.start + timedelta(minutes=1))
+        self.assertAlmostEqual(gbce.calculate_all_share_index(), 200.0)
+
+        gbce.record_trades([(self.start + timedelta(minutes=7), "TEA", 100, 'sell', 100)])
+        self.assertEqual(gbce.clock.now(), self.start + timedelta(minutes=7))
+        self.assertAlmostEqual(stock1.calculate_volume_weighted_stock_price(), 0)
+        self.assertAlmostEqual(gbce.calculate_all_share_index(), 100.0)
+
+if __name__ == '__main__':
+    unittest.main()
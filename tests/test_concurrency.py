@@ -0,0 +1,62 @@
+import threading
+import unittest
+from jpmorgan.gbce import GBCE
+from jpmorgan.stock import Stock
+
+class TestConcurrency(unittest.TestCase):
+
+    def test_concurrent_writers_and_readers(self):
+        """Test that feed threads and an index reader can run at once without losing trades."""
+        gbce = GBCE()
+        stocks = [Stock(symbol=f"S{i}", type="Common", last_dividend=1, fixed_dividend=0, par_value=100) for i in range(8)]
+        for stock in stocks:
+            gbce.add_stock(stock)
+        done = threading.Event()
+        errors = []
+
+        def feed(stock, batch):
+            for _ in range(2000):
+                if batch:
+                    stock.record_trades([(None, 10, 'buy', 100.0)])
+                else:
+                    stock.record_trade(10, 'buy', 100.0)
+
+        def read():
+            while not done.is_set():
+                try:
+                    index = gbce.calculate_all_share_index()
+                    if index != 0.0 and abs(index - 100.0) > 1e-9:
+                        errors.append(index)
+                except Exception as error:
+                    errors.append(error)
+
+        feeders = [threading.Thread(target=feed, args=(stock, i % 2 == 0)) for i, stock in enumerate(stocks)]
+        feeders += [threading.Thread(target=feed, args=(stocks[0], False))]
+        reader = threading.Thread(target=read)
+        reader.start()
+        for thread in feeders:
+            thread.start()
+        for thread in feeders:
+            thread.join()
+        done.set()
+        reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(stocks[0].trades), 4000)
+        self.assertTrue(all(len(stock.trades) == 2000 for stock in stocks[1:]))
+        self.assertAlmostEqual(gbce.calculate_all_share_index(), 100.0)
+
+    def test_reader_does_not_wait_for_writer(self):
+        """Test that a read during a write returns the last published state instead of blocking."""
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        stock.record_trade(100, 'buy', 110)
+        version = stock.version
+        with stock._lock:
+            result = []
+            reader = threading.Thread(target=lambda: result.append((stock.version, stock.calculate_volume_weighted_stock_price())))
+            reader.start()
+            reader.join(timeout=5)
+        self.assertEqual(result, [(version, 110)])
+
+if __name__ == '__main__':
+    unittest.main()
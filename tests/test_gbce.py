@@ -1,7 +1,13 @@
+import math
+import threading
 import unittest
-from unittest.mock import Mock
+from array import array
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+from jpmorgan.clock import ManualClock
 from jpmorgan.gbce import GBCE
-from jpmorgan.stock import Stock
+from jpmorgan.stock import OrderFlow, Stock
+from jpmorgan.trade import RejectedTrade
 
 class TestGBCE(unittest.TestCase):
 
@@ -26,6 +32,49 @@ class TestGBCE(unittest.TestCase):
         self.assertEqual(self.gbce.stocks[0], stock1)
         self.assertEqual(self.gbce.stocks[1], stock2)
 
+    def test_add_duplicate_symbol(self):
+        """Test that a symbol cannot be listed twice."""
+        self.gbce.add_stock(Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100))
+        with self.assertRaises(ValueError):
+            self.gbce.add_stock(Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100))
+        self.assertEqual(len(self.gbce), 1)
+
+    def test_symbol_lookup(self):
+        """Test looking stocks up by symbol and ordinal."""
+        stock1 = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        stock2 = Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        self.gbce.add_stock(stock1)
+        self.gbce.add_stock(stock2)
+
+        self.assertIn("POP", self.gbce)
+        self.assertNotIn("GIN", self.gbce)
+        self.assertIs(self.gbce.get("TEA"), stock2)
+        self.assertIsNone(self.gbce.get("GIN"))
+        self.assertEqual(self.gbce.ordinal("POP"), 0)
+        self.assertEqual(self.gbce.ordinal("TEA"), 1)
+        self.assertIs(self.gbce.stock_at(1), stock2)
+
+    def test_remove_stock(self):
+        """Test that removing a stock drops it from the index and keeps its ordinal."""
+        stock1 = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        stock2 = Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        stock1.record_trade(100, 'buy', 100)
+        stock2.record_trade(100, 'buy', 400)
+        self.gbce.add_stock(stock1)
+        self.gbce.add_stock(stock2)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 200.0)
+
+        self.assertIs(self.gbce.remove_stock("TEA"), stock2)
+        self.assertNotIn("TEA", self.gbce)
+        self.assertIsNone(self.gbce.stock_at(1))
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 100.0)
+        with self.assertRaises(KeyError):
+            self.gbce.remove_stock("TEA")
+
+        self.gbce.add_stock(stock2)
+        self.assertEqual(self.gbce.ordinal("TEA"), 1)
+        self.assertEqual(self.gbce.stocks, [stock1, stock2])
+
     def test_calculate_all_share_index_no_stocks(self):
         """Test calculating the all-share index with no stocks."""
         index = self.gbce.calculate_all_share_index()
@@ -69,7 +118,307 @@ class TestGBCE(unittest.TestCase):
         self.gbce.add_stock(stock2)
 
         index = self.gbce.calculate_all_share_index()
-        self.assertEqual(index, 100.0)
+        self.assertAlmostEqual(index, 100.0)
+
+    def test_calculate_all_share_index_reflects_new_trades(self):
+        """Test that the all-share index is not served stale after a constituent trades."""
+        stock1 = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        stock2 = Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        self.gbce.add_stock(stock1)
+        self.gbce.add_stock(stock2)
+
+        stock1.record_trade(100, 'buy', 100)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 100.0)
+
+        stock2.record_trade(100, 'sell', 400)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 200.0)
+
+        stock3 = Stock(symbol="GIN", type="Preferred", last_dividend=8, fixed_dividend=0.02, par_value=100)
+        stock3.record_trade(100, 'buy', 125)
+        self.gbce.add_stock(stock3)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), (100.0 * 400.0 * 125.0) ** (1 / 3))
+
+    def test_calculate_all_share_index_recomputes_only_changed_stocks(self):
+        """Test that unchanged constituents are served from the cache."""
+        stock1 = Mock(spec=Stock)
+        stock1.version = 1
+        stock1.calculate_volume_weighted_stock_price.return_value = 100.0
+        stock2 = Mock(spec=Stock)
+        stock2.version = 1
+        stock2.calculate_volume_weighted_stock_price.return_value = 400.0
+
+        self.gbce.add_stock(stock1)
+        self.gbce.add_stock(stock2)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 200.0)
+
+        stock2.version = 2
+        stock2.calculate_volume_weighted_stock_price.return_value = 100.0
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 100.0)
+        self.assertEqual(stock1.calculate_volume_weighted_stock_price.call_count, 1)
+        self.assertEqual(stock2.calculate_volume_weighted_stock_price.call_count, 2)
+
+    def test_calculate_order_flows(self):
+        """Test that the order flow of every constituent is returned by symbol and cached by version."""
+        stock1 = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        stock2 = Mock(spec=Stock)
+        stock2.symbol = "TEA"
+        stock2.version = 1
+        stock2.calculate_order_flow.return_value = OrderFlow(100.0, 0, 100.0, 0, 10, -10, -1.0)
+        self.gbce.add_stock(stock1)
+        self.gbce.add_stock(stock2)
+        stock1.record_trade(100, 'buy', 110)
+        stock1.record_trade(300, 'sell', 130)
+
+        flows = self.gbce.calculate_order_flows()
+        self.assertEqual(list(flows), ["POP", "TEA"])
+        self.assertEqual(flows["POP"], stock1.calculate_order_flow())
+        self.assertEqual((flows["POP"].buy_quantity, flows["POP"].sell_quantity), (100, 300))
+        self.assertEqual(flows["TEA"].imbalance, -1.0)
+
+        stock1.record_trade(100, 'buy', 120)
+        flows = self.gbce.calculate_order_flows()
+        self.assertEqual(flows["POP"].net_quantity, -100)
+        self.assertEqual(stock2.calculate_order_flow.call_count, 1)
+
+    def test_price_of_unlisted_stock_does_not_change_index(self):
+        """Test that reading the price of a stock that is not a constituent leaves the index alone."""
+        listed = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        removed = Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        unlisted = Stock(symbol="ALE", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        self.gbce.add_stock(listed)
+        self.gbce.add_stock(removed)
+        listed.record_trade(100, 'buy', 100)
+        removed.record_trade(100, 'buy', 400)
+        unlisted.record_trade(100, 'buy', 10_000)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 200.0)
+        self.gbce.remove_stock("TEA")
+
+        self.assertAlmostEqual(self.gbce.calculate_volume_weighted_stock_price(unlisted), 10_000)
+        self.assertAlmostEqual(self.gbce.calculate_volume_weighted_stock_price(removed), 400)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 100.0)
+        self.gbce._resync()
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 100.0)
+
+    def test_record_trades_routes_by_symbol(self):
+        """Test that a batch of trades for several symbols reaches the right stocks."""
+        stock1 = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        stock2 = Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        self.gbce.add_stock(stock1)
+        self.gbce.add_stock(stock2)
+
+        rejected = self.gbce.record_trades([
+            (None, "POP", 100, 'buy', 100),
+            (None, "ALE", 100, 'buy', 100),
+            (None, "TEA", 100, 'sell', 400),
+            (None, "TEA", -5, 'sell', 400),
+        ])
+        self.assertEqual(rejected, [
+            RejectedTrade(1, "unknown symbol 'ALE'"),
+            RejectedTrade(3, "quantity must be a positive integer"),
+        ])
+        self.assertEqual(len(stock1.trades), 1)
+        self.assertEqual(len(stock2.trades), 1)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 200.0)
+
+    def test_calculate_dividend_yields_and_pe_ratios(self):
+        """Test the vectorized dividend yield and P/E ratio calculations against the per-stock ones."""
+        stocks = [
+            Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100),
+            Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100),
+            Stock(symbol="GIN", type="Preferred", last_dividend=8, fixed_dividend=0.02, par_value=100),
+        ]
+        for stock in stocks:
+            self.gbce.add_stock(stock)
+        prices = array("d", [100.0, 120.0, 90.0])
+
+        yields = self.gbce.calculate_dividend_yields(prices)
+        ratios = self.gbce.calculate_pe_ratios(prices)
+        for stock, price, dividend_yield, ratio in zip(stocks, prices, yields, ratios):
+            self.assertAlmostEqual(dividend_yield, stock.calculate_dividend_yield(price))
+            self.assertAlmostEqual(ratio, stock.calculate_pe_ratio(price))
+
+        self.assertEqual(list(self.gbce.calculate_pe_ratios([100.0, 0.0], symbols=["GIN", "POP"]))[0], 50.0)
+        self.assertTrue(math.isnan(self.gbce.calculate_dividend_yields([100.0, 0.0], symbols=["GIN", "POP"])[1]))
+
+        self.gbce.remove_stock("POP")
+        self.assertTrue(math.isnan(self.gbce.calculate_dividend_yields(prices)[1]))
+        with self.assertRaises(ValueError):
+            self.gbce.calculate_dividend_yields([100.0])
+        with self.assertRaises(KeyError):
+            self.gbce.calculate_pe_ratios([100.0], symbols=["POP"])
+
+    def test_dividend_follows_stock_changes(self):
+        """Test that the dividend array of the exchange stays in sync with the stocks' dividend fields."""
+        stock = Stock(symbol="GIN", type="Preferred", last_dividend=8, fixed_dividend=0.02, par_value=100)
+        other = Stock(symbol="POP", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        self.gbce.add_stock(stock)
+        self.gbce.add_stock(other)
+        prices = array("d", [100.0, 100.0])
+        self.assertEqual(list(self.gbce.calculate_pe_ratios(prices)), [50.0, 0.0])
+        self.assertEqual(list(self.gbce._dividends), [2.0, 0.0])
+
+        stock.type = "Common"
+        other.last_dividend = 4
+        self.assertEqual(list(self.gbce.calculate_dividend_yields(prices)), [0.08, 0.04])
+        self.assertEqual(list(self.gbce._dividends), [8.0, 4.0])
+        stock.par_value = 50
+        stock.type = "Preferred"
+        self.assertEqual(list(self.gbce.calculate_pe_ratios(prices)), [100.0, 25.0])
+
+        # A removed stock no longer updates the array, also after it changes.
+        self.gbce.remove_stock("POP")
+        other.last_dividend = 5
+        ratios = self.gbce.calculate_pe_ratios(array("d", [100.0, -1.0]))
+        self.assertEqual(ratios[0], 100.0)
+        self.assertTrue(math.isnan(ratios[1]))
+        self.gbce.add_stock(other)
+        self.assertEqual(list(self.gbce.calculate_dividend_yields(array("d", [100.0, 10.0]))), [0.01, 0.5])
+        self.assertTrue(math.isnan(self.gbce.calculate_dividend_yields(array("d", [100.0, 0.0]))[1]))
+
+    def test_calculate_all_share_index_does_not_overflow(self):
+        """Test that a large universe of highly priced stocks does not overflow the index."""
+        for i in range(400):
+            stock = Mock(spec=Stock)
+            stock.calculate_volume_weighted_stock_price.return_value = 1e6 + i
+            self.gbce.add_stock(stock)
+
+        index = self.gbce.calculate_all_share_index()
+        self.assertTrue(math.isfinite(index))
+        self.assertAlmostEqual(index / 1e6, 1.0002, places=4)
+
+    def test_calculate_all_share_index_resync(self):
+        """Test that the periodic resync keeps the running log sum consistent."""
+        self.gbce.RESYNC_INTERVAL = 1
+        stock1 = Mock(spec=Stock)
+        stock1.version = 1
+        stock1.calculate_volume_weighted_stock_price.return_value = 100.0
+        self.gbce.add_stock(stock1)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 100.0)
+
+        stock1.version = 2
+        stock1.calculate_volume_weighted_stock_price.return_value = 0.0
+        self.assertEqual(self.gbce.calculate_all_share_index(), 0)
+        self.assertEqual(self.gbce._log_price_sum, 0.0)
+
+    def reactive_exchange(self, symbols):
+        clock = ManualClock(datetime(2024, 7, 9, 9, 0))
+        gbce = GBCE(clock, reactive=True)
+        for symbol in symbols:
+            gbce.add_stock(Stock(symbol=symbol, type="Common", last_dividend=8, fixed_dividend=0, par_value=100))
+        return gbce, clock
+
+    def test_reactive_index_only_visits_changed_stocks(self):
+        """Test that a reactive exchange recomputes only the stocks that traded or whose window moved on."""
+        symbols = [f"S{i:03d}" for i in range(100)]
+        gbce, clock = self.reactive_exchange(symbols)
+        polled = GBCE(clock)
+        for symbol in symbols:
+            polled.add_stock(gbce.get(symbol))
+        for i, symbol in enumerate(symbols):
+            gbce.get(symbol).record_trade(10, 'buy', 100 + i)
+        self.assertAlmostEqual(gbce.calculate_all_share_index(), polled.calculate_all_share_index())
+
+        with patch.object(gbce, "calculate_volume_weighted_stock_price", wraps=gbce.calculate_volume_weighted_stock_price) as visits:
+            self.assertAlmostEqual(gbce.calculate_all_share_index(), polled.calculate_all_share_index())
+            self.assertEqual(visits.call_count, 0)
+
+            clock.advance(timedelta(minutes=3))
+            gbce.get("S007").record_trade(10, 'sell', 500)
+            gbce.get("S007").record_trade(10, 'sell', 600)
+            self.assertAlmostEqual(gbce.calculate_all_share_index(), polled.calculate_all_share_index())
+            self.assertEqual(visits.call_count, 1)
+
+            # The first trades leave the window; only S007 still has a price afterwards.
+            clock.advance(timedelta(minutes=2, seconds=1))
+            self.assertAlmostEqual(gbce.calculate_all_share_index(), 550)
+            self.assertEqual(visits.call_count, 1 + 100)
+
+            clock.advance(timedelta(minutes=3))
+            self.assertEqual(gbce.calculate_all_share_index(), 0)
+
+        self.assertIsNone(gbce.remove_stock("S007").listener)
+
+    def test_subscribers_are_called_on_moves_over_threshold(self):
+        """Test that callbacks fire for moves over their threshold, including slow drifts, and not otherwise."""
+        gbce, clock = self.reactive_exchange(["POP", "TEA"])
+        calls = []
+        callback = lambda symbol, value: calls.append((symbol, round(value, 6)))
+        gbce.subscribe(0.05, callback, "POP")
+        gbce.subscribe(0.05, callback)
+        gbce.get("TEA").record_trade(100, 'buy', 100)
+        gbce.calculate_all_share_index()
+        self.assertEqual(calls, [(None, 100)])
+
+        pop = gbce.get("POP")
+        pop.record_trade(100, 'buy', 100)
+        gbce.calculate_all_share_index()
+        self.assertEqual(calls[1:], [("POP", 100)])
+
+        # The price moves to 103, 106 and 109: only 106 is more than 5% away from the last notified price.
+        for price in (106, 112, 118):
+            pop.record_trade(100, 'buy', price)
+            gbce.calculate_all_share_index()
+        self.assertEqual(calls[2:], [("POP", 106)])
+
+        gbce.unsubscribe(callback)
+        pop.record_trade(1000, 'sell', 200)
+        gbce.calculate_all_share_index()
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(ValueError):
+            gbce.subscribe(-1, callback)
+
+    def test_subscribers_without_reactive_mode(self):
+        """Test that subscriptions also work when constituents are polled."""
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        self.gbce.add_stock(stock)
+        calls = []
+        self.gbce.subscribe(0, lambda symbol, value: calls.append((symbol, value)), "POP")
+        stock.record_trade(100, 'buy', 100)
+        self.gbce.calculate_all_share_index()
+        self.gbce.calculate_all_share_index()
+        self.assertEqual(calls, [("POP", 100)])
+
+    def test_failing_subscriber_does_not_stop_the_others(self):
+        """Test that an exception in one callback is logged and neither fails the caller nor the timer."""
+        gbce, clock = self.reactive_exchange(["POP", "TEA"])
+        calls = []
+        def failing(symbol, value):
+            raise RuntimeError("boom")
+        gbce.subscribe(0, failing, "POP")
+        gbce.subscribe(0, lambda symbol, value: calls.append(symbol), "TEA")
+        gbce.get("POP").record_trade(100, 'buy', 100)
+        gbce.get("TEA").record_trade(100, 'buy', 100)
+        with self.assertLogs("jpmorgan.gbce", "ERROR"):
+            self.assertAlmostEqual(gbce.calculate_all_share_index(), 100)
+        self.assertEqual(calls, ["TEA"])
+
+        moved = threading.Event()
+        gbce.subscribe(0, lambda symbol, value: moved.set())
+        with self.assertLogs("jpmorgan.gbce", "ERROR"):
+            gbce.start_refresh_timer(timedelta(milliseconds=5))
+            try:
+                gbce.get("POP").record_trade(100, 'buy', 200)
+                self.assertTrue(moved.wait(5))
+                moved.clear()
+                gbce.get("POP").record_trade(100, 'buy', 400)
+                self.assertTrue(moved.wait(5))
+            finally:
+                gbce.stop_refresh_timer()
+
+    def test_refresh_timer(self):
+        """Test that the refresh timer computes the index and calls subscribers without any reader."""
+        gbce, clock = self.reactive_exchange(["POP"])
+        moved = threading.Event()
+        gbce.subscribe(0, lambda symbol, value: moved.set())
+        gbce.start_refresh_timer(timedelta(milliseconds=5))
+        try:
+            with self.assertRaises(ValueError):
+                gbce.start_refresh_timer(timedelta(milliseconds=5))
+            gbce.get("POP").record_trade(100, 'buy', 100)
+            self.assertTrue(moved.wait(5))
+        finally:
+            gbce.stop_refresh_timer()
+        gbce.stop_refresh_timer()
 
 if __name__ == '__main__':
     unittest.main()
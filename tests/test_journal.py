@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from jpmorgan.clock import ManualClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.journal import Journal, read_journal, replay_journal, segment_numbers, segment_path
+from jpmorgan.stock import Stock
+from jpmorgan.trade import to_epoch_ns
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a journal directory and a manual clock."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "journal")
+        self.clock = ManualClock(datetime(2024, 7, 9, 9, 0))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def exchange(self, journal=None):
+        gbce = GBCE(self.clock, journal)
+        gbce.add_stock(Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100))
+        gbce.add_stock(Stock(symbol="GIN", type="Preferred", last_dividend=8, fixed_dividend=0.02, par_value=100))
+        return gbce
+
+    def test_replay_restores_recorded_trades(self):
+        """Test that trades recorded one at a time and in batches are replayed after a restart."""
+        with Journal(self.path) as journal:
+            gbce = self.exchange(journal)
+            for i in range(100):
+                gbce.get("POP").record_trade(10 + i % 3, 'buy', 100 + i % 7)
+                self.clock.advance(timedelta(seconds=1))
+            now = self.clock.now_ns()
+            rejected = gbce.record_trades([
+                (now, "GIN", 5, 'sell', 50),
+                (now, "GIN", 0, 'buy', 50),
+                (now + 1, "POP", 7, 'buy', 101),
+            ])
+            self.assertEqual(len(rejected), 1)
+
+        restored = self.exchange()
+        self.assertEqual(replay_journal(self.path, restored), 102)
+        for stock in gbce.stocks:
+            copy = restored.get(stock.symbol)
+            self.assertEqual(copy.trades.timestamps, stock.trades.timestamps)
+            self.assertEqual(copy.trades.sides, stock.trades.sides)
+            self.assertEqual(
+                copy.calculate_volume_weighted_stock_price(), stock.calculate_volume_weighted_stock_price()
+            )
+        self.assertAlmostEqual(restored.calculate_all_share_index(), gbce.calculate_all_share_index())
+
+    def test_group_commit(self):
+        """Test that trades are buffered until the size threshold or an explicit sync."""
+        journal = Journal(self.path, sync_bytes=1 << 20, sync_interval=timedelta(hours=1))
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=self.clock, journal=journal)
+        stock.record_trade(10, 'buy', 100)
+        path = segment_path(self.path, journal.segment)
+        self.assertEqual(os.path.getsize(path), 0)
+        journal.sync()
+        self.assertGreater(os.path.getsize(path), 0)
+        journal.close()
+        with self.assertRaises(ValueError):
+            stock.record_trade(10, 'buy', 100)
+
+    def test_segments_rotate(self):
+        """Test that full segments are rotated, read back in order and can be removed."""
+        journal = Journal(self.path, sync_bytes=256, segment_bytes=1024)
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=self.clock, journal=journal)
+        for i in range(200):
+            stock.record_trade(10, 'buy', 100 + i)
+            if i % 20 == 0:
+                journal.sync()
+        journal.close()
+        self.assertGreater(len(segment_numbers(self.path)), 2)
+        prices = [price for _, _, _, _, prices in read_journal(self.path) for price in prices]
+        self.assertEqual(prices, [100 + i for i in range(200)])
+
+        # A reopened journal never appends to an existing segment.
+        reopened = Journal(self.path)
+        self.assertEqual(reopened.segment, segment_numbers(self.path)[-1])
+        self.assertGreater(reopened.remove_segments_before(reopened.rotate()), 0)
+        self.assertEqual(list(read_journal(self.path)), [])
+        reopened.close()
+
+    def test_torn_tail_is_skipped(self):
+        """Test that a record cut short by a crash is ignored while damage before the end is reported."""
+        with Journal(self.path) as journal:
+            for price in (100, 110, 120):
+                journal.append("POP", to_epoch_ns(self.clock.now()), 10, 1, price)
+        path = segment_path(self.path, 0)
+        with open(path, "rb") as segment:
+            data = segment.read()
+
+        with open(path, "wb") as segment:
+            segment.write(data[:-3])
+        self.assertEqual([prices[0] for _, _, _, _, prices in read_journal(self.path)], [100, 110])
+
+        damaged = bytearray(data)
+        damaged[12] ^= 0xFF
+        with open(path, "wb") as segment:
+            segment.write(damaged)
+        with self.assertRaises(ValueError):
+            list(read_journal(self.path))
+
+    def test_replay_without_journal(self):
+        """Test that replaying a journal that was never written is a no-op."""
+        self.assertEqual(replay_journal(self.path, self.exchange()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
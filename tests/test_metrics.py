@@ -0,0 +1,127 @@
+import unittest
+from datetime import datetime, timedelta
+
+from jpmorgan.clock import ManualClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.metrics import METRICS, Histogram, Metrics
+from jpmorgan.retention import RetentionPolicy
+from jpmorgan.stock import Stock
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an exchange on a manual clock and start collecting metrics."""
+        self.clock = ManualClock(datetime(2024, 7, 9, 9, 0))
+        self.gbce = GBCE(self.clock)
+        self.pop = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        self.tea = Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100)
+        self.gbce.add_stock(self.pop)
+        self.gbce.add_stock(self.tea)
+        METRICS.reset()
+        METRICS.enable()
+
+    def tearDown(self):
+        METRICS.disable()
+        METRICS.reset()
+
+    def test_disabled_registry_collects_nothing(self):
+        """Test that nothing is recorded while the registry is disabled."""
+        METRICS.disable()
+        self.pop.record_trade(100, 'buy', 110)
+        self.gbce.calculate_all_share_index()
+        self.assertEqual(METRICS.snapshot(), {"counters": {}, "gauges": {}, "histograms": {}})
+
+    def test_trades_are_counted_per_symbol(self):
+        """Test the trade counters, window gauges and latency histograms of the write path."""
+        self.pop.record_trade(100, 'buy', 110)
+        self.pop.record_trade(200, 'sell', 120)
+        self.gbce.record_trades([(None, "TEA", 10, 'buy', 90), (None, "TEA", 0, 'buy', 90)])
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["counters"]["gbce_trades_recorded_total"], {"POP": 2, "TEA": 1})
+        self.assertEqual(snapshot["gauges"]["gbce_window_trades"], {"POP": 2, "TEA": 1})
+        self.assertEqual(snapshot["histograms"]["gbce_record_trade_seconds"]["POP"]["count"], 2)
+        self.assertEqual(snapshot["histograms"]["gbce_record_trades_seconds"]["TEA"]["count"], 1)
+
+        self.clock.advance(timedelta(minutes=6))
+        self.pop.calculate_volume_weighted_stock_price()
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["counters"]["gbce_trades_expired_total"], {"POP": 2})
+        self.assertEqual(snapshot["gauges"]["gbce_window_trades"]["POP"], 0)
+        self.assertEqual(snapshot["histograms"]["gbce_vwsp_seconds"]["POP"]["count"], 1)
+
+    def test_retired_trades_are_counted(self):
+        """Test that evictions by a retention policy are counted."""
+        stock = Stock(symbol="GIN", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=self.clock, retention=RetentionPolicy(max_count=10))
+        for _ in range(100):
+            stock.record_trade(10, 'buy', 100)
+            self.clock.advance(timedelta(minutes=1))
+        self.assertEqual(METRICS.snapshot()["counters"]["gbce_trades_retired_total"]["GIN"], stock.history.count)
+
+    def test_index_and_cache_metrics(self):
+        """Test the index latency and the price cache hit and miss counters."""
+        self.pop.record_trade(100, 'buy', 110)
+        self.gbce.calculate_all_share_index()
+        self.gbce.calculate_all_share_index()
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["histograms"]["gbce_index_seconds"][None]["count"], 2)
+        self.assertEqual(snapshot["counters"]["gbce_price_cache_misses_total"], {"POP": 1, "TEA": 1})
+        self.assertEqual(snapshot["counters"]["gbce_price_cache_hits_total"], {"POP": 1, "TEA": 1})
+
+    def test_slow_call_hook(self):
+        """Test that hooks only fire for calls over their threshold and for their histogram."""
+        calls = []
+        metrics = Metrics(enabled=True)
+        metrics.add_slow_call_hook(timedelta(milliseconds=1), lambda *call: calls.append(call), "slow_seconds")
+        metrics.observe("slow_seconds", 500_000, "POP")
+        metrics.observe("slow_seconds", 2_000_000, "POP")
+        metrics.observe("other_seconds", 5_000_000)
+        self.assertEqual(calls, [("slow_seconds", "POP", 2_000_000)])
+
+        def failing(*call):
+            raise RuntimeError("boom")
+        metrics.add_slow_call_hook(0, failing)
+        metrics.add_slow_call_hook(0, lambda *call: calls.append(call))
+        with self.assertLogs("jpmorgan.metrics", "ERROR"):
+            metrics.observe("other_seconds", 5_000_000)
+        self.assertEqual(calls[1:], [("other_seconds", None, 5_000_000)])
+        metrics.remove_slow_call_hook(failing)
+
+        hook = lambda *call: calls.append(call)
+        METRICS.add_slow_call_hook(0, hook, "gbce_index_seconds")
+        try:
+            self.gbce.calculate_all_share_index()
+        finally:
+            METRICS.remove_slow_call_hook(hook)
+        self.assertEqual(calls[-1][:2], ("gbce_index_seconds", None))
+
+    def test_histogram_quantiles(self):
+        """Test that quantiles are estimated by the upper bound of their bucket."""
+        histogram = Histogram()
+        self.assertEqual(histogram.quantile(0.5), 0)
+        for elapsed_ns in [900] * 98 + [3000, 10**12]:
+            histogram.observe(elapsed_ns)
+        self.assertEqual(histogram.quantile(0.5), 1000)
+        self.assertEqual(histogram.quantile(0.99), 4000)
+        self.assertEqual(histogram.quantile(1), float("inf"))
+
+    def test_prometheus_text(self):
+        """Test the Prometheus text exposition of counters, gauges and histograms."""
+        metrics = Metrics(enabled=True)
+        metrics.increment("trades_total", 3, 'P"OP')
+        metrics.set_gauge("window_trades", 2, "POP")
+        metrics.observe("index_seconds", 1500)
+        lines = metrics.prometheus().splitlines()
+        self.assertIn("# TYPE trades_total counter", lines)
+        self.assertIn('trades_total{symbol="P\\"OP"} 3', lines)
+        self.assertIn('window_trades{symbol="POP"} 2', lines)
+        self.assertIn("# TYPE index_seconds histogram", lines)
+        self.assertIn('index_seconds_bucket{le="1e-06"} 0', lines)
+        self.assertIn('index_seconds_bucket{le="2e-06"} 1', lines)
+        self.assertIn('index_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn("index_seconds_sum 1.5e-06", lines)
+        self.assertIn("index_seconds_count 1", lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from jpmorgan.clock import EventTimeClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.replay import MalformedRow, read_binary, read_csv, replay, write_binary
+from jpmorgan.stock import Stock
+from jpmorgan.trade import to_epoch_ns
+
+MINUTE = 60 * 10**9
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a small tape and an exchange to replay it into."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.start = to_epoch_ns(datetime(2024, 7, 9, 9, 0))
+        self.rows = [
+            (self.start, "POP", 100, "buy", 100.0),
+            (self.start + 1 * MINUTE, "TEA", 100, "sell", 400.0),
+            (self.start + 2 * MINUTE, "GIN", 100, "buy", 130.0),
+            (self.start + 7 * MINUTE, "TEA", 100, "buy", 100.0),
+        ]
+        self.gbce = GBCE(clock=EventTimeClock())
+        self.gbce.add_stock(Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100))
+        self.gbce.add_stock(Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_read_csv_in_chunks(self):
+        """Test that a CSV tape is read in bounded chunks with parsed fields."""
+        with open(self.path("tape.csv"), "w") as tape:
+            tape.write("timestamp,symbol,quantity,indicator,price\n")
+            tape.write(f"{self.start},POP,100,buy,100.5\n")
+            tape.write("2024-07-09T09:01:00,TEA,100,sell,400\n")
+            tape.write("2024-07-09T09:02:00,TEA,many,sell,400\n")
+        chunks = list(read_csv(self.path("tape.csv"), chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(chunks[0][0], (self.start, "POP", 100, "buy", 100.5))
+        self.assertEqual(chunks[0][1][0], self.start + MINUTE)
+        self.assertEqual(chunks[1][0][2], "many")
+
+    def test_malformed_csv_rows_are_rejected(self):
+        """Test that rows with a bad timestamp or the wrong number of fields are rejected, not fatal."""
+        with open(self.path("tape.csv"), "w") as tape:
+            tape.write("timestamp,symbol,quantity,indicator,price\n")
+            tape.write(f"{self.start},POP,100,buy,100\n")
+            tape.write("yesterday,POP,100,buy,500\n")
+            tape.write(f"{self.start + MINUTE},TEA,100\n")
+            tape.write(f"{self.start + MINUTE},TEA,100,sell,400,extra\n")
+            tape.write("\n")
+            tape.write(f"{self.start + 2 * MINUTE},TEA,100,sell,400\n")
+        rows = [row for chunk in read_csv(self.path("tape.csv")) for row in chunk]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1][0], "yesterday")
+        self.assertEqual(rows[2:4], [MalformedRow(4, "expected 5 fields, got 3"), MalformedRow(5, "expected 5 fields, got 6")])
+
+        snapshots = list(replay(self.gbce, read_csv(self.path("tape.csv"), chunk_size=2), timedelta(minutes=1)))
+        self.assertEqual(snapshots[-1].trades, 5)
+        self.assertEqual(snapshots[-1].rejected, 3)
+        self.assertAlmostEqual(snapshots[-1].all_share_index, 200.0)
+
+    def test_read_csv_rejects_unknown_header(self):
+        """Test that a CSV tape without the expected header is refused."""
+        with open(self.path("tape.csv"), "w") as tape:
+            tape.write("symbol,price\n")
+        with self.assertRaises(ValueError):
+            list(read_csv(self.path("tape.csv")))
+
+    def test_binary_round_trip(self):
+        """Test that a binary tape reads back the rows it was written from."""
+        write_binary(self.path("tape.bin"), self.rows)
+        chunks = list(read_binary(self.path("tape.bin"), chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 1])
+        self.assertEqual([row for chunk in chunks for row in chunk], self.rows)
+
+    def test_replay_snapshots(self):
+        """Test that replaying a tape yields deterministic snapshots at each interval."""
+        write_binary(self.path("tape.bin"), self.rows)
+        snapshots = list(replay(self.gbce, read_binary(self.path("tape.bin"), chunk_size=2), timedelta(minutes=3)))
+
+        self.assertEqual([snapshot.timestamp_ns for snapshot in snapshots], [
+            self.start + 3 * MINUTE,
+            self.start + 6 * MINUTE,
+            self.start + 7 * MINUTE,
+        ])
+        self.assertAlmostEqual(snapshots[0].all_share_index, 200.0)
+        self.assertEqual(snapshots[0].trades, 3)
+        self.assertEqual(snapshots[0].rejected, 1)
+        self.assertAlmostEqual(snapshots[1].prices["POP"], 0)
+        self.assertAlmostEqual(snapshots[1].all_share_index, 400.0)
+        self.assertAlmostEqual(snapshots[2].prices["TEA"], 100.0)
+        self.assertEqual(snapshots[2].trades, 4)
+
+    def test_replay_requires_clock(self):
+        """Test that replay refuses an exchange without a clock."""
+        with self.assertRaises(ValueError):
+            list(replay(GBCE(), [self.rows], timedelta(minutes=1)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from jpmorgan.clock import ManualClock
+from jpmorgan.retention import RetentionPolicy, read_segment
+from jpmorgan.stock import Stock
+from jpmorgan.trade import BUY, SELL
+
+class TestRetention(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a stock on a manual clock."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = ManualClock(datetime(2024, 7, 9, 9, 0))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def stock(self, retention):
+        return Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=self.clock, retention=retention)
+
+    def test_policy_requires_a_bound(self):
+        """Test that a retention policy without any bound is refused."""
+        with self.assertRaises(ValueError):
+            RetentionPolicy()
+
+    def test_max_count_bounds_memory(self):
+        """Test that a count policy keeps the in-memory history bounded under steady load."""
+        stock = self.stock(RetentionPolicy(max_count=100))
+        for i in range(5000):
+            stock.record_trade(10, 'buy', 100 + i % 7)
+            self.clock.advance(timedelta(seconds=10))
+        self.assertLessEqual(len(stock.trades), 100 + 15)
+        self.assertEqual(stock.history.count + len(stock.trades), 5000)
+        self.assertEqual(stock.history.quantity, 10 * stock.history.count)
+        self.assertEqual(stock.history.high, 106)
+        self.assertEqual(stock.history.low, 100)
+
+    def test_window_trades_are_never_evicted(self):
+        """Test that trades inside the 5 minute window survive a tight retention policy."""
+        stock = self.stock(RetentionPolicy(max_count=1))
+        stock.record_trade(100, 'buy', 110)
+        stock.record_trade(200, 'sell', 120)
+        self.assertEqual(stock.compact(), 0)
+        self.assertEqual(len(stock.trades), 2)
+        self.assertAlmostEqual(stock.calculate_volume_weighted_stock_price(), (100*110 + 200*120) / (100 + 200))
+
+    def test_max_age_with_spill(self):
+        """Test that old trades are spilled to a segment file and can be read back."""
+        policy = RetentionPolicy(max_age=timedelta(minutes=10), spill_directory=self.directory.name)
+        stock = self.stock(policy)
+        first = self.clock.now_ns()
+        stock.record_trade(100, 'buy', 110)
+        stock.record_trade(50, 'sell', 115)
+        self.clock.advance(timedelta(minutes=15))
+        stock.record_trade(200, 'buy', 120)
+        self.assertEqual(stock.compact(), 0)
+
+        self.assertEqual(len(stock.trades), 1)
+        self.assertEqual(stock.history.count, 2)
+        self.assertAlmostEqual(stock.history.volume_weighted_price(), (100*110 + 50*115) / 150)
+        self.assertEqual(stock.history.first_timestamp_ns, first)
+        self.assertEqual(
+            list(read_segment(policy.segment_path("POP"))),
+            [(first, 100, BUY, 110.0), (first, 50, SELL, 115.0)],
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, "POP.seg")))
+        self.assertAlmostEqual(stock.calculate_volume_weighted_stock_price(), 120)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import unittest
+from unittest.mock import Mock, patch
+from jpmorgan.gbce import GBCE
+from jpmorgan.service import GBCEService, _Subscriber
+from jpmorgan.stock import Stock
+
+class TestGBCEService(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        """Start a service on a free local port."""
+        self.gbce = GBCE()
+        self.gbce.add_stock(Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100))
+        self.gbce.add_stock(Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100))
+        self.service = GBCEService(self.gbce, batch_size=2, batch_interval=0.01, publish_interval=0.02)
+        server = await self.service.start_tcp()
+        self.port = server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        await self.service.close()
+
+    async def connect(self):
+        return await asyncio.open_connection("127.0.0.1", self.port)
+
+    async def read_until(self, reader, prefix):
+        while True:
+            line = (await asyncio.wait_for(reader.readline(), 2)).decode()
+            if line.startswith(prefix):
+                return line.split()
+
+    async def test_trades_and_index(self):
+        """Test that trades sent over the socket are applied and reflected in the index."""
+        reader, writer = await self.connect()
+        writer.write(b"TRADE POP buy 100 100\nTRADE TEA sell 100 400\n")
+        writer.write(b"TRADE ALE buy 100 100\nTRADE POP hold 1 1\nTRADE POP\n")
+        await writer.drain()
+
+        self.assertEqual(await self.read_until(reader, "ERR"), ["ERR", "usage:", "TRADE", "<symbol>", "<buy|sell>", "<quantity>", "<price>", "[<timestamp_ns>]"])
+        self.assertEqual(await self.read_until(reader, "REJECT"), ["REJECT", "ALE", "unknown", "symbol", "'ALE'"])
+        self.assertEqual((await self.read_until(reader, "REJECT"))[1], "POP")
+
+        writer.write(b"INDEX\n")
+        await writer.drain()
+        self.assertAlmostEqual(float((await self.read_until(reader, "INDEX"))[1]), 200.0)
+        writer.close()
+
+    async def test_out_of_range_values_are_refused(self):
+        """Test that quantities and timestamps that do not fit in 64 bits are answered with ERR."""
+        reader, writer = await self.connect()
+        writer.write(b"TRADE POP buy 10 100 99999999999999999999999\n")
+        await writer.drain()
+        self.assertEqual((await self.read_until(reader, "ERR"))[1], "timestamp")
+        writer.write(b"TRADE POP buy 99999999999999999999999 100\n")
+        await writer.drain()
+        self.assertEqual((await self.read_until(reader, "ERR"))[1], "quantity")
+
+        writer.write(b"TRADE POP buy 100 100\nTRADE TEA buy 100 400\n")
+        await writer.drain()
+        while self.gbce.calculate_all_share_index() == 0:
+            await asyncio.sleep(0.01)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 200.0)
+        writer.close()
+
+    async def test_failing_batch_does_not_stop_ingest(self):
+        """Test that a batch that raises is logged and later batches are still applied."""
+        reader, writer = await self.connect()
+        with patch.object(self.gbce, "record_trades", side_effect=RuntimeError("boom")) as record_trades:
+            with self.assertLogs("jpmorgan.service", "ERROR"):
+                writer.write(b"TRADE POP buy 100 50\nTRADE TEA buy 100 50\n")
+                await writer.drain()
+                while not record_trades.called:
+                    await asyncio.sleep(0.01)
+
+        writer.write(b"TRADE POP buy 100 100\nTRADE TEA buy 100 400\n")
+        await writer.drain()
+        while self.gbce.calculate_all_share_index() == 0:
+            await asyncio.sleep(0.01)
+        self.assertAlmostEqual(self.gbce.calculate_all_share_index(), 200.0)
+        writer.close()
+
+    async def test_subscribers_receive_changes(self):
+        """Test that subscribers get the full state and then only the values that changed."""
+        sub_reader, sub_writer = await self.connect()
+        sub_writer.write(b"SUBSCRIBE\n")
+        await sub_writer.drain()
+
+        reader, writer = await self.connect()
+        writer.write(b"TRADE POP buy 100 100\n")
+        await writer.drain()
+        self.assertEqual(await self.read_until(sub_reader, "VWSP POP 100"), ["VWSP", "POP", "100.0"])
+
+        writer.write(b"TRADE TEA buy 100 400\n")
+        await writer.drain()
+        self.assertEqual(await self.read_until(sub_reader, "VWSP TEA 400"), ["VWSP", "TEA", "400.0"])
+        writer.write(b"INDEX\n")
+        await writer.drain()
+        self.assertAlmostEqual(float((await self.read_until(reader, "INDEX"))[1]), 200.0)
+        writer.close()
+        sub_writer.close()
+
+    async def test_stale_subscriber_catches_up_without_changes(self):
+        """Test that a subscriber that fell behind gets the full state once its buffer drains, even if nothing moved."""
+        writer = Mock()
+        writer.is_closing.return_value = False
+        writer.transport.get_write_buffer_size.return_value = self.service.subscriber_buffer_limit + 1
+        subscriber = _Subscriber(writer)
+        subscriber.stale = False
+        self.service._subscribers.add(subscriber)
+
+        self.service._publish(200.0, {"POP": 100.0, "TEA": 400.0})
+        self.assertTrue(subscriber.stale)
+        writer.write.assert_not_called()
+
+        writer.transport.get_write_buffer_size.return_value = 0
+        self.service._publish(200.0, {"POP": 100.0, "TEA": 400.0})
+        self.assertFalse(subscriber.stale)
+        writer.write.assert_called_once_with(b"INDEX 200.0\nVWSP POP 100.0\nVWSP TEA 400.0\n")
+        self.service._publish(200.0, {"POP": 100.0, "TEA": 400.0})
+        writer.write.assert_called_once()
+        self.service._subscribers.discard(subscriber)
+
+    async def test_backpressure(self):
+        """Test that trades beyond max_pending wait for the next batch instead of being dropped."""
+        self.service.max_pending = 2
+        self.service.batch_size = 1000
+        reader, writer = await self.connect()
+        writer.write(b"TRADE POP buy 10 100\n" * 50)
+        writer.write(b"INDEX\n")
+        await writer.drain()
+        await self.read_until(reader, "INDEX")
+        self.assertEqual(len(self.gbce.get("POP").trades), 50)
+        writer.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from array import array
+from datetime import datetime, timedelta
+from jpmorgan.clock import EventTimeClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.sharding import ShardedGBCE, TradeColumns, shard_of
+from jpmorgan.stock import Stock
+from jpmorgan.trade import RejectedTrade, to_epoch_ns
+
+class TestShardedGBCE(unittest.TestCase):
+
+    def setUp(self):
+        """Start a sharded exchange and a single-process one to compare it with."""
+        self.sharded = ShardedGBCE(workers=3, event_time=True)
+        self.reference = GBCE(clock=EventTimeClock())
+        for i in range(12):
+            for gbce in (self.sharded, self.reference):
+                gbce.add_stock(Stock(symbol=f"S{i:02d}", type="Common", last_dividend=1, fixed_dividend=0, par_value=100))
+
+    def tearDown(self):
+        self.sharded.close()
+
+    def test_shard_assignment_is_stable(self):
+        """Test that symbols always map to the same shard."""
+        self.assertEqual(shard_of("POP", 4), shard_of("POP", 4))
+        self.assertIn(shard_of("POP", 4), range(4))
+
+    def test_duplicate_symbol(self):
+        """Test that a symbol cannot be listed twice."""
+        with self.assertRaises(ValueError):
+            self.sharded.add_stock(Stock(symbol="S00", type="Common", last_dividend=1, fixed_dividend=0, par_value=100))
+
+    def test_index_matches_single_process(self):
+        """Test that the sharded index equals the index of a single exchange fed the same trades."""
+        start = datetime(2024, 7, 9, 9, 0)
+        trades = [
+            (start + timedelta(seconds=i), f"S{i % 12:02d}", 10 + i, "buy" if i % 2 else "sell", 100.0 + i % 17)
+            for i in range(600)
+        ]
+        trades.append((start, "XXX", 10, "buy", 100.0))
+        self.assertEqual(self.sharded.record_trades(trades), [RejectedTrade(600, "unknown symbol 'XXX'")])
+        self.reference.record_trades(trades)
+
+        self.assertAlmostEqual(self.sharded.calculate_all_share_index(), self.reference.calculate_all_share_index())
+        self.assertAlmostEqual(
+            self.sharded.calculate_volume_weighted_stock_price("S05"),
+            self.reference.calculate_volume_weighted_stock_price(self.reference.get("S05")),
+        )
+
+    def test_partitioned_columns_match_single_process(self):
+        """Test that trades recorded as per-shard columns give the same index as a single exchange."""
+        start = to_epoch_ns(datetime(2024, 7, 9, 9, 0))
+        trades = [
+            (start + i * 10**9, f"S{i % 12:02d}", 10 + i, "buy" if i % 2 else "sell", 100.0 + i % 17)
+            for i in range(600)
+        ]
+        self.reference.record_trades(trades)
+        shards = [[] for _ in range(3)]
+        for trade in trades:
+            shards[shard_of(trade[1], 3)].append(trade)
+        # A trade sent to a shard that does not own its symbol is rejected there.
+        stray = next(shard for shard in range(3) if shard != shard_of("S00", 3))
+        shards[stray].append((start, "S00", 10, "buy", 100.0))
+        batches = [
+            TradeColumns(
+                [trade[1] for trade in rows],
+                array("q", [trade[2] for trade in rows]),
+                [trade[3] for trade in rows],
+                array("d", [trade[4] for trade in rows]),
+                array("q", [trade[0] for trade in rows]),
+            )
+            for rows in shards
+        ]
+        rejected = self.sharded.record_partitioned(batches)
+        self.assertEqual(rejected[stray], [RejectedTrade(len(shards[stray]) - 1, "unknown symbol 'S00'")])
+        self.assertEqual(sum(map(len, rejected)), 1)
+
+        self.assertAlmostEqual(self.sharded.calculate_all_share_index(), self.reference.calculate_all_share_index())
+        with self.assertRaises(ValueError):
+            self.sharded.record_partitioned(batches[:2])
+
+    def test_malformed_rows_are_rejected(self):
+        """Test that rows the workers could not unpack, or with unusable timestamps, are rejected up front."""
+        start = datetime(2024, 7, 9, 9, 0)
+        rejected = self.sharded.record_trades([
+            (None, "S00", 10, "buy"),
+            ("yesterday", "S01", 10, "buy", 100.0),
+            (2**63, "S02", 10, "buy", 100.0),
+            (start, "S03", 10, "buy", 100.0),
+        ])
+        self.assertEqual(rejected, [
+            RejectedTrade(0, "expected 5 fields, got 4"),
+            RejectedTrade(1, "timestamp must be a datetime object or epoch nanoseconds"),
+            RejectedTrade(2, "timestamp must be within 64 bit epoch nanoseconds (years 1677 to 2262)"),
+        ])
+        self.assertEqual(self.sharded.calculate_volume_weighted_stock_price("S03"), 100.0)
+
+    def test_worker_errors_are_raised_and_the_worker_survives(self):
+        """Test that an exception in a worker is raised by the coordinator and the shard keeps its trades."""
+        self.sharded.record_trades([(datetime(2024, 7, 9, 9, 0), "S00", 10, "buy", 100.0)])
+        shard = shard_of("S00", 3)
+        batches = [None] * 3
+        batches[shard] = TradeColumns(["S00"], array("q", [10]), ["buy"], None)
+        with self.assertRaises(TypeError):
+            self.sharded.record_partitioned(batches)
+        self.assertEqual(self.sharded.calculate_volume_weighted_stock_price("S00"), 100.0)
+        self.assertAlmostEqual(self.sharded.calculate_all_share_index(), 100.0)
+
+    def test_empty_index(self):
+        """Test that an exchange without trades has a zero index."""
+        self.assertEqual(self.sharded.calculate_all_share_index(), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
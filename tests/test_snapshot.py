@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from jpmorgan.clock import EventTimeClock, ManualClock
+from jpmorgan.gbce import GBCE
+from jpmorgan.retention import RetentionPolicy
+from jpmorgan.snapshot import SnapshotWriter, read_stock, restore, stock_path, write_stock
+from jpmorgan.stock import Stock
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an exchange on a manual clock with a few traded stocks."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = ManualClock(datetime(2024, 7, 9, 9, 0))
+        self.gbce = GBCE(self.clock)
+        self.gbce.add_stock(Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100))
+        self.gbce.add_stock(Stock(symbol="GIN", type="Preferred", last_dividend=8, fixed_dividend=0.02, par_value=100))
+        self.gbce.add_stock(Stock(symbol="TEA", type="Common", last_dividend=0, fixed_dividend=0, par_value=100))
+        for i in range(600):
+            self.gbce.get("POP").record_trade(10 + i % 3, 'buy', 100 + i % 7)
+            self.gbce.get("GIN").record_trade(5, 'sell' if i % 2 else 'buy', 50 + i % 5)
+            self.clock.advance(timedelta(seconds=1))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_same_state(self, restored: GBCE):
+        self.assertEqual([stock.symbol for stock in restored.stocks], ["POP", "GIN", "TEA"])
+        self.assertAlmostEqual(restored.calculate_all_share_index(), self.gbce.calculate_all_share_index())
+        for stock in self.gbce.stocks:
+            copy = restored.get(stock.symbol)
+            self.assertEqual(copy.type, stock.type)
+            self.assertEqual(copy.dividend, stock.dividend)
+            self.assertEqual(copy.version, stock.version)
+            self.assertEqual(copy.trades.timestamps, stock.trades.timestamps)
+            self.assertEqual(copy.trades.prices, stock.trades.prices)
+            self.assertEqual(
+                copy.calculate_volume_weighted_stock_price(), stock.calculate_volume_weighted_stock_price()
+            )
+            self.assertEqual(copy.summarize_window(timedelta(minutes=7)), stock.summarize_window(timedelta(minutes=7)))
+            self.assertEqual(copy.calculate_order_flow(), stock.calculate_order_flow())
+
+    def test_restore_round_trip(self):
+        """Test that a restored exchange serves the same prices, index and history as the original."""
+        SnapshotWriter(self.directory.name).write(self.gbce)
+        restored = restore(self.directory.name, self.clock)
+        self.assert_same_state(restored)
+
+        # The restored stocks keep trading and sliding their windows like the originals.
+        for gbce in (self.gbce, restored):
+            gbce.get("TEA").record_trade(100, 'buy', 120)
+        self.clock.advance(timedelta(minutes=2))
+        self.assert_same_state(restored)
+
+    def test_restore_moves_event_time_clock(self):
+        """Test that an event-time clock resumes at the time of the snapshot."""
+        SnapshotWriter(self.directory.name).write(self.gbce)
+        clock = EventTimeClock()
+        restored = restore(self.directory.name, clock)
+        self.assertEqual(clock.now_ns(), self.clock.now_ns())
+        self.assertAlmostEqual(restored.calculate_all_share_index(), self.gbce.calculate_all_share_index())
+
+    def test_retention_history_is_kept(self):
+        """Test that the summary of evicted trades survives a restore."""
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=self.clock, retention=RetentionPolicy(max_count=50))
+        for i in range(1000):
+            stock.record_trade(10, 'buy', 100 + i % 7)
+            self.clock.advance(timedelta(seconds=10))
+        path = os.path.join(self.directory.name, "POP.stock")
+        write_stock(path, stock.export_state())
+        copy = Stock.from_state(read_stock(path), self.clock)
+        self.assertGreater(copy.history.count, 0)
+        self.assertEqual(copy.history.count, stock.history.count)
+        self.assertEqual(copy.history.volume_weighted_price(), stock.history.volume_weighted_price())
+        self.assertEqual(len(copy.trades), len(stock.trades))
+
+    def test_only_needed_trades_are_written(self):
+        """Test that trades older than the window and the bucket retention are left out of a stock file."""
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=self.clock, bucket_retention=timedelta(minutes=10))
+        for i in range(360):
+            stock.record_trade(10 + i % 3, 'buy' if i % 2 else 'sell', 100 + i % 7)
+            self.clock.advance(timedelta(seconds=10))
+        state = stock.export_state()
+        self.assertEqual(len(state.timestamps), 60)
+        self.assertEqual(state.window_start, 60 - 30)
+
+        path = os.path.join(self.directory.name, "POP.stock")
+        write_stock(path, state)
+        copy = Stock.from_state(read_stock(path), self.clock)
+        self.assertEqual(copy.calculate_volume_weighted_stock_price(), stock.calculate_volume_weighted_stock_price())
+        self.assertEqual(copy.calculate_order_flow(), stock.calculate_order_flow())
+        self.assertEqual(copy.summarize_window(timedelta(minutes=10)), stock.summarize_window(timedelta(minutes=10)))
+        self.clock.advance(timedelta(minutes=3))
+        for restored in (copy, stock):
+            restored.record_trade(100, 'buy', 120)
+        self.assertEqual(copy.calculate_volume_weighted_stock_price(), stock.calculate_volume_weighted_stock_price())
+
+    def test_snapshots_are_incremental(self):
+        """Test that only stocks that changed since the last snapshot are rewritten."""
+        writer = SnapshotWriter(self.directory.name)
+        self.assertEqual(writer.write(self.gbce), 3)
+        self.assertEqual(writer.write(self.gbce), 0)
+
+        self.gbce.get("TEA").record_trade(100, 'buy', 120)
+        self.assertEqual(writer.write(self.gbce), 1)
+        self.gbce.get("GIN").par_value = 200
+        self.assertEqual(writer.write(self.gbce), 1)
+
+        self.gbce.remove_stock("POP")
+        self.assertEqual(writer.write(self.gbce), 0)
+        self.assertFalse(os.path.exists(stock_path(self.directory.name, "POP")))
+        restored = restore(self.directory.name, self.clock)
+        self.assertEqual([stock.symbol for stock in restored.stocks], ["GIN", "TEA"])
+        self.assertEqual(restored.get("GIN").dividend, 4)
+
+    def test_corrupt_snapshot_is_refused(self):
+        """Test that damaged and foreign files are detected rather than restored."""
+        SnapshotWriter(self.directory.name).write(self.gbce)
+        path = stock_path(self.directory.name, "POP")
+        with open(path, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            last = file.read(1)
+            file.seek(-1, os.SEEK_END)
+            file.write(bytes([last[0] ^ 0xFF]))
+        with self.assertRaises(ValueError):
+            restore(self.directory.name, self.clock)
+
+        with open(path, "wb") as file:
+            file.write(b"not a snapshot at all")
+        with self.assertRaises(ValueError):
+            read_stock(path)
+
+    def test_missing_snapshot(self):
+        """Test that restoring from an empty directory fails clearly."""
+        with self.assertRaises(FileNotFoundError):
+            restore(self.directory.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,10 @@ from datetime import datetime, timedelta
 
 from index import GBCE
 from index import GBCE
-from jpmorgan.stock import Stock
-from jpmorgan.trade import Trade
+from jpmorgan.clock import ManualClock
+from jpmorgan.stock import Stock, VolumeWeightedWindow
+from jpmorgan.trade import BUY, SELL, RejectedTrade, Trade, to_epoch_ns
+from jpmorgan.trade_store import TradeStore
 
 
 class TestStock(unittest.TestCase):
@@ -34,6 +36,14 @@ class TestStock(unittest.TestCase):
         expected_pe_ratio = 50  # 100 / (0.02 * 100)
         self.assertAlmostEqual(self.preferred_stock.calculate_pe_ratio(price), expected_pe_ratio)
 
+    def test_dividend_tracks_field_changes(self):
+        self.assertEqual(self.preferred_stock.dividend, 2)
+        self.preferred_stock.par_value = 200
+        self.assertEqual(self.preferred_stock.dividend, 4)
+        self.preferred_stock.type = "Common"
+        self.assertEqual(self.preferred_stock.dividend, 8)
+        self.assertAlmostEqual(self.preferred_stock.calculate_pe_ratio(100), 12.5)
+
     def test_record_trade(self):
         quantity = 100
         indicator = 'buy'
@@ -75,5 +85,204 @@ class TestStock(unittest.TestCase):
         expected_index = (vwsp1 * vwsp2 * vwsp3) ** (1/3)
         self.assertAlmostEqual(self.gbce.calculate_all_share_index(), expected_index)
 
+    def test_calculate_volume_weighted_stock_price_no_trades(self):
+        self.assertEqual(self.common_stock.calculate_volume_weighted_stock_price(), 0)
+
+    def test_calculate_volume_weighted_stock_price_with_recorded_trades(self):
+        self.common_stock.record_trade(100, 'buy', 110)
+        self.common_stock.record_trade(200, 'sell', 120)
+        expected_vwsp = (100*110 + 200*120) / (100 + 200)
+        self.assertAlmostEqual(self.common_stock.calculate_volume_weighted_stock_price(), expected_vwsp)
+
+    def test_version_changes_on_trade(self):
+        version = self.common_stock.version
+        self.common_stock.record_trade(100, 'buy', 110)
+        self.assertGreater(self.common_stock.version, version)
+        version = self.common_stock.version
+        self.assertEqual(self.common_stock.version, version)
+
+    def test_symbol_is_read_only(self):
+        self.assertEqual(self.common_stock.symbol, "POP")
+        with self.assertRaises(AttributeError):
+            self.common_stock.symbol = "TEA"
+
+    def test_record_trade_invalid_inputs(self):
+        with self.assertRaises(ValueError):
+            self.common_stock.record_trade(0, 'buy', 110)
+        with self.assertRaises(ValueError):
+            self.common_stock.record_trade(100, 'hold', 110)
+        with self.assertRaises(ValueError):
+            self.common_stock.record_trade(100, 'buy', -1)
+        self.assertEqual(len(self.common_stock.trades), 0)
+
+    def test_record_trades(self):
+        now = datetime.now()
+        rejected = self.common_stock.record_trades([
+            (now - timedelta(minutes=4), 100, 'buy', 110),
+            (to_epoch_ns(now - timedelta(minutes=3)), 200, 'sell', 120),
+            (None, 0, 'buy', 120),
+            (now - timedelta(minutes=6), 150, 'buy', 130),
+            (now, 10, 'hold', 120),
+            ("yesterday", 10, 'buy', 120),
+        ])
+        self.assertEqual(rejected, [
+            RejectedTrade(2, "quantity must be a positive integer"),
+            RejectedTrade(4, "indicator must be 'buy' or 'sell'"),
+            RejectedTrade(5, "timestamp must be a datetime object or epoch nanoseconds"),
+        ])
+        self.assertEqual(len(self.common_stock.trades), 3)
+        self.assertEqual(self.common_stock.trades[0].price, 130)
+        expected_vwsp = (100*110 + 200*120) / (100 + 200)
+        self.assertAlmostEqual(self.common_stock.calculate_volume_weighted_stock_price(), expected_vwsp)
+
+    def test_record_trades_rejects_values_out_of_int64_range(self):
+        rejected = self.common_stock.record_trades([
+            (None, 10, 'buy', 100.0),
+            (None, 2**63, 'buy', 1.0),
+            (2**63, 10, 'buy', 1.0),
+            (datetime(2300, 1, 1), 10, 'buy', 1.0),
+        ])
+        self.assertEqual(rejected, [
+            RejectedTrade(1, "quantity must be at most 2**63 - 1"),
+            RejectedTrade(2, "timestamp must be within 64 bit epoch nanoseconds (years 1677 to 2262)"),
+            RejectedTrade(3, "timestamp must be within 64 bit epoch nanoseconds (years 1677 to 2262)"),
+        ])
+        self.assertEqual(len(self.common_stock.trades), 1)
+        with self.assertRaises(ValueError):
+            self.common_stock.record_trade(2**63, 'buy', 1.0)
+        with self.assertRaises(ValueError):
+            self.common_stock.record_trade(10, 'buy', 1.0, -2**63 - 1)
+        self.assertEqual(len(self.common_stock.trades), 1)
+
+    def test_non_finite_prices_are_rejected(self):
+        clock = ManualClock(datetime(2024, 7, 9, 10, 0))
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100, clock=clock)
+        with self.assertRaises(ValueError):
+            stock.record_trade(100, 'buy', float("inf"))
+        self.assertEqual(stock.record_trades([(None, 100, 'buy', float("nan"))]), [
+            RejectedTrade(0, "price must be a positive finite number"),
+        ])
+        clock.advance(timedelta(minutes=1))
+        stock.record_trade(100, 'buy', 100.0)
+        clock.advance(timedelta(minutes=4.5))
+        self.assertEqual(stock.calculate_volume_weighted_stock_price(), 100.0)
+
+    def test_record_trades_appends_after_recorded_trades(self):
+        self.common_stock.record_trade(100, 'buy', 110)
+        self.assertEqual(self.common_stock.record_trades([(None, 200, 'sell', 120), (None, 100, 'buy', 100)]), [])
+        self.assertEqual(len(self.common_stock.trades), 3)
+        expected_vwsp = (100*110 + 200*120 + 100*100) / (100 + 200 + 100)
+        self.assertAlmostEqual(self.common_stock.calculate_volume_weighted_stock_price(), expected_vwsp)
+
+    def test_trades_are_stored_in_time_order(self):
+        now = datetime.now()
+        self.common_stock.trades = [
+            Trade(now - timedelta(minutes=1), 100, 'buy', 110),
+            Trade(now - timedelta(minutes=2), 200, 'sell', 120),
+        ]
+        trades = list(self.common_stock.trades)
+        self.assertEqual([trade.price for trade in trades], [120, 110])
+        self.assertEqual(trades[0].timestamp, now - timedelta(minutes=2))
+        self.assertEqual(trades[0].indicator, 'sell')
+        self.assertEqual(self.common_stock.trades.nbytes(), 2 * 25)
+
+    def test_volume_weighted_window_evicts_expired_trades(self):
+        now = datetime.now()
+        store = TradeStore()
+        window = VolumeWeightedWindow(store, timedelta(minutes=5))
+        for trade in [
+            Trade(now - timedelta(minutes=6), 150, 'buy', 130),
+            Trade(now - timedelta(minutes=4), 100, 'buy', 110),
+            Trade(now - timedelta(minutes=3), 200, 'sell', 120),
+        ]:
+            window.add(store.append(to_epoch_ns(trade.timestamp), trade.quantity, BUY, trade.price))
+        self.assertEqual(window.expire(to_epoch_ns(now)), 1)
+        self.assertEqual(len(window), 2)
+        self.assertEqual(window.total_quantity, 300)
+        self.assertAlmostEqual(window.volume_weighted_price(), (100*110 + 200*120) / (100 + 200))
+
+        window.expire(to_epoch_ns(now + timedelta(minutes=10)))
+        self.assertEqual(len(window), 0)
+        self.assertEqual(window.total_quantity, 0)
+        self.assertEqual(window.volume_weighted_price(), 0)
+
+    def test_volume_weighted_window_handles_out_of_order_trades(self):
+        now = to_epoch_ns(datetime.now())
+        minute = 60 * 10**9
+        store = TradeStore()
+        window = VolumeWeightedWindow(store, timedelta(minutes=5))
+        window.add(store.append(now - 1 * minute, 100, BUY, 110))
+        window.add(store.append(now - 6 * minute, 150, BUY, 130))
+        self.assertEqual(store.prices[0], 130)
+        window.expire(now)
+        self.assertAlmostEqual(window.volume_weighted_price(), 110)
+
+        # A late trade older than an evicted one is already outside the window.
+        window.add(store.append(now - 7 * minute, 50, BUY, 90))
+        self.assertEqual(window.start, 2)
+        self.assertAlmostEqual(window.volume_weighted_price(), 110)
+
+    def test_calculate_order_flow(self):
+        """Test the per-side prices and quantities of the window and that they follow its eviction."""
+        now = datetime.now()
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        self.assertEqual(stock.calculate_order_flow(), (0, 0, 0, 0, 0, 0, 0.0))
+        stock.record_trades([
+            (now - timedelta(minutes=6), 150, 'sell', 130),
+            (now - timedelta(minutes=4), 100, 'buy', 110),
+            (now - timedelta(minutes=3), 200, 'sell', 120),
+        ])
+        stock.record_trade(300, 'buy', 100)
+
+        flow = stock.calculate_order_flow()
+        self.assertAlmostEqual(flow.volume_weighted_price, stock.calculate_volume_weighted_stock_price())
+        self.assertAlmostEqual(flow.buy_volume_weighted_price, (100*110 + 300*100) / (100 + 300))
+        self.assertAlmostEqual(flow.sell_volume_weighted_price, 120)
+        self.assertEqual((flow.buy_quantity, flow.sell_quantity, flow.net_quantity), (400, 200, 200))
+        self.assertAlmostEqual(flow.imbalance, 200 / 600)
+
+    def test_volume_weighted_window_tracks_sides(self):
+        """Test that the signed sums follow trades added one at a time, in ranges and evicted."""
+        now = to_epoch_ns(datetime.now())
+        minute = 60 * 10**9
+        store = TradeStore()
+        window = VolumeWeightedWindow(store, timedelta(minutes=5))
+        window.add(store.append(now - 6 * minute, 100, SELL, 90))
+        window.add(store.append(now - 4 * minute, 50, BUY, 110))
+        position = store.append(now - 2 * minute, 30, SELL, 100)
+        store.append(now - 1 * minute, 20, SELL, 95)
+        window.add_range(position)
+        self.assertEqual(window.net_quantity, 50 - 100 - 30 - 20)
+
+        window.expire(now)
+        flow = window.order_flow()
+        self.assertEqual((flow.buy_quantity, flow.sell_quantity, flow.net_quantity), (50, 50, 0))
+        self.assertAlmostEqual(flow.buy_volume_weighted_price, 110)
+        self.assertAlmostEqual(flow.sell_volume_weighted_price, (30*100 + 20*95) / 50)
+        self.assertEqual(flow.imbalance, 0)
+
+        window.expire(now + 10 * minute)
+        self.assertEqual(window.order_flow(), (0, 0, 0, 0, 0, 0, 0.0))
+
+    def test_listener_is_called_once_until_marked_clean(self):
+        """Test that changes mark the stock dirty and only call the listener on the first one until it is marked clean."""
+        now = datetime.now()
+        stock = Stock(symbol="POP", type="Common", last_dividend=8, fixed_dividend=0, par_value=100)
+        changes = []
+        stock.listener = changes.append
+        self.assertIsNone(stock.next_expiry_ns)
+        stock.record_trade(100, 'buy', 110, now - timedelta(minutes=4))
+        stock.record_trade(100, 'buy', 120)
+        self.assertTrue(stock.dirty)
+        self.assertEqual(changes, [stock])
+        self.assertEqual(stock.next_expiry_ns, to_epoch_ns(now + timedelta(minutes=1)) + 1)
+
+        stock.mark_clean()
+        self.assertFalse(stock.dirty)
+        stock.calculate_volume_weighted_stock_price()
+        self.assertEqual(changes, [stock])
+        stock.record_trades([(now - timedelta(minutes=6), 100, 'sell', 90)])
+        self.assertEqual(changes, [stock, stock])
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from datetime import datetime
-from jpmorgan.trade import Trade  
+from jpmorgan.trade import BUY, SELL, Side, Trade, from_epoch_ns, to_epoch_ns
 
 class TestTrade(unittest.TestCase):
 
@@ -24,11 +24,16 @@ class TestTrade(unittest.TestCase):
         """Test the initialization of the Trade object with invalid quantity."""
         with self.assertRaises(ValueError):
             Trade(self.timestamp, -10, self.indicator, self.price)
+        with self.assertRaises(ValueError):
+            Trade(self.timestamp, 2**63, self.indicator, self.price)
     
     def test_trade_invalid_price(self):
         """Test the initialization of the Trade object with invalid price."""
         with self.assertRaises(ValueError):
             Trade(self.timestamp, self.quantity, self.indicator, -50.0)
+        for price in (float("inf"), float("nan"), 10**400):
+            with self.assertRaises(ValueError):
+                Trade(self.timestamp, self.quantity, self.indicator, price)
 
     def test_trade_invalid_indicator(self):
         """Test the initialization of the Trade object with invalid indicator."""
@@ -40,5 +45,47 @@ class TestTrade(unittest.TestCase):
         with self.assertRaises(TypeError):
             Trade("2024-07-09", self.quantity, self.indicator, self.price)
 
+    def test_trade_has_no_instance_dict(self):
+        """Test that Trade objects are slotted records."""
+        trade = Trade(self.timestamp, self.quantity, self.indicator, self.price)
+        self.assertFalse(hasattr(trade, "__dict__"))
+
+    def test_trade_fields_are_compact(self):
+        """Test that the side and timestamp are also available as a side code and epoch nanoseconds."""
+        trade = Trade(self.timestamp, self.quantity, "sell", self.price)
+        self.assertIs(trade.side, SELL)
+        self.assertEqual(trade.timestamp_ns, to_epoch_ns(self.timestamp))
+        trade.indicator = "buy"
+        self.assertIs(trade.side, BUY)
+        trade.timestamp = datetime(1970, 1, 1, 0, 0, 1)
+        self.assertEqual(trade.timestamp_ns, 10**9)
+
+    def test_trusted_trade_skips_validation(self):
+        """Test that trusted trades are built from codes and nanoseconds without validation."""
+        trade = Trade.trusted(10**9, self.quantity, Side.BUY, self.price)
+        self.assertEqual(trade.timestamp, datetime(1970, 1, 1, 0, 0, 1))
+        self.assertEqual(trade.indicator, "buy")
+        self.assertEqual(Trade.trusted(0, -1, SELL, 0).quantity, -1)
+        self.assertFalse(hasattr(trade, "__dict__"))
+
+    def test_trade_equality(self):
+        """Test that trades, being mutable, compare by identity and can be kept in sets."""
+        trade = Trade(datetime(1970, 1, 1, 0, 0, 1), self.quantity, self.indicator, self.price)
+        same = Trade.trusted(10**9, self.quantity, BUY, self.price)
+        self.assertEqual(trade, trade)
+        self.assertNotEqual(trade, same)
+        self.assertEqual(len({trade, same, trade}), 2)
+
+    def test_side_codes(self):
+        """Test that sides are small ints."""
+        self.assertEqual(int(Side.BUY), 1)
+        self.assertEqual(int(Side.SELL), -1)
+        self.assertEqual(Side(1), BUY)
+
+    def test_epoch_ns_round_trip(self):
+        """Test that timestamps survive conversion to nanoseconds and back."""
+        self.assertEqual(from_epoch_ns(to_epoch_ns(self.timestamp)), self.timestamp)
+        self.assertEqual(to_epoch_ns(datetime(1970, 1, 1, 0, 0, 1)), 10**9)
+
 if __name__ == '__main__':
     unittest.main()